@@ -0,0 +1,125 @@
+from datetime import datetime, timezone
+import json
+import os
+from pathlib import Path
+import platform
+import subprocess
+import tempfile
+
+import typer
+
+from benchmarks.corpus import generate_corpus
+
+app = typer.Typer(pretty_exceptions_enable=False)
+
+
+@app.command()
+def run(
+    recipes: int = typer.Option(500, help="Number of synthetic recipes"),
+    repeat: int = typer.Option(5, help="Repetitions per benchmark"),
+    http_seconds: float = typer.Option(5, help="Duration of the HTTP load test"),
+    http_clients: int = typer.Option(8, help="Concurrent HTTP clients"),
+    only: list[str] = typer.Option(None, help="Only run these benchmarks"),
+    output: Path = typer.Option(None, help="Save results as JSON"),
+):
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp) / "data"
+        recipe_ids = generate_corpus(data_dir, recipes)
+
+        # onyo_backend resolves its data dir at import time
+        os.environ["ONYO_DATA_DIR"] = str(data_dir)
+        from benchmarks.suites import run_benchmarks  # pylint: disable=import-outside-toplevel
+
+        results = run_benchmarks(
+            data_dir,
+            recipe_ids,
+            repeat,
+            http_seconds,
+            http_clients,
+            set(only) if only else None,
+        )
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "params": {
+            "recipes": recipes,
+            "repeat": repeat,
+            "http_seconds": http_seconds,
+            "http_clients": http_clients,
+        },
+        "results": results,
+    }
+
+    print_results(results)
+    if output:
+        with open(output, "w", encoding="utf8") as file:
+            json.dump(report, file, indent=2)
+        print(f"Saved results to {output}")
+
+
+@app.command()
+def compare(
+    baseline: Path,
+    current: Path,
+    threshold: float = typer.Option(
+        1.1, help="Fail if a benchmark gets slower by more than this factor"
+    ),
+):
+    with open(baseline, "r", encoding="utf8") as file:
+        baseline_report = json.load(file)
+    with open(current, "r", encoding="utf8") as file:
+        current_report = json.load(file)
+
+    print(f"{baseline_report['commit'][:10]} -> {current_report['commit'][:10]} (>1 is slower)")
+    regressions = []
+    for name, result in current_report["results"].items():
+        base_result = baseline_report["results"].get(name)
+        if not base_result:
+            continue
+
+        # Larger is better for throughput, smaller is better for durations
+        if "requests_per_second" in result:
+            slowdown = base_result["requests_per_second"] / result["requests_per_second"]
+        else:
+            slowdown = result["median_ms"] / base_result["median_ms"]
+
+        marker = "  REGRESSION" if slowdown > threshold else ""
+        print(f"{name:30} {slowdown:6.2f}x{marker}")
+        if slowdown > threshold:
+            regressions.append(name)
+
+    if regressions:
+        raise typer.Exit(code=1)
+
+
+def print_results(results):
+    for name, result in results.items():
+        if "requests_per_second" in result:
+            print(
+                f"{name:30} {result['requests_per_second']:10.1f} req/s"
+                f"  p50 {result['p50_ms']:.2f}ms  p99 {result['p99_ms']:.2f}ms"
+                f"  errors {result['errors']}"
+            )
+        else:
+            per_item = (
+                f"  ({result['per_item_ms']:.3f}ms per item)" if "items" in result else ""
+            )
+            print(f"{name:30} {result['median_ms']:10.2f}ms median{per_item}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,91 @@
+from pathlib import Path
+import random
+
+import yaml
+
+CATEGORIES = ["Meal", "Sides", "Sauces", "Dessert", "Breakfast", "Soup", "Salad"]
+ICONS = ["🍝", "🌯", "🥗", "🍲", "🥞", "🍰", "🍛"]
+UNITS = ["g", "ml", "tbsp", "tsp", "dl", "cups", ""]
+WORDS = (
+    "onion garlic tomato pepper carrot potato leek celery basil oregano thyme "
+    "cumin paprika chili ginger lemon lime butter cream milk cheese egg flour "
+    "rice pasta bean lentil chicken beef pork tofu spinach kale mushroom corn "
+    "pea zucchini eggplant cabbage broccoli apple pear honey sugar vinegar oil"
+).split()
+
+
+def generate_corpus(data_dir: Path, recipe_count: int, seed=42):
+    rnd = random.Random(seed)
+    recipe_dir = data_dir / "recipes"
+    recipe_dir.mkdir(parents=True, exist_ok=True)
+
+    vocabulary = ingredient_vocabulary(rnd, max(50, recipe_count // 2))
+    recipe_ids = [f"recipe{i}" for i in range(recipe_count)]
+    for i, recipe_id in enumerate(recipe_ids):
+        recipe = generate_recipe(rnd, i, vocabulary, recipe_ids)
+        with open(recipe_dir / f"{recipe_id}.yaml", "w", encoding="utf8") as file:
+            yaml.safe_dump(recipe, file, allow_unicode=True, sort_keys=False)
+
+    with open(data_dir / "shopping_links.yaml", "w", encoding="utf8") as file:
+        for name in sorted(vocabulary):
+            link = rnd.choice(
+                [f"https://shop.example.com/product/{rnd.randint(1, 10**9)}", "ignore"]
+            )
+            file.write(f"{name}: {link}\n")
+
+    with open(data_dir / "ideas.yml", "w", encoding="utf8") as file:
+        yaml.safe_dump(
+            [{"text": f"idea {i} https://example.com/{i}", "guid": str(i)} for i in range(20)],
+            file,
+        )
+
+    return recipe_ids
+
+
+def ingredient_vocabulary(rnd: random.Random, size: int) -> list[str]:
+    # There are only so many two word combinations
+    size = min(size, len(WORDS) ** 2)
+    vocabulary = set(WORDS)
+    while len(vocabulary) < size:
+        vocabulary.add(f"{rnd.choice(WORDS)} {rnd.choice(WORDS)}")
+    return sorted(vocabulary)
+
+
+def generate_recipe(rnd: random.Random, index: int, vocabulary, recipe_ids):
+    ingredient_names = rnd.sample(vocabulary, rnd.randint(4, 14))
+    # Each step uses a chunk of the ingredients, some chunks form a mise group
+    chunks = [ingredient_names[i : i + 3] for i in range(0, len(ingredient_names), 3)]
+
+    ingredients = []
+    if rnd.random() < 0.3:
+        ingredients.append("=Base=")
+
+    steps = []
+    for chunk in chunks:
+        mise = len(chunk) > 1 and rnd.random() < 0.3
+        if mise:
+            ingredients.append("(")
+        ingredients.extend(f"{rnd.randint(1, 500)} {rnd.choice(UNITS)} ${name}$" for name in chunk)
+        if mise:
+            ingredients.append(")")
+
+        tasks = [f"Add ${name}$ and stir **well**" for name in chunk]
+        if rnd.random() < 0.5:
+            tasks.append(f"Cook for !{rnd.randint(1, 45)} minutes!")
+        steps.append({"title": f"Step with {chunk[0]}", "tasks": tasks})
+
+    # Only link to earlier recipes so there are no cycles
+    if index and rnd.random() < 0.2:
+        ingredients.append(f"~{recipe_ids[rnd.choice(range(index))]}~")
+
+    recipe = {
+        "name": f"{rnd.choice(WORDS).title()} {rnd.choice(WORDS)} {index}",
+        "icon": rnd.choice(ICONS),
+        "category": rnd.sample(CATEGORIES, rnd.randint(1, 2)),
+        "ingredients": ingredients,
+        "steps": steps,
+    }
+    if rnd.random() < 0.4:
+        recipe["notes"] = ["Tastes **better** the next day", "Freezes well"]
+
+    return recipe
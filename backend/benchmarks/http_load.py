@@ -0,0 +1,130 @@
+from contextlib import contextmanager
+import http.client
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def running_server(data_dir: Path, server_args=(), startup_timeout=15):
+    port = free_port()
+    env = {**os.environ, "ONYO_DATA_DIR": str(data_dir), "ONYO_PORT": str(port)}
+    with subprocess.Popen(
+        [sys.executable, "-m", "onyo_backend", *server_args],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    ) as server:
+        try:
+            wait_for_port(port, startup_timeout)
+            yield port
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+
+def wait_for_port(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"Server did not start listening on port {port}")
+
+
+@contextmanager
+def slow_clients(port, count):
+    # Connections that send an incomplete request and then just sit there,
+    # like phones on a bad mobile connection.
+    sockets = []
+    try:
+        for _ in range(count):
+            s = socket.create_connection(("127.0.0.1", port))
+            s.sendall(b"GET /onyo HTTP/1.1\r\nHost: localhost\r\n")
+            sockets.append(s)
+        yield
+    finally:
+        for s in sockets:
+            s.close()
+
+
+def http_get(port, path):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def run_http_load(port, paths: list[str], duration: float, clients: int, seed=42):
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(client_seed):
+        nonlocal errors
+        rnd = random.Random(client_seed)
+        local_latencies = []
+        local_errors = 0
+        while time.monotonic() < deadline:
+            path = rnd.choice(paths)
+            start = time.perf_counter()
+            try:
+                status, _ = http_get(port, path)
+                if status != 200:
+                    local_errors += 1
+            except OSError:
+                local_errors += 1
+            local_latencies.append(time.perf_counter() - start)
+
+        with lock:
+            latencies.extend(local_latencies)
+            errors += local_errors
+
+    threads = [
+        threading.Thread(target=client, args=(seed + i,)) for i in range(clients)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "clients": clients,
+        "requests_per_second": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0,
+    }
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
@@ -0,0 +1,272 @@
+from contextlib import redirect_stdout
+import io
+import os
+from pathlib import Path
+import statistics
+import tempfile
+import time
+
+from jinja2 import Environment, PackageLoader, select_autoescape
+
+from benchmarks.http_load import http_get, run_http_load, running_server, slow_clients
+from cli.__main__ import generate_static, render
+from onyo_backend.bundle import DEFAULT_SHARD_SIZE
+from onyo_backend.ingredient_duplicates import find_duplicate_clusters
+from onyo_backend.pantry import PantryIndex
+from onyo_backend.precache import static_url
+from onyo_backend.recipes import (
+    NUM_COLORS,
+    Mise,
+    load_recipes_uncached,
+    recipe_link,
+    resolve_links,
+)
+from onyo_backend.shopping_list import (
+    assemble_shopping_list,
+    collect_ingredients_from_recipes,
+    load_shopping_ingredients,
+)
+from onyo_backend.search_index import SearchIndex
+from onyo_backend.store import RecipeStore
+
+SLOW_CLIENTS = 200
+PANTRY_QUERIES = [
+    ["onion", "garlic", "tomato", "pasta"],
+    ["egg", "flour", "milk", "butter", "sugar", "apple"],
+    ["rice"],
+]
+SEARCH_QUERIES = ["garlic", "tomato basil", "chick", "lemon butter cream", "zucchini", "xyz"]
+
+
+def measure(func, repeat, items=None, warmup=1):
+    for _ in range(warmup):
+        func()
+
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+
+    result = {
+        "repeat": repeat,
+        "min_ms": min(durations),
+        "median_ms": statistics.median(durations),
+        "mean_ms": statistics.fmean(durations),
+        "max_ms": max(durations),
+    }
+    if items:
+        result["items"] = items
+        result["per_item_ms"] = result["median_ms"] / items
+    return result
+
+
+def run_benchmarks(
+    data_dir: Path,
+    recipe_ids: list[str],
+    repeat: int,
+    http_seconds: float,
+    http_clients: int,
+    selected: set[str] | None = None,
+):
+    recipe_dir = data_dir / "recipes"
+    categories, recipes = load_recipes_uncached(recipe_dir, [])
+    shopping_ingredients = load_shopping_ingredients(data_dir / "shopping_links.yaml")
+    template_env = Environment(
+        loader=PackageLoader("onyo_backend"), autoescape=select_autoescape()
+    )
+    template_env.globals["static_url"] = static_url
+    ingredient_usage = {
+        name: len(set(ingr.used_in_recipes))
+        for name, ingr in collect_ingredients_from_recipes(recipes).items()
+    }
+
+    def render_recipe_pages():
+        for recipe in recipes.values():
+            render(
+                template_env,
+                "recipe.html",
+                recipe=recipe,
+                shopping_list=assemble_shopping_list(recipe, shopping_ingredients),
+                Mise=Mise,
+                NUM_COLORS=NUM_COLORS,
+                link=recipe_link(recipe.id),
+                back_link="",
+                user=None,
+            )
+
+    def refresh_after_one_change(store, path):
+        now = time.time_ns()
+        os.utime(path, ns=(now, now))
+        store.refresh()
+
+    def refreshed_store():
+        store = RecipeStore(recipe_dir)
+        store.refresh()
+        return store
+
+    def build_search_index():
+        with tempfile.TemporaryDirectory() as tmp:
+            index = SearchIndex(Path(tmp) / "search.sqlite")
+            index.attach(refreshed_store())
+            index.close()
+
+    def search_queries(index):
+        for query in SEARCH_QUERIES:
+            index.search(query)
+
+    def searchable_index():
+        index = SearchIndex(":memory:")
+        index.attach(refreshed_store())
+        return index
+
+    def pantry_index():
+        index = PantryIndex()
+        index.update(recipes, shopping_ingredients)
+        return index
+
+    def generate_static_site(bundle=False):
+        with tempfile.TemporaryDirectory() as output_dir:
+            generate_static(
+                Path(output_dir),
+                recipe_dir,
+                rev=None,
+                bundle=bundle,
+                shard_size=DEFAULT_SHARD_SIZE,
+            )
+
+    benchmarks = {
+        "load_recipes_uncached": lambda: measure(
+            lambda: load_recipes_uncached(recipe_dir, []), repeat, len(recipe_ids)
+        ),
+        "resolve_links": lambda: measure(
+            lambda: resolve_links(recipes), repeat, len(recipes)
+        ),
+        "assemble_shopping_list": lambda: measure(
+            lambda: [
+                assemble_shopping_list(r, shopping_ingredients)
+                for r in recipes.values()
+            ],
+            repeat,
+            len(recipes),
+        ),
+        "recipe_store_load": lambda: measure(
+            refreshed_store, repeat, len(recipe_ids)
+        ),
+        "recipe_store_one_change": lambda: measure(
+            lambda store=refreshed_store(): refresh_after_one_change(
+                store, recipe_dir / f"{recipe_ids[0]}.yaml"
+            ),
+            repeat,
+        ),
+        "search_index_build": lambda: measure(
+            build_search_index, repeat, len(recipe_ids)
+        ),
+        "search_index_query": lambda: measure(
+            lambda index=searchable_index(): search_queries(index),
+            repeat,
+            len(SEARCH_QUERIES),
+        ),
+        "find_duplicate_ingredients": lambda: measure(
+            lambda: find_duplicate_clusters(ingredient_usage), repeat, len(ingredient_usage)
+        ),
+        "pantry_index_build": lambda: measure(pantry_index, repeat, len(recipes)),
+        "pantry_query": lambda: measure(
+            lambda index=pantry_index(): [index.query(q) for q in PANTRY_QUERIES],
+            repeat,
+            len(PANTRY_QUERIES),
+        ),
+        "render_recipe_pages": lambda: measure(
+            render_recipe_pages, repeat, len(recipes)
+        ),
+        "render_index_page": lambda: measure(
+            lambda: render(
+                template_env,
+                "index.html",
+                categories=categories,
+                recipes=recipes.values(),
+                user=None,
+            ),
+            repeat,
+        ),
+        "render_category_pages": lambda: measure(
+            lambda: [
+                render(
+                    template_env,
+                    "recipe_list.html",
+                    category=c,
+                    recipes=c.recipes,
+                    recipe_count=len(c.recipes),
+                )
+                for c in categories.values()
+            ],
+            repeat,
+            len(categories),
+        ),
+        "generate_static": lambda: measure(generate_static_site, repeat),
+        "generate_static_bundle": lambda: measure(
+            lambda: generate_static_site(bundle=True), repeat
+        ),
+        "http_throughput": lambda: measure_http(
+            data_dir, recipe_ids, categories, http_seconds, http_clients
+        ),
+        "http_throughput_asyncio": lambda: measure_http(
+            data_dir,
+            recipe_ids,
+            categories,
+            http_seconds,
+            http_clients,
+            server_args=("--server", "asyncio"),
+        ),
+        "http_slow_clients": lambda: measure_http(
+            data_dir,
+            recipe_ids,
+            categories,
+            http_seconds,
+            http_clients,
+            slow_client_count=SLOW_CLIENTS,
+        ),
+        "http_slow_clients_asyncio": lambda: measure_http(
+            data_dir,
+            recipe_ids,
+            categories,
+            http_seconds,
+            http_clients,
+            server_args=("--server", "asyncio"),
+            slow_client_count=SLOW_CLIENTS,
+        ),
+    }
+
+    results = {}
+    for name, benchmark in benchmarks.items():
+        if selected and name not in selected:
+            continue
+        print(f"Running {name}", flush=True)
+        with redirect_stdout(io.StringIO()):
+            results[name] = benchmark()
+
+    return results
+
+
+def measure_http(
+    data_dir,
+    recipe_ids,
+    categories,
+    duration,
+    clients,
+    server_args=(),
+    slow_client_count=0,
+):
+    paths = [
+        "/onyo",
+        *(f"/onyo/categories/{c.name}" for c in categories.values()),
+        *(recipe_link(r) for r in recipe_ids[:200]),
+        *(f"/onyo/api/recipes/{r}" for r in recipe_ids[:50]),
+    ]
+    with running_server(data_dir, server_args) as port:
+        # Load recipes before measuring
+        http_get(port, "/onyo")
+        with slow_clients(port, slow_client_count):
+            result = run_http_load(port, paths, duration, clients)
+        result["slow_clients"] = slow_client_count
+        return result
@@ -1,79 +1,290 @@
+from contextlib import ExitStack
+from dataclasses import asdict
+import json
 from pathlib import Path
 import re
 import shutil
-from onyo_backend.__main__ import recipe_link
+import time
+from urllib.parse import quote
 from onyo_backend.ideas import list_ideas_for_html
+from onyo_backend.lazy import rich_print
+from onyo_backend.profiling import profiled
+from onyo_backend.precache import (
+    PRECACHE_MANIFEST_FILE,
+    SERVICE_WORKER_FILE,
+    build_precache_manifest,
+    content_hash,
+    static_file_hashes,
+    static_url,
+    versioned_url,
+)
 from onyo_backend.recipes import (
     NUM_COLORS,
     RECIPE_DIR,
     Mise,
-    load_recipes,
     load_recipes_uncached,
     print_errors,
     print_warnings,
+    recipe_link,
 )
+from onyo_backend.bundle import DEFAULT_SHARD_SIZE, SHELL_PAGE, write_bundle
+from onyo_backend.pantry import DEFAULT_LIMIT, PantryIndex, parse_available
+from onyo_backend.git_store import GitError, GitRecipeStore
+from onyo_backend.store import RecipeStore, VersionConflict
+from onyo_backend.views import ALL_RECIPES, DEFAULT_ORDER
 import typer
-import rich
-from onyo_backend import shopping_list
-from jinja2 import Environment, PackageLoader, select_autoescape
+from onyo_backend import ingredient_duplicates, shopping_list
 
 STATIC_DIR = Path(__file__).parent.parent / "onyo_backend" / "onyo" / "static"
 app = typer.Typer(pretty_exceptions_enable=False)
 
 
+@app.callback()
+def main(
+    ctx: typer.Context,
+    profile: Path = typer.Option(
+        None, help="Profile the command and write pstats/collapsed stacks to this dir"
+    ),
+):
+    if profile:
+        stack = ExitStack()
+        stack.enter_context(profiled(profile, ctx.invoked_subcommand))
+        ctx.call_on_close(stack.close)
+
+
 @app.command()
 def update_shopping_links(
     origins: bool = typer.Option(
         default=False, help="Show origin(s) of each ingredient"
-    )
+    ),
+    json_output: bool = typer.Option(
+        False, "--json", help="Print the changes as JSON"
+    ),
 ):
-    shopping_list.update_shopping_links(origins)
+    diff = shopping_list.update_shopping_links(origins)
+    if json_output:
+        print(json.dumps(asdict(diff), indent=2))
+    else:
+        shopping_list.print_shopping_links_diff(diff)
 
 
 @app.command()
-def validate():
-    errors = []
-    _, recipes = load_recipes_uncached(RECIPE_DIR, errors)
+def find_duplicate_ingredients(
+    max_distance: int = typer.Option(
+        ingredient_duplicates.DEFAULT_MAX_DISTANCE,
+        help="Maximum number of typos between two names",
+    ),
+    json_output: bool = typer.Option(False, "--json", help="Print clusters as JSON"),
+):
+    _, recipes = load_recipes_uncached(RECIPE_DIR, [])
+    usage = {
+        name: len(set(ingr.used_in_recipes))
+        for name, ingr in shopping_list.collect_ingredients_from_recipes(recipes).items()
+    }
+    clusters = ingredient_duplicates.find_duplicate_clusters(usage, max_distance)
+
+    if json_output:
+        print(json.dumps([asdict(c) for c in clusters], indent=2))
+        return
+    if not clusters:
+        rich_print("[green]✅ No duplicate ingredients found[/green]")
+        return
+
+    for cluster in clusters:
+        rich_print(", ".join(f"{n} ({usage[n]})" for n in cluster.names))
+    print("\nSuggested entries for ingredient_aliases.yaml:")
+    for cluster in clusters:
+        for name in cluster.names[1:]:
+            print(f"{name}: {cluster.canonical}")
+
+
+@app.command()
+def what_can_i_cook(
+    available: list[str] = typer.Argument(
+        ..., help="Available ingredients (shopping names, comma separated or separate arguments)"
+    ),
+    limit: int = typer.Option(DEFAULT_LIMIT, min=1, help="Maximum number of recipes"),
+    max_missing: int = typer.Option(
+        None, min=0, help="Only recipes missing at most this many ingredients"
+    ),
+    json_output: bool = typer.Option(False, "--json", help="Print the matches as JSON"),
+):
+    _, recipes = load_recipes_uncached(RECIPE_DIR, [])
+    index = PantryIndex()
+    index.update(recipes, shopping_list.get_shopping_ingredients())
+    result = index.query(parse_available(available), limit, max_missing)
+
+    if json_output:
+        print(json.dumps(asdict(result), indent=2))
+        return
+    for name in result.unknown:
+        rich_print(f"[yellow]WARN[/yellow]: No recipe uses {name}")
+    if not result.matches:
+        print("No matching recipes")
+    for match in result.matches:
+        missing = f" (missing: {', '.join(match.missing)})" if match.missing else ""
+        print(f"{match.coverage:4.0%} {match.name} [{match.id}]{missing}")
+
+
+@app.command()
+def validate(
+    watch: bool = typer.Option(
+        False, help="Keep running and validate recipes again when they change"
+    ),
+    interval: float = typer.Option(0.5, help="Seconds between checks with --watch"),
+    json_output: bool = typer.Option(
+        False, "--json", help="Print results as JSON (one line per check)"
+    ),
+    rev: str = typer.Option(
+        None, help="Validate the recipes of this git revision instead of the files"
+    ),
+):
+    store = open_store(RECIPE_DIR, rev)
+    try:
+        while True:
+            start = time.perf_counter()
+            update = store.update()
+            if update:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                print_validation(store, update, elapsed_ms, json_output, watch)
+            if not watch:
+                return
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    except GitError as e:
+        rich_print(f"[red]ERROR[/red]: {e}")
+        raise typer.Exit(1)
+
+
+def print_validation(store, update, elapsed_ms, json_output, watch):
+    error_count = len(store.errors)
+    warning_count = sum(len(r.warnings) for r in update.snapshot.recipes.values())
+
+    if json_output:
+        result = {
+            "changed": update.changed,
+            "removed": update.removed,
+            "errors": {str(store.recipe_path(k)): e for k, e in update.errors.items()},
+            # Empty lists for rebuilt recipes without warnings, to clear old ones
+            "warnings": {
+                str(store.recipe_path(r.id)): [w.to_dict() for w in r.warnings]
+                for r in update.rebuilt
+            },
+            "error_count": error_count,
+            "warning_count": warning_count,
+            "elapsed_ms": round(elapsed_ms, 1),
+        }
+        print(json.dumps(result), flush=True)
+        return
 
-    has_warnings = any((r.warnings for r in recipes.values()))
-    if not errors and not has_warnings:
-        rich.print("[green]✅ All good[/green]")
+    if watch and store.snapshot.generation > 1:
+        names = update.changed + update.removed
+        print(f"Changed: {', '.join(names)} ({elapsed_ms:.1f} ms)")
+    print_errors(update.errors.values())
+    print_warnings(update.rebuilt)
+    if not error_count and not warning_count:
+        rich_print("[green]✅ All good[/green]")
     else:
-        print_errors(errors)
-        print_warnings(recipes.values())
-        rich.print("[red]❌ There are problems[/red]")
+        rich_print(
+            f"[red]❌ There are problems[/red] ({error_count} errors, {warning_count} warnings)"
+        )
+
+
+@app.command()
+def import_recipes(
+    source: Path = typer.Argument(
+        ..., help="Directory of recipe files, tar archive or multi-document YAML file"
+    ),
+    overwrite: bool = typer.Option(False, help="Replace existing recipes"),
+    workers: int = typer.Option(None, help="Validation processes (default: CPU count)"),
+):
+    from onyo_backend import importer
+
+    try:
+        documents = importer.read_source(source)
+        result = importer.import_recipes(
+            RecipeStore(RECIPE_DIR), documents, overwrite, workers
+        )
+    except (importer.RecipeImportError, VersionConflict) as e:
+        rich_print(f"[red]ERROR[/red]: {e}")
+        raise typer.Exit(1)
+
+    if result.errors:
+        for source_name, error in result.errors.items():
+            rich_print(f"[red]ERROR[/red]: {source_name}: {error}")
+        rich_print("[red]❌ Nothing imported[/red]")
+        raise typer.Exit(1)
+
+    rich_print(f"[green]✅ Imported {len(result.imported)} recipes[/green]")
+
+
+def open_store(recipe_dir, rev):
+    return GitRecipeStore(recipe_dir, rev) if rev else RecipeStore(recipe_dir)
 
 
 @app.command()
-def generate_static(output_dir: Path, recipe_dir: Path = typer.Option(RECIPE_DIR)):
+def generate_static(
+    output_dir: Path,
+    recipe_dir: Path = typer.Option(RECIPE_DIR),
+    rev: str = typer.Option(
+        None, help="Take the recipes from this git revision instead of the files"
+    ),
+    bundle: bool = typer.Option(
+        False, help="One page rendering the recipes from sharded JSON, instead of a page per recipe"
+    ),
+    shard_size: int = typer.Option(
+        DEFAULT_SHARD_SIZE, help="Recipes per JSON file with --bundle"
+    ),
+):
     output_dir.mkdir(parents=True, exist_ok=True)
     shutil.copytree(STATIC_DIR, output_dir / "static", dirs_exist_ok=True)
+    # The service worker needs to live at the root to control all pages
+    shutil.copy(STATIC_DIR / SERVICE_WORKER_FILE, output_dir / SERVICE_WORKER_FILE)
+
+    from jinja2 import Environment, PackageLoader, select_autoescape
 
     template_env = Environment(
         loader=PackageLoader("onyo_backend"), autoescape=select_autoescape()
     )
+    template_env.globals.update(
+        service_worker=SERVICE_WORKER_FILE,
+        service_worker_scope="./",
+        static_url=static_url,
+    )
+    page_hashes = {
+        versioned_url(f"static/{name}", h): h
+        for name, h in static_file_hashes(STATIC_DIR).items()
+    }
 
-    categories, recipes = load_recipes(recipe_dir, 0)
+    try:
+        snapshot = open_store(recipe_dir, rev).refresh()
+    except GitError as e:
+        rich_print(f"[red]ERROR[/red]: {e}")
+        raise typer.Exit(1)
+    categories, recipes = snapshot.categories, snapshot.recipes
     ideas = list_ideas_for_html()
     shopping_ingredients = shopping_list.get_shopping_ingredients()
+    recipe_href = r'href="recipe.html#\1"' if bundle else r'href="rec_\1.html"'
 
     index_page = render(
         template_env,
         "index.html",
         categories=categories,
         user=None,
-        recipes=recipes.values(),
+        # The static site has no server to page through, so lists are rendered in full
+        recipes=snapshot.view(ALL_RECIPES, DEFAULT_ORDER).recipes,
     )
     index_page = re.sub(
         r'href="/onyo/categories/([^"]+)"', r'href="cat_\1.html"', index_page
     )
-    index_page = re.sub(
-        r'href="/onyo/recipes/([^"]+)"', r'href="rec_\1.html"', index_page
-    )
+    index_page = re.sub(r'href="/onyo/recipes/([^"]+)"', recipe_href, index_page)
     index_page = index_page.replace('href="/onyo/ideas"', 'href="ideas.html"')
-    write_page(output_dir / "index.html", index_page)
+    page_hashes["index.html"] = page_hashes["./"] = write_page(
+        output_dir / "index.html", index_page
+    )
 
-    generate_page(
+    page_hashes["ideas.html"] = generate_page(
         template_env,
         "ideas.html",
         output_dir / "ideas.html",
@@ -81,30 +292,53 @@ def generate_static(output_dir: Path, recipe_dir: Path = typer.Option(RECIPE_DIR
         user=None,
     )
 
-    for category in categories.values():
-        generate_category_page(
-            template_env, output_dir / f"cat_{category.name}.html", category
+    for cat_id, category in categories.items():
+        page = f"cat_{category.name}.html"
+        page_hashes[quote(page)] = generate_category_page(
+            template_env,
+            output_dir / page,
+            category,
+            snapshot.view(cat_id, DEFAULT_ORDER),
+            recipe_href,
         )
 
-    for recipe in recipes.values():
-        generate_recipe_page(
+    if bundle:
+        shard_hashes = write_bundle(output_dir, recipes, shopping_ingredients, shard_size)
+        page_hashes.update(shard_hashes)
+        page_hashes[SHELL_PAGE] = generate_page(
             template_env,
-            output_dir / f"rec_{recipe.id}.html",
-            recipe,
-            shopping_ingredients,
+            "recipe.html",
+            output_dir / SHELL_PAGE,
+            bundle={"shards": list(shard_hashes)},
+            NUM_COLORS=NUM_COLORS,
+            user=None,
         )
+    else:
+        for recipe in recipes.values():
+            page = f"rec_{recipe.id}.html"
+            page_hashes[page] = generate_recipe_page(
+                template_env,
+                output_dir / page,
+                recipe,
+                shopping_ingredients,
+            )
+
+    with open(output_dir / PRECACHE_MANIFEST_FILE, "w", encoding="utf8") as file:
+        json.dump(build_precache_manifest(page_hashes), file)
 
 
-def generate_category_page(template_env, output_file, category):
+def generate_category_page(template_env, output_file, category, view, recipe_href):
     cat_page = render(
         template_env,
         "recipe_list.html",
         category=category,
+        recipes=view.recipes,
+        recipe_count=len(view),
     )
 
-    cat_page = re.sub(r'href="/onyo/recipes/([^"]+)"', r'href="rec_\1.html"', cat_page)
+    cat_page = re.sub(r'href="/onyo/recipes/([^"]+)"', recipe_href, cat_page)
     cat_page = cat_page.replace('href="/onyo"', 'href="index.html"')
-    write_page(output_file, cat_page)
+    return write_page(output_file, cat_page)
 
 
 def generate_recipe_page(template_env, output_file, recipe, shopping_ingredients):
@@ -112,7 +346,7 @@ def generate_recipe_page(template_env, output_file, recipe, shopping_ingredients
     link = recipe_link(recipe.id)
     back_link = f"cat_{list(recipe.categories)[0]}.html"
 
-    generate_page(
+    return generate_page(
         template_env,
         "recipe.html",
         output_file,
@@ -128,7 +362,7 @@ def generate_recipe_page(template_env, output_file, recipe, shopping_ingredients
 
 def generate_page(template_env, template_file, output_file, **kw_args):
     content = render(template_env, template_file, **kw_args)
-    write_page(output_file, content)
+    return write_page(output_file, content)
 
 
 def render(template_env, template_file, **kw_args):
@@ -139,6 +373,7 @@ def render(template_env, template_file, **kw_args):
 def write_page(output_file, content):
     with open(output_file, "w", encoding="utf8") as file:
         file.write(content)
+    return content_hash(content)
 
 
 if __name__ == "__main__":
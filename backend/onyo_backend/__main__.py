@@ -1,25 +1,80 @@
-from dataclasses import dataclass
-from pathlib import Path
-import re
+import argparse
+from dataclasses import asdict, dataclass
+from email.utils import parsedate_to_datetime
+import io
+import json
+import os
 import http.server
-from urllib.parse import unquote_plus
+import socket
+from urllib.parse import quote, unquote
 
 import yaml
 
+from .api import (
+    compute_etag,
+    etag_matches,
+    parse_fields,
+    serialize_categories,
+    serialize_recipe,
+    serialize_recipes,
+)
+from .drafts import validate_draft
+from .forms import (
+    MAX_BODY_SIZE,
+    MAX_UPLOAD_SIZE,
+    BodyError,
+    discard_body,
+    read_body_bytes,
+    read_body_fields,
+)
+from .metrics import METRICS, current_request, stage, track_request
+from .pantry import parse_available, query_pantry
+from .profiling import profile_request
+from .router import Router, split_target
 from .ideas import Idea, add_idea, delete_idea, list_ideas_for_html
+from .precache import (
+    SERVICE_WORKER_FILE,
+    STATIC_DIR,
+    get_server_precache_manifest,
+    static_url,
+)
+from .search_index import close_search_index, get_search_index
 from .shopping_list import assemble_shopping_list, get_shopping_ingredients
+from .static_files import IMMUTABLE_CACHE_CONTROL, StaticFiles, parse_range, send_file_range
 from .recipes import (
     NUM_COLORS,
     Mise,
     create_empty_recipe,
     load_recipe,
     load_recipe_yaml,
-    save_recipe_yaml,
+    recipe_link,
+    recipe_version,
+)
+from .views import (
+    ALL_RECIPES,
+    DEFAULT_ORDER,
+    MAX_PAGE_SIZE,
+    PAGE_SIZE,
+    SORT_LABELS,
+    fragment_url,
+)
+from onyo_backend.store import (
+    VersionConflict,
+    current_recipes,
+    get_recipe_store,
+    list_recipes,
 )
-from onyo_backend.recipes import list_recipes
 from jinja2 import Environment, PackageLoader, select_autoescape
 
-PORT = 13012
+PORT = int(os.environ.get("ONYO_PORT", 13012))
+STATIC_PREFIX = "/onyo/static/"
+STREAM_CHUNK_SIZE = 8192
+ARCHIVE_CONTENT_TYPES = {
+    "application/x-tar",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-gtar",
+}
 RECIPE_EDITOR = "recipe_editor"
 IDEA_EDITOR = "idea_editor"
 USER_ROLE_MAPPING = {
@@ -35,81 +90,262 @@ class AuthenticatedUser:
 
 
 def main():
+    parser = argparse.ArgumentParser(prog="onyo_backend")
+    parser.add_argument(
+        "--server",
+        choices=["threading", "asyncio"],
+        default=os.environ.get("ONYO_SERVER", "threading"),
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.environ.get("ONYO_WORKERS", 1)),
+        help="Serve with this many processes (threading server only)",
+    )
+    args = parser.parse_args()
+    if args.workers > 1 and args.server != "threading":
+        parser.error("--workers only works with the threading server")
+
+    # Brings an existing search index up to date before serving
+    get_search_index()
+
+    if args.workers > 1:
+        from .prefork import serve_prefork
+
+        close_search_index()
+        serve_prefork(SimpleRequestHandler, PORT, args.workers)
+        return
+
+    if args.server == "asyncio":
+        from .aio_server import serve_asyncio
+
+        serve_asyncio(SimpleRequestHandler, PORT)
+        return
+
     with http.server.ThreadingHTTPServer(("", PORT), SimpleRequestHandler) as httpd:
         print(f"Listening on port http://localhost:{PORT}")
         httpd.serve_forever()
 
 
-class SimpleRequestHandler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.template_env = Environment(
-            loader=PackageLoader("onyo_backend"), autoescape=select_autoescape()
-        )
+router = Router()
+IMPORT_PATH = "/onyo/recipes/import"
+static_files = StaticFiles(STATIC_DIR)
+template_env = Environment(
+    loader=PackageLoader("onyo_backend"), autoescape=select_autoescape()
+)
+template_env.globals.update(
+    service_worker=f"/onyo/{SERVICE_WORKER_FILE}",
+    service_worker_scope="/onyo",
+    static_url=static_url,
+)
 
-        self.routes = {
-            r"/onyo": self.render_categories,
-            r"/onyo/categories/([^/]+)": self.render_recipe_list,
-            r"/onyo/recipes/([^/]+)/?": self.render_recipe,
-            r"/onyo/recipes/([^/]+)/edit": self.render_edit_recipe,
-            r"/onyo/ideas": self.render_ideas,
-        }
 
-        self.post_routes = {
-            r"/onyo/ideas": self.add_idea,
-            r"/onyo/ideas/([^/]+)": self.delete_idea,
-            r"/onyo/recipes/([^/]+)/edit": self.edit_recipe,
-            r"/onyo/recipes": self.add_recipe,
-        }
+class SimpleRequestHandler(http.server.BaseHTTPRequestHandler):
+    # HTTP/1.1 for keep-alive and chunked streaming of rendered pages
+    protocol_version = "HTTP/1.1"
+    # Close idle keep-alive connections
+    timeout = 60
+    # Whether the body of the current request wasn't read yet
+    body_pending = False
 
-        super().__init__(*args, directory=Path(__file__).parent, **kwargs)
+    @staticmethod
+    def max_body_size(target):
+        # Only bulk imports may be larger than a form
+        return MAX_UPLOAD_SIZE if split_target(target)[0] == IMPORT_PATH else MAX_BODY_SIZE
+
+    def parse_request(self):
+        # The headers of a request that failed to parse are those of the previous one
+        self.body_pending = False
+        if not super().parse_request():
+            return False
+        self.body_pending = True
+        return True
 
     def do_GET(self):
-        if self.path.startswith("/onyo/static"):
-            super().do_GET()
-        elif self.path == "/onyo/favicon.ico":
-            self._reply(404, "Not found")
-        else:
-            self.execute_route(self.routes)
+        with track_request(self.command) as request, self.profile():
+            if self.path.startswith(STATIC_PREFIX):
+                request.route = "static"
+                self.serve_static(self.path[len(STATIC_PREFIX) :])
+            elif self.path == "/onyo/favicon.ico":
+                self._reply(404, "Not found")
+            else:
+                self.execute_route()
+
+    def do_HEAD(self):
+        with track_request(self.command) as request:
+            if self.path.startswith(STATIC_PREFIX):
+                request.route = "static"
+                self.serve_static(self.path[len(STATIC_PREFIX) :])
+                return
+
+            match = router.match(self.command, split_target(self.path)[0])
+            if not match:
+                self.send_error(404)
+                return
+            # Pages are only rendered for GET
+            request.route = match.pattern
+            self.send_response(405)
+            self.send_header("Allow", ", ".join(match.allowed_methods))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
 
     def do_POST(self):
-        self.execute_route(self.post_routes)
+        with track_request(self.command), self.profile():
+            self.execute_route()
 
-    def execute_route(self, routes):
-        for pattern, route in routes.items():
-            m = re.fullmatch(pattern, self.path)
-            if m:
-                route(*m.groups())
-                return
+    def profile(self):
+        return profile_request(self.command, self.path, self.headers)
+
+    def execute_route(self):
+        with stage("route"):
+            path, self.query = split_target(self.path)
+            match = router.match(self.command, path)
 
-        self._reply(404, "Not found")
+        if not match:
+            self._reply(404, "Not found")
+            return
+
+        current_request().route = match.pattern
+        if not match.handler:
+            self._reply(
+                405,
+                "Method not allowed",
+                headers={"Allow": ", ".join(match.allowed_methods)},
+            )
+            return
 
+        match.handler(self, *match.args)
+
+    @router.get(r"/onyo")
     def render_categories(self):
-        categories, recipes = list_recipes()
+        snapshot = current_recipes()
+        page = snapshot.view(ALL_RECIPES, DEFAULT_ORDER).page()
         self.reply_template(
             "index.html",
-            categories=categories,
-            recipes=recipes.values(),
+            categories=snapshot.categories,
+            recipes=page.recipes,
+            fragments_url=fragment_url(ALL_RECIPES),
+            next_url=page.next_cursor and fragment_url(ALL_RECIPES, page.next_cursor),
             user=self.get_authenticated_user(),
         )
 
+    @router.get(r"/onyo/categories/([^/]+)")
     def render_recipe_list(self, category_name):
-        categories, _ = list_recipes()
-        category = categories.get(category_name.lower())
+        snapshot = current_recipes()
+        cat_id = category_name.lower()
+        category = snapshot.categories.get(cat_id)
         if not category:
             self._reply(404, f"No category {category_name}")
             return
 
-        self.reply_template("recipe_list.html", category=category)
+        order = self.get_sort_order()
+        if not order:
+            return
+
+        view = snapshot.view(cat_id, order)
+        page = view.page()
+        next_url = page.next_cursor and fragment_url(cat_id, page.next_cursor, order=order)
+        self.reply_template(
+            "recipe_list.html",
+            category=category,
+            recipes=page.recipes,
+            recipe_count=len(view),
+            sort_orders=SORT_LABELS,
+            sort=order,
+            fragments_url=fragment_url(cat_id, order=order),
+            next_url=next_url,
+        )
+
+    @router.get(r"/onyo/fragments/recipes")
+    def render_recipe_fragment(self):
+        view_key = self.query.get("category", [ALL_RECIPES])[0].lower()
+        order = self.get_sort_order()
+        if not order:
+            return
+
+        view = current_recipes().view(view_key, order)
+        if view is None:
+            self._reply(404, f"No category {view_key}")
+            return
+
+        query = self.query.get("q", [""])[0]
+        try:
+            limit = int(self.query.get("limit", [PAGE_SIZE])[0])
+            if not 0 < limit <= MAX_PAGE_SIZE:
+                raise ValueError(f"Limit must be between 1 and {MAX_PAGE_SIZE}")
+            if "random" in self.query:
+                recipe = view.random_recipe()
+                page_recipes, next_cursor = ([recipe] if recipe else []), None
+            else:
+                page = view.page(self.query.get("cursor", [None])[0], limit, query)
+                page_recipes, next_cursor = page.recipes, page.next_cursor
+        except ValueError as e:
+            self._reply(400, str(e))
+            return
+
+        headers = {}
+        if next_cursor:
+            headers["X-Next-Url"] = fragment_url(
+                view_key, next_cursor, query, limit, order
+            )
+        with stage("render"):
+            html = template_env.get_template("_recipe_items.html").render(
+                recipes=page_recipes
+            )
+        self._reply(200, html, "text/html", headers)
+
+    def get_sort_order(self):
+        order = self.query.get("sort", [DEFAULT_ORDER])[0]
+        if order not in SORT_LABELS:
+            self._reply(400, f"Invalid sort order {order}")
+            return None
+        return order
+
+    # Registered before the single recipe routes, which would match it as well. GETs
+    # fall through to them, a recipe can still be called "import".
+    @router.post(IMPORT_PATH)
+    def import_recipes(self):
+        if not self.check_role(RECIPE_EDITOR):
+            return
+        # tarfile and multiprocessing are only needed here
+        from . import importer
 
+        self.body_pending = False
+        try:
+            body = read_body_bytes(self.rfile, self.headers, MAX_UPLOAD_SIZE)
+        except BodyError as e:
+            self._reply(e.status, e.message, headers={"Connection": "close"})
+            return
+
+        content_type = self.headers.get("Content-Type", "")
+        overwrite = self.query.get("overwrite", ["0"])[0] == "1"
+        try:
+            if content_type.split(";")[0].strip() in ARCHIVE_CONTENT_TYPES:
+                documents = importer.read_tar(io.BytesIO(body))
+            else:
+                documents = importer.read_multi_document_yaml(body.decode("utf8"))
+            result = importer.import_recipes(get_recipe_store(), documents, overwrite)
+        except (importer.RecipeImportError, UnicodeDecodeError) as e:
+            self._reply(400, str(e))
+            return
+        except VersionConflict as e:
+            self._reply(409, str(e))
+            return
+
+        status = 400 if result.errors else 200
+        self._reply(status, json.dumps(asdict(result)), "application/json")
+
+    @router.get(r"/onyo/recipes/([^/]+)/?")
     def render_recipe(self, recipe_id):
         recipe = self.lookup_recipe(recipe_id)
         if not recipe:
             return
 
-        shopping_ingredients = get_shopping_ingredients()
-        shopping_list = assemble_shopping_list(recipe, shopping_ingredients)
+        with stage("shopping_list"):
+            shopping_ingredients = get_shopping_ingredients()
+            shopping_list = assemble_shopping_list(recipe, shopping_ingredients)
         link = recipe_link(recipe_id)
-        back_link = f"/onyo/categories/{list(recipe.categories)[0]}"
+        back_link = f"/onyo/categories/{quote(list(recipe.categories)[0])}"
 
         self.reply_template(
             "recipe.html",
@@ -122,6 +358,7 @@ class SimpleRequestHandler(http.server.SimpleHTTPRequestHandler):
             user=self.get_authenticated_user(),
         )
 
+    @router.get(r"/onyo/recipes/([^/]+)/edit")
     def render_edit_recipe(self, recipe_id):
         recipe = self.lookup_recipe(recipe_id)
         if not recipe:
@@ -133,41 +370,79 @@ class SimpleRequestHandler(http.server.SimpleHTTPRequestHandler):
             "edit_recipe.html",
             recipe=recipe,
             recipe_yaml=recipe_yaml,
+            version=recipe_version(recipe_yaml),
         )
 
+    @router.post(r"/onyo/recipes/([^/]+)/edit")
     def edit_recipe(self, recipe_id):
         if not self.check_role(RECIPE_EDITOR):
             return
 
-        if not self.lookup_recipe(recipe_id):
+        recipe = self.lookup_recipe(recipe_id)
+        if not recipe:
             return
 
-        body_data = self.get_body_text()
-        # poor man's form parsing, since it's only one value
-        recipe_yaml = unquote_plus(body_data[len("recipe_yaml=") :]).replace("\r", "")
+        form = self.read_body()
+        if form is None:
+            return
+        recipe_yaml = str(form.get("recipe_yaml", "")).replace("\r", "")
+        version = form.get("version")
 
         # Try to load the recipe to make sure it's valid
         try:
             data = yaml.safe_load(recipe_yaml)
-            load_recipe(data, recipe_id.lower())
+            new_recipe = load_recipe(data, recipe.id)
         except Exception as e:  # pylint: disable=broad-exception-caught
             self._reply(400, f"Invalid recipe: {e}")
             return
 
-        save_recipe_yaml(recipe_id, recipe_yaml)
+        try:
+            get_recipe_store().save(recipe.id, recipe_yaml, data, new_recipe, version)
+        except VersionConflict:
+            self._reply(
+                409,
+                "The recipe was changed by someone else in the meantime. "
+                "Reload the editor and apply your changes again.",
+            )
+            return
 
         # redirect to avoid repost on refresh
         self.redirect(recipe_link(recipe_id))
 
+    @router.post(r"/onyo/recipes/([^/]+)/validate")
+    def validate_recipe_draft(self, recipe_id):
+        if not self.check_role(RECIPE_EDITOR):
+            return
+
+        snapshot = current_recipes()
+        if recipe_id.lower() not in snapshot.recipes:
+            self._reply(404, f"No recipe {recipe_id}")
+            return
+
+        form = self.read_body()
+        if form is None:
+            return
+        recipe_yaml = str(form.get("recipe_yaml", "")).replace("\r", "")
+
+        result = validate_draft(recipe_id.lower(), recipe_yaml, snapshot)
+        self._reply(200, json.dumps(asdict(result)), "application/json")
+
+    @router.post(r"/onyo/recipes")
     def add_recipe(self):
         if not self.check_role(RECIPE_EDITOR):
             return
 
-        body_data = self.get_body_text()
-        # poor man's form parsing, since it's only one value
-        recipe_name = unquote_plus(body_data[len("name=") :]).replace("\r", "")
+        form = self.read_body()
+        if form is None:
+            return
+        recipe_name = str(form.get("name", "")).replace("\r", "")
+        if not recipe_name.strip():
+            self._reply(400, "Missing recipe name")
+            return
 
-        recipe_id = create_empty_recipe(recipe_name)
+        store = get_recipe_store()
+        recipe_id = create_empty_recipe(recipe_name, store.recipe_dir)
+        store.reload([recipe_id])
 
         # redirect to newly created recipe
         self.redirect(recipe_link(recipe_id))
@@ -182,6 +457,163 @@ class SimpleRequestHandler(http.server.SimpleHTTPRequestHandler):
 
         return recipe
 
+    @router.get(r"/onyo/api/recipes")
+    def api_list_recipes(self):
+        fields = self.get_api_fields()
+        if fields is None:
+            return
+
+        _, recipes = list_recipes()
+        self.reply_json(serialize_recipes(list(recipes.values()), fields))
+
+    @router.get(r"/onyo/api/recipes/([^/]+)")
+    def api_get_recipe(self, recipe_id):
+        fields = self.get_api_fields()
+        if fields is None:
+            return
+
+        recipe = self.lookup_recipe(recipe_id)
+        if not recipe:
+            return
+
+        self.reply_json(serialize_recipe(recipe, fields))
+
+    @router.get(r"/onyo/api/search")
+    def api_search(self):
+        index = get_search_index()
+        if not index:
+            self._reply(404, "Search index is not enabled (set ONYO_SEARCH_INDEX)")
+            return
+        try:
+            limit = int(self.query.get("limit", [20])[0])
+            if limit < 1:
+                raise ValueError()
+        except ValueError:
+            self._reply(400, "Invalid limit")
+            return
+
+        # Applies recipe file changes to the index
+        current_recipes()
+        hits = index.search(self.query.get("q", [""])[0], limit)
+        self.reply_json(json.dumps([asdict(h) for h in hits]).encode())
+
+    @router.get(r"/onyo/api/pantry")
+    def api_pantry(self):
+        available = parse_available(self.query.get("have", []))
+        if not available:
+            self._reply(400, "No ingredients given (have=...)")
+            return
+        try:
+            limit = int(self.query.get("limit", [20])[0])
+            max_missing = self.query.get("max_missing", [None])[0]
+            max_missing = None if max_missing is None else int(max_missing)
+            if limit < 1 or (max_missing is not None and max_missing < 0):
+                raise ValueError()
+        except ValueError:
+            self._reply(400, "Invalid limit or max_missing")
+            return
+
+        result = query_pantry(available, limit, max_missing)
+        self.reply_json(json.dumps(asdict(result)).encode())
+
+    @router.get(r"/onyo/api/categories")
+    def api_list_categories(self):
+        categories, _ = list_recipes()
+        self.reply_json(serialize_categories(categories))
+
+    def get_api_fields(self):
+        raw_fields = self.query.get("fields", [None])[0]
+        try:
+            return parse_fields(raw_fields)
+        except ValueError as e:
+            self._reply(400, str(e))
+            return None
+
+    @router.get(r"/onyo/precache.json")
+    def render_precache_manifest(self):
+        categories, recipes = list_recipes()
+        manifest = get_server_precache_manifest(
+            categories, recipes, get_shopping_ingredients()
+        )
+        self.reply_json(json.dumps(manifest).encode())
+
+    @router.get(r"/onyo/service_worker.js")
+    def render_service_worker(self):
+        # Served from /onyo instead of /onyo/static so it may control all pages
+        self.serve_static(SERVICE_WORKER_FILE, {"Service-Worker-Allowed": "/onyo"})
+
+    def serve_static(self, target, extra_headers=None):
+        path, query = split_target(target)
+        static_file = static_files.lookup(unquote(path))
+        if not static_file:
+            self.send_error(404)
+            return
+
+        headers = {**static_file.headers, **(extra_headers or {})}
+        if static_file.version and query.get("v") == [static_file.version]:
+            headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        if self.is_not_modified(static_file):
+            self.send_response(304)
+            for name in ("ETag", "Last-Modified", "Cache-Control"):
+                self.send_header(name, headers[name])
+            self.end_headers()
+            return
+
+        byte_range = None
+        if_range = self.headers.get("If-Range")
+        if if_range is None or if_range == static_file.etag:
+            byte_range = parse_range(self.headers.get("Range"), static_file.size)
+        if byte_range == "invalid":
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{static_file.size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start, end = byte_range or (0, static_file.size - 1)
+        length = end - start + 1
+        self.send_response(206 if byte_range else 200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if byte_range:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{static_file.size}")
+        self.send_header("Content-Length", str(length))
+        with stage("write"):
+            self.end_headers()
+            if self.command == "HEAD" or not length:
+                return
+            if static_file.body is not None:
+                self.wfile.write(memoryview(static_file.body)[start : end + 1])
+            else:
+                # Only the threaded server has a real socket to sendfile to
+                connection = getattr(self, "connection", None)
+                send_file_range(
+                    connection if isinstance(connection, socket.socket) else None,
+                    self.wfile,
+                    static_file.path,
+                    start,
+                    length,
+                )
+
+    def is_not_modified(self, static_file):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return etag_matches(if_none_match, static_file.etag)
+
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if not if_modified_since:
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return static_file.signature[0] // 1_000_000_000 <= since
+
+    @router.get(r"/onyo/metrics")
+    def render_metrics(self):
+        self._reply(200, METRICS.render_prometheus(), "text/plain; version=0.0.4")
+
+    @router.get(r"/onyo/ideas")
     def render_ideas(self):
         ideas = list_ideas_for_html()
         self.reply_template(
@@ -190,25 +622,30 @@ class SimpleRequestHandler(http.server.SimpleHTTPRequestHandler):
             user=self.get_authenticated_user(),
         )
 
+    @router.post(r"/onyo/ideas")
     def add_idea(self):
         if not self.check_role(IDEA_EDITOR):
             return
 
-        body_data = self.get_body_text()
-        # poor man's form parsing, since it's only one value
-        text = unquote_plus(body_data[len("text=") :])
+        form = self.read_body()
+        if form is None:
+            return
+        text = str(form.get("text", ""))
 
         add_idea(Idea(text))
 
         # redirect to avoid repost on refresh
         self.redirect("/onyo/ideas")
 
+    @router.post(r"/onyo/ideas/([^/]+)")
     def delete_idea(self, idea_guid):
         if not self.check_role(IDEA_EDITOR):
             return
 
-        body_data = self.get_body_text()
-        if body_data != "action=delete":
+        form = self.read_body()
+        if form is None:
+            return
+        if form.get("action") != "delete":
             self._reply(400, "Invalid action")
             return
 
@@ -217,9 +654,14 @@ class SimpleRequestHandler(http.server.SimpleHTTPRequestHandler):
         # redirect to avoid repost on refresh
         self.redirect("/onyo/ideas")
 
-    def get_body_text(self):
-        content_length = int(self.headers["Content-Length"])
-        return bytes.decode(self.rfile.read(content_length))
+    def read_body(self, max_size=MAX_BODY_SIZE):
+        self.body_pending = False
+        try:
+            return read_body_fields(self.rfile, self.headers, max_size)
+        except BodyError as e:
+            # The rest of the body is still unread, so the connection can't be reused
+            self._reply(e.status, e.message, headers={"Connection": "close"})
+            return None
 
     def check_role(self, required_role):
         user = self.get_authenticated_user()
@@ -244,25 +686,116 @@ class SimpleRequestHandler(http.server.SimpleHTTPRequestHandler):
         )
 
     def reply_template(self, template_file, **kw_args):
-        template = self.template_env.get_template(template_file)
-        self._reply(200, template.render(kw_args), "text/html")
+        with stage("render"):
+            template = template_env.get_template(template_file)
+            chunks = buffered_chunks(template.generate(kw_args), STREAM_CHUNK_SIZE)
+            first_chunk = next(chunks, b"")
+            second_chunk = next(chunks, None)
+
+        # Small pages are sent as a whole with a known length
+        if second_chunk is None:
+            self._reply(200, first_chunk, "text/html")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-type", "text/html")
+        chunked = self.supports_chunked()
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            # No length known, so the end of the body is signalled by closing
+            self.close_connection = True
+        with stage("write"):
+            self.end_headers()
+            self.write_chunk(first_chunk, chunked)
+            self.write_chunk(second_chunk, chunked)
+
+        while True:
+            with stage("render"):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            with stage("write"):
+                self.write_chunk(chunk, chunked)
+
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+
+    def supports_chunked(self):
+        return (
+            self.protocol_version >= "HTTP/1.1" and self.request_version >= "HTTP/1.1"
+        )
+
+    def write_chunk(self, chunk, chunked):
+        if chunked:
+            self.wfile.write(f"{len(chunk):X}\r\n".encode() + chunk + b"\r\n")
+        else:
+            self.wfile.write(chunk)
+
+    def reply_json(self, body: bytes):
+        etag = compute_etag(body)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(self.headers.get("If-None-Match"), etag):
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+
+        self._reply(200, body, "application/json", headers)
+
+    def _reply(self, status, body, content_type=None, headers=None):
+        if isinstance(body, str):
+            body = body.encode()
 
-    def _reply(self, status, body, content_type=None):
         self.send_response(status)
         if content_type:
             self.send_header("Content-type", content_type)
-        self.end_headers()
-        self.wfile.write(body.encode())
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        with stage("write"):
+            self.end_headers()
+            self.wfile.write(body)
+
+    def send_response(self, code, message=None):
+        request = current_request()
+        if request:
+            request.status = code
+        # Replies sent before reading the body (401, 404, ...) must skip it, or it
+        # would be parsed as the next request of the connection
+        reusable = True
+        if self.body_pending:
+            self.body_pending = False
+            reusable = discard_body(self.rfile, self.headers)
+        super().send_response(code, message)
+        if not reusable:
+            self.send_header("Connection", "close")
 
     def redirect(self, path):
         self.send_response(302)
         self.send_header("Location", path)
+        self.send_header("Content-Length", "0")
         self.end_headers()
 
 
-def recipe_link(recipe_id):
-    return f"/onyo/recipes/{recipe_id}"
+def buffered_chunks(parts, chunk_size):
+    # Jinja yields many tiny strings, group them into reasonably sized writes
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield "".join(buffer).encode()
+            buffer = []
+            size = 0
+
+    if buffer:
+        yield "".join(buffer).encode()
+
 
+router.compile()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,146 @@
+"""Alternative server on asyncio.
+
+Only connection handling runs on the event loop: reading requests and sending
+responses to slow clients. The handlers themselves are the synchronous ones of
+the threaded server and run whole in a thread pool, one thread per request in
+progress. So this mode offers no concurrency gain over the threaded server for
+the handlers. It only frees the threads of slow clients receiving responses
+that were already built in memory. It speaks HTTP/1.0 with one request per
+connection (no keep-alive).
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import io
+import re
+import traceback
+
+HEADER_TIMEOUT = 30
+BODY_TIMEOUT = 60
+MAX_WORKERS = 16
+# Responses written in parts (static files, pages) wait for the client beyond this
+STREAM_BUFFER_SIZE = 256 * 1024
+CONTENT_LENGTH_PATTERN = re.compile(rb"\r\ncontent-length:[ \t]*(\d+)", re.IGNORECASE)
+HEADERS_TOO_LARGE = (
+    b"HTTP/1.0 431 Request Header Fields Too Large\r\n"
+    b"Content-Length: 0\r\nConnection: close\r\n\r\n"
+)
+
+
+def executor_handler_class(handler_class):
+    # Runs the regular request handler against an in-memory request and a writer
+    # that streams back through the event loop, so routes and handlers are shared
+    # with the threaded server.
+    class ExecutorRequestHandler(handler_class):
+        # One request per connection; the end of streamed bodies is signalled by closing
+        protocol_version = "HTTP/1.0"
+
+        def setup(self):
+            raw_request, self.wfile = self.request
+            self.rfile = io.BytesIO(raw_request)
+
+        def finish(self):
+            self.rfile.close()
+
+    return ExecutorRequestHandler
+
+
+class LoopWriter:
+    # File-like object for handlers running in the executor. Writes are handed to the
+    # event loop without waiting for the client, handle_connection drains them once
+    # the handler is done. So a slow client holds its buffered response and a
+    # coroutine, not one of the few executor threads. Only once more than
+    # STREAM_BUFFER_SIZE is buffered, a further write waits for the client, so large
+    # files are streamed instead of read into memory as a whole.
+    def __init__(self, loop, writer):
+        self.loop = loop
+        self.writer = writer
+        self.buffered = 0
+
+    def write(self, data):
+        if self.buffered > STREAM_BUFFER_SIZE:
+            # Scheduled after the pending writes, so it waits for them too
+            asyncio.run_coroutine_threadsafe(self.writer.drain(), self.loop).result(BODY_TIMEOUT)
+            self.buffered = 0
+        self.loop.call_soon_threadsafe(self.writer.write, bytes(data))
+        self.buffered += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class AsyncioServer:
+    def __init__(self, handler_class, max_workers=MAX_WORKERS):
+        self.handler_class = executor_handler_class(handler_class)
+        # Handlers reload recipes and write YAML files, which blocks. They run here.
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    async def serve(self, host, port, started=None):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        if started:
+            started(server)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            raw_request = await self.read_request(reader, writer)
+            if raw_request is None:
+                return
+
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                self.executor,
+                self.handler_class,
+                (raw_request, LoopWriter(loop, writer)),
+                writer.get_extra_info("peername"),
+                None,
+            )
+            # The writes were scheduled before the executor future completed
+            await asyncio.wait_for(writer.drain(), BODY_TIMEOUT)
+        except (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        except Exception:  # pylint: disable=broad-exception-caught
+            traceback.print_exc()
+        finally:
+            writer.close()
+
+    async def read_request(self, reader, writer):
+        try:
+            head = await asyncio.wait_for(
+                reader.readuntil(b"\r\n\r\n"), HEADER_TIMEOUT
+            )
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            # Larger than the stream limit, tell the client before closing
+            writer.write(HEADERS_TOO_LARGE)
+            await asyncio.wait_for(writer.drain(), BODY_TIMEOUT)
+            return None
+
+        m = CONTENT_LENGTH_PATTERN.search(head)
+        target = head.split(b" ", 2)[1].decode("latin-1") if head.count(b" ") >= 2 else ""
+        if not m or int(m.group(1)) > self.handler_class.max_body_size(target):
+            # The handler rejects oversized bodies without reading them
+            return head
+
+        body = await asyncio.wait_for(reader.readexactly(int(m.group(1))), BODY_TIMEOUT)
+        return head + body
+
+
+def serve_asyncio(handler_class, port, host=""):
+    server = AsyncioServer(handler_class)
+    try:
+        asyncio.run(
+            server.serve(
+                host or None,
+                port,
+                started=lambda _: print(
+                    f"Listening on port http://localhost:{port} (asyncio)", flush=True
+                ),
+            )
+        )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.executor.shutdown(wait=False)
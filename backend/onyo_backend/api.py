@@ -0,0 +1,130 @@
+import hashlib
+import json
+
+from onyo_backend.recipes import Category, Ingredient, Recipe
+
+RECIPE_FIELDS = (
+    "id",
+    "name",
+    "categories",
+    "icon",
+    "ingredient_groups",
+    "steps",
+    "notes",
+    "warnings",
+)
+
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+# recipe id -> (recipe the fragments were built from, field -> pre-serialized "field":value)
+_fragment_cache: dict[str, tuple[Recipe, dict[str, bytes]]] = {}
+
+
+def parse_fields(raw_fields: str | None) -> tuple[str, ...]:
+    if not raw_fields:
+        return RECIPE_FIELDS
+
+    fields = tuple(f.strip() for f in raw_fields.split(",") if f.strip())
+    if not fields:
+        raise ValueError("No fields given")
+    unknown = [f for f in fields if f not in RECIPE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    return fields
+
+
+def serialize_recipe(recipe: Recipe, fields=RECIPE_FIELDS) -> bytes:
+    fragments = recipe_fragments(recipe)
+    return b"{" + b",".join(fragments[f] for f in fields) + b"}"
+
+
+def serialize_recipes(recipes, fields=RECIPE_FIELDS) -> bytes:
+    body = b"[" + b",".join(serialize_recipe(r, fields) for r in recipes) + b"]"
+    prune_fragment_cache({r.id for r in recipes})
+    return body
+
+
+def serialize_categories(categories: dict[str, Category]) -> bytes:
+    return _encode(
+        [
+            {"name": c.name, "recipes": [r.id for r in c.recipes]}
+            for c in sorted(categories.values(), key=lambda c: c.name)
+        ]
+    ).encode()
+
+
+def recipe_fragments(recipe: Recipe) -> dict[str, bytes]:
+    # Recipes are replaced by new objects whenever their file changes,
+    # so the object identity tells us whether the cached bytes are still current.
+    cached = _fragment_cache.get(recipe.id)
+    if cached and cached[0] is recipe:
+        return cached[1]
+
+    fragments = {
+        f: f'"{f}":'.encode() + _encode(value).encode()
+        for f, value in recipe_to_primitives(recipe).items()
+    }
+    _fragment_cache[recipe.id] = (recipe, fragments)
+    return fragments
+
+
+def prune_fragment_cache(live_recipe_ids: set[str]):
+    if len(_fragment_cache) <= len(live_recipe_ids):
+        return
+
+    for recipe_id in list(_fragment_cache):
+        if recipe_id not in live_recipe_ids:
+            _fragment_cache.pop(recipe_id, None)
+
+
+def recipe_to_primitives(recipe: Recipe) -> dict:
+    return {
+        "id": recipe.id,
+        "name": recipe.name,
+        "categories": sorted(recipe.categories),
+        "icon": recipe.icon,
+        "ingredient_groups": [
+            {
+                "title": g.title,
+                "ingredients": [ingredient_to_primitives(i) for i in g.ingredients],
+            }
+            for g in recipe.ingredient_groups
+        ],
+        "steps": [
+            {
+                "title": s.title,
+                "tasks": [{"parts": [vars(p) for p in t.parts]} for t in s.tasks],
+                "ingredients": [ingredient_to_primitives(i) for i in s.ingredients],
+                "timers": [vars(t) for t in s.timers],
+            }
+            for s in recipe.steps
+        ],
+        "notes": [{"parts": [vars(p) for p in n.parts]} for n in recipe.notes],
+        "warnings": [vars(w) for w in recipe.warnings],
+    }
+
+
+def ingredient_to_primitives(ingr: Ingredient) -> dict:
+    return {
+        "name": ingr.name,
+        "text": ingr.text,
+        "mise": ingr.mise.value,
+        "linked_recipe_id": ingr.linked_recipe_id,
+    }
+
+
+def compute_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+
+    return False
@@ -0,0 +1,102 @@
+import json
+import math
+from pathlib import Path
+import shutil
+
+from onyo_backend.precache import content_hash
+from onyo_backend.recipes import Ingredient, IngredientPart, Mise, Recipe, TextPart, TimerPart
+from onyo_backend.shopping_list import ShoppingIngredient, assemble_shopping_list
+
+# Compact output of generate-static --bundle: instead of a rendered page per recipe,
+# one shell page (recipe.html#<id>) renders the recipes on the client from sharded
+# JSON files. Shard names contain their content hash, so unchanged shards keep their
+# URL between deploys. static/recipe_bundle.js reads this format.
+BUNDLE_DIR = "bundle"
+SHELL_PAGE = "recipe.html"
+DEFAULT_SHARD_SIZE = 500
+
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+def shard_of(recipe_id: str, shard_count: int) -> int:
+    # 32 bit FNV-1a of the UTF-8 id, the client computes the same to find a recipe
+    h = 0x811C9DC5
+    for b in recipe_id.encode():
+        h = ((h ^ b) * 0x01000193) & 0xFFFFFFFF
+    return h % shard_count
+
+
+def write_bundle(
+    output_dir: Path,
+    recipes: dict[str, Recipe],
+    shopping_ingredients: dict[str, ShoppingIngredient],
+    shard_size=DEFAULT_SHARD_SIZE,
+) -> dict[str, str]:
+    # Returns the URL -> hash of the written shards, in shard order
+    bundle_dir = output_dir / BUNDLE_DIR
+    # Shards of a previous run have other names
+    shutil.rmtree(bundle_dir, ignore_errors=True)
+    bundle_dir.mkdir(parents=True)
+
+    shard_count = max(1, math.ceil(len(recipes) / shard_size))
+    shards = [{} for _ in range(shard_count)]
+    for recipe in sorted(recipes.values(), key=lambda r: r.id):
+        shards[shard_of(recipe.id, shard_count)][recipe.id] = compact_recipe(
+            recipe, shopping_ingredients
+        )
+
+    shard_hashes = {}
+    for i, shard in enumerate(shards):
+        content = _encode(shard)
+        h = content_hash(content)
+        url = f"{BUNDLE_DIR}/recipes-{i}.{h}.json"
+        (output_dir / url).write_text(content, encoding="utf8")
+        shard_hashes[url] = h
+    return shard_hashes
+
+
+def compact_recipe(recipe: Recipe, shopping_ingredients) -> dict:
+    shop_list = assemble_shopping_list(recipe, shopping_ingredients)
+    return {
+        "name": recipe.name,
+        "category": min(recipe.categories, default=""),
+        "groups": [
+            [g.title, [compact_ingredient(i) for i in g.ingredients]]
+            for g in recipe.ingredient_groups
+        ],
+        "steps": [
+            [
+                s.title,
+                [compact_parts(t.parts) for t in s.tasks],
+                [compact_ingredient(i) for i in s.ingredients],
+            ]
+            for s in recipe.steps
+        ],
+        "notes": [compact_parts(n.parts) for n in recipe.notes],
+        "shopping": "\n".join(
+            f"{item.link} {item.text}" if item.link else item.text
+            for item in shop_list.items
+        ),
+    }
+
+
+def compact_ingredient(ingr: Ingredient) -> list:
+    # [text, mise, linked recipe id] without the trailing defaults
+    mise = "" if ingr.mise == Mise.NONE else ingr.mise.value
+    compact = [ingr.text, mise, ingr.linked_recipe_id or ""]
+    while len(compact) > 1 and not compact[-1]:
+        compact.pop()
+    return compact
+
+
+def compact_parts(parts) -> list:
+    # Plain text parts are strings, the others [type, text, style/index/seconds]
+    compact = []
+    for part in parts:
+        if isinstance(part, TextPart):
+            compact.append(["t", part.text, part.style] if part.style else part.text)
+        elif isinstance(part, IngredientPart):
+            compact.append(["i", part.text, part.ingr_index_in_step])
+        elif isinstance(part, TimerPart):
+            compact.append(["s", part.text, part.seconds])
+    return compact
@@ -0,0 +1,139 @@
+from collections import ChainMap
+from dataclasses import dataclass, field
+import re
+import threading
+
+import yaml
+
+from onyo_backend.recipes import Recipe, load_recipe, recipe_version, resolve_links
+
+MAX_CACHED_RESULTS = 256
+STEP_CONTEXT = re.compile(r"step (\d+)(?:, task (\d+))?")
+INVALID_LINK = re.compile(r"Ingredient link (.+) is not valid")
+
+_cache: dict[tuple[str, str, int], "DraftValidation"] = {}
+_cache_lock = threading.Lock()
+
+
+@dataclass
+class DraftProblem:
+    message: str
+    # 1-based, None if the problem can't be attributed to a line
+    line: int | None = None
+    column: int | None = None
+    context: str = ""
+
+
+@dataclass
+class DraftValidation:
+    valid: bool = True
+    errors: list[DraftProblem] = field(default_factory=list)
+    warnings: list[DraftProblem] = field(default_factory=list)
+
+
+def validate_draft(recipe_id, recipe_yaml, snapshot) -> DraftValidation:
+    # The editor calls this while typing, so results are kept per draft. They depend
+    # on the other recipes for links, hence the store generation in the key.
+    key = (recipe_id, recipe_version(recipe_yaml), snapshot.generation)
+    with _cache_lock:
+        result = _cache.get(key)
+    if result:
+        return result
+
+    result = check_draft(recipe_id, recipe_yaml, snapshot.recipes)
+    with _cache_lock:
+        if len(_cache) >= MAX_CACHED_RESULTS:
+            del _cache[next(iter(_cache))]
+        _cache[key] = result
+    return result
+
+
+def check_draft(recipe_id, recipe_yaml, recipes: dict[str, Recipe]) -> DraftValidation:
+    try:
+        data, root = load_with_nodes(recipe_yaml)
+    except yaml.MarkedYAMLError as e:
+        mark = e.problem_mark or e.context_mark
+        return DraftValidation(
+            valid=False,
+            errors=[
+                DraftProblem(
+                    message=f"{e.problem or e}",
+                    line=mark.line + 1 if mark else None,
+                    column=mark.column + 1 if mark else None,
+                )
+            ],
+        )
+
+    try:
+        if not isinstance(data, dict):
+            raise ValueError("Not a recipe")
+        recipe = load_recipe(data, recipe_id)
+    except KeyError as e:
+        return DraftValidation(
+            valid=False, errors=[DraftProblem(message=f"Missing field {e}")]
+        )
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        return DraftValidation(
+            valid=False, errors=[DraftProblem(message=f"{type(e).__name__}: {e}")]
+        )
+
+    # Links are checked against the loaded recipes, with the draft in place of the
+    # saved version, without copying them
+    resolve_links(ChainMap({recipe.id: recipe}, recipes), [recipe])
+    return DraftValidation(
+        warnings=[
+            DraftProblem(
+                message=w.msg,
+                line=warning_line(root, w.msg, w.extra_context),
+                context=w.extra_context,
+            )
+            for w in recipe.warnings
+        ]
+    )
+
+
+def load_with_nodes(text):
+    # Parses once, returning the data and the node tree with line numbers
+    loader = yaml.SafeLoader(text)
+    try:
+        root = loader.get_single_node()
+        return (loader.construct_document(root) if root else None), root
+    finally:
+        loader.dispose()
+
+
+def warning_line(root, message, context) -> int | None:
+    node = None
+    link = INVALID_LINK.match(message)
+    step = STEP_CONTEXT.match(context)
+    if link:
+        ingredients = mapping_value(root, "ingredients")
+        node = next(
+            (
+                n
+                for n in sequence_items(ingredients)
+                if f"~{link.group(1)}~" in str(n.value).lower()
+            ),
+            None,
+        )
+    elif step:
+        node = nth(sequence_items(mapping_value(root, "steps")), int(step.group(1)))
+        if step.group(2):
+            node = nth(sequence_items(mapping_value(node, "tasks")), int(step.group(2)))
+    return node.start_mark.line + 1 if node else None
+
+
+def mapping_value(node, key):
+    if isinstance(node, yaml.MappingNode):
+        for key_node, value_node in node.value:
+            if key_node.value == key:
+                return value_node
+    return None
+
+
+def sequence_items(node):
+    return node.value if isinstance(node, yaml.SequenceNode) else []
+
+
+def nth(items, number):
+    return items[number - 1] if 0 < number <= len(items) else None
@@ -0,0 +1,132 @@
+import json
+import os
+from urllib.parse import unquote_to_bytes
+
+MAX_BODY_SIZE = int(os.environ.get("ONYO_MAX_BODY_SIZE", 1024 * 1024))
+# For bulk recipe imports
+MAX_UPLOAD_SIZE = int(os.environ.get("ONYO_MAX_UPLOAD_SIZE", 32 * 1024 * 1024))
+READ_CHUNK_SIZE = 64 * 1024
+FORM_CONTENT_TYPE = "application/x-www-form-urlencoded"
+JSON_CONTENT_TYPE = "application/json"
+
+
+class BodyError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# Incremental application/x-www-form-urlencoded parser. Complete fields are decoded
+# as soon as their terminating "&" arrives, only the last incomplete one is buffered.
+class FormParser:
+    def __init__(self):
+        self.fields: dict[str, str] = {}
+        self._pending = bytearray()
+
+    def feed(self, chunk: bytes):
+        self._pending += chunk
+        end = self._pending.rfind(b"&")
+        if end < 0:
+            return
+
+        for raw_field in self._pending[:end].split(b"&"):
+            self.add_field(raw_field)
+        del self._pending[: end + 1]
+
+    def close(self) -> dict[str, str]:
+        self.add_field(self._pending)
+        self._pending = bytearray()
+        return self.fields
+
+    def add_field(self, raw_field: bytearray):
+        if not raw_field:
+            return
+        name, _, value = raw_field.partition(b"=")
+        # Like parse_qs, the first value of a repeated field wins
+        self.fields.setdefault(decode_form_bytes(name), decode_form_bytes(value))
+
+
+def decode_form_bytes(raw: bytearray) -> str:
+    try:
+        if b"%" not in raw and b"+" not in raw:
+            return raw.decode("utf8")
+        return unquote_to_bytes(bytes(raw).replace(b"+", b" ")).decode("utf8")
+    except UnicodeDecodeError as e:
+        raise BodyError(400, "Form data is not valid UTF-8") from e
+
+
+def read_body_fields(rfile, headers, max_size=MAX_BODY_SIZE) -> dict:
+    content_length = get_content_length(headers, max_size)
+    content_type = headers.get("Content-Type", FORM_CONTENT_TYPE)
+    media_type = content_type.split(";")[0].strip().lower()
+
+    if media_type == FORM_CONTENT_TYPE:
+        parser = FormParser()
+        for chunk in read_chunks(rfile, content_length):
+            parser.feed(chunk)
+        return parser.close()
+
+    if media_type == JSON_CONTENT_TYPE:
+        body = bytearray()
+        for chunk in read_chunks(rfile, content_length):
+            body += chunk
+        try:
+            fields = json.loads(body)
+        except ValueError as e:
+            raise BodyError(400, f"Invalid JSON: {e}") from e
+        if not isinstance(fields, dict):
+            raise BodyError(400, "JSON body must be an object")
+        return fields
+
+    raise BodyError(415, f"Unsupported content type {content_type}")
+
+
+def read_body_bytes(rfile, headers, max_size=MAX_BODY_SIZE) -> bytearray:
+    body = bytearray()
+    for chunk in read_chunks(rfile, get_content_length(headers, max_size)):
+        body += chunk
+    return body
+
+
+def discard_body(rfile, headers, max_size=MAX_BODY_SIZE) -> bool:
+    # Skips a body nobody read, e.g. of a rejected request. Returns whether the
+    # connection can still be used for the next request.
+    if "Content-Length" not in headers and "Transfer-Encoding" not in headers:
+        return True
+    try:
+        for _ in read_chunks(rfile, get_content_length(headers, max_size)):
+            pass
+    except (BodyError, OSError):
+        return False
+    return True
+
+
+def get_content_length(headers, max_size) -> int:
+    if "chunked" in headers.get("Transfer-Encoding", "").lower():
+        raise BodyError(411, "Chunked request bodies are not supported")
+
+    raw_length = headers.get("Content-Length")
+    if raw_length is None:
+        raise BodyError(411, "Content-Length required")
+    try:
+        content_length = int(raw_length)
+    except ValueError as e:
+        raise BodyError(400, f"Invalid Content-Length {raw_length}") from e
+    if content_length < 0:
+        raise BodyError(400, f"Invalid Content-Length {raw_length}")
+
+    # Rejected before reading anything
+    if content_length > max_size:
+        raise BodyError(413, f"Request body larger than {max_size} bytes")
+    return content_length
+
+
+def read_chunks(rfile, content_length, chunk_size=READ_CHUNK_SIZE):
+    remaining = content_length
+    while remaining:
+        chunk = rfile.read(min(chunk_size, remaining))
+        if not chunk:
+            raise BodyError(400, "Request body ended early")
+        remaining -= len(chunk)
+        yield chunk
@@ -0,0 +1,124 @@
+from pathlib import Path
+import subprocess
+
+import yaml
+
+from onyo_backend.store import RecipeStore
+
+
+class GitError(Exception):
+    pass
+
+
+# Reads the recipes of a git revision straight from the object database of the
+# repository containing recipe_dir, without touching the working tree. Blob hashes are
+# the signatures, so after the revision moves (e.g. a git pull) only blobs that
+# actually changed are parsed again. If the tree of the recipe directory didn't change
+# at all, nothing is listed either.
+class GitRecipeStore(RecipeStore):
+    def __init__(self, recipe_dir: Path, rev="HEAD"):
+        super().__init__(recipe_dir)
+        self.rev = rev
+        self._tree = None
+        self._scanned = {}
+        self._commit = None
+        self._commit_ns = 0
+
+    def scan(self) -> dict[str, tuple[Path, tuple]]:
+        # "<rev>:./" is the recipe directory at rev, relative to the -C directory
+        commit, tree = git(
+            self.recipe_dir,
+            "rev-parse",
+            f"{self.rev}^{{commit}}",
+            f"{self.rev}:./",
+        ).split()
+        if commit != self._commit:
+            self._commit = commit
+            commit_time = git(self.recipe_dir, "show", "-s", "--format=%ct", commit)
+            self._commit_ns = int(commit_time) * 1_000_000_000
+        if tree == self._tree:
+            return self._scanned
+
+        scanned = {}
+        for name, blob in list_tree(self.recipe_dir, tree).items():
+            if name.endswith(".yaml"):
+                scanned[name[: -len(".yaml")].lower()] = (self.recipe_dir / name, (blob,))
+        self._tree, self._scanned = tree, scanned
+        return scanned
+
+    def modified_time(self, signature) -> int:
+        # Per file history would need a walk over all commits. The time of the commit
+        # a blob was first seen in is enough to put new changes first.
+        return self._commit_ns
+
+    def load_files(self, scanned) -> dict[str, dict | None]:
+        blobs = read_blobs(self.recipe_dir, [blob for _, (blob,) in scanned.values()])
+        loaded = {}
+        for recipe_id, (path, (blob,)) in scanned.items():
+            self.errors.pop(recipe_id, None)
+            try:
+                loaded[recipe_id] = yaml.safe_load(blobs[blob].decode("utf8"))
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self.add_error(recipe_id, f"{path} ({self.rev})", e)
+                loaded[recipe_id] = None
+        return loaded
+
+    def write(self, entries):
+        raise GitError(f"Recipes read from git revision {self.rev} can't be changed")
+
+
+def git(repo_dir: Path, *args, stdin: bytes | None = None) -> str:
+    return git_bytes(repo_dir, *args, stdin=stdin).decode("utf8")
+
+
+def git_bytes(repo_dir: Path, *args, stdin: bytes | None = None) -> bytes:
+    try:
+        result = subprocess.run(
+            ["git", "-C", str(repo_dir), *args],
+            input=stdin,
+            capture_output=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError) as e:
+        stderr = getattr(e, "stderr", b"") or b""
+        raise GitError(f"git {args[0]} failed: {stderr.decode().strip() or e}") from e
+    return result.stdout
+
+
+def list_tree(repo_dir: Path, tree) -> dict[str, str]:
+    # name -> blob hash of the files directly in tree
+    entries = {}
+    # Without --full-tree, entries outside of the -C directory would be left out
+    for entry in git(repo_dir, "ls-tree", "--full-tree", "-z", tree).split("\0"):
+        if not entry:
+            continue
+        info, name = entry.split("\t", 1)
+        _, object_type, object_hash = info.split()
+        if object_type == "blob":
+            entries[name] = object_hash
+    return entries
+
+
+def read_blobs(repo_dir: Path, hashes: list[str]) -> dict[str, bytes]:
+    # All blobs in one "git cat-file --batch" call
+    if not hashes:
+        return {}
+
+    output = git_bytes(
+        repo_dir, "cat-file", "--batch", stdin="\n".join(hashes).encode() + b"\n"
+    )
+    blobs = {}
+    position = 0
+    for _ in hashes:
+        header_end = output.index(b"\n", position)
+        header = output[position:header_end].decode().split()
+        if len(header) != 3:
+            raise GitError(f"Missing object {header[0]}")
+        object_hash, object_type, size = header
+        if object_type != "blob":
+            raise GitError(f"{object_hash} is a {object_type}, not a blob")
+        start = header_end + 1
+        blobs[object_hash] = output[start : start + int(size)]
+        # Content is followed by a newline
+        position = start + int(size) + 1
+    return blobs
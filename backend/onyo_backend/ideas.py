@@ -1,11 +1,15 @@
 from dataclasses import dataclass, field
+import os
 from pathlib import Path
 import re
 import uuid
-from dataclasses_json import dataclass_json
 import yaml
 
-DATA_DIR = Path(__file__).parent.parent.parent / "data"
+from onyo_backend.lazy import dataclass_json
+
+DATA_DIR = Path(
+    os.environ.get("ONYO_DATA_DIR", Path(__file__).parent.parent.parent / "data")
+)
 IDEAS_FILE = DATA_DIR / "ideas.yml"
 URL_PATTERN = re.compile(r"https?://[^\s]+")
 
@@ -0,0 +1,157 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import multiprocessing
+import os
+from pathlib import Path
+import re
+import tarfile
+
+import yaml
+
+from onyo_backend.recipes import Recipe, load_recipe, normalize_for_recipe_id
+
+RECIPE_SUFFIXES = (".yaml", ".yml")
+DOCUMENT_SEPARATOR = re.compile(r"^---[ \t]*$", re.MULTILINE)
+# Below this, starting worker processes costs more than validating inline
+PARALLEL_THRESHOLD = 32
+MAX_UNPACKED_SIZE = 256 * 1024 * 1024
+
+
+class RecipeImportError(Exception):
+    pass
+
+
+@dataclass
+class ImportDocument:
+    source: str
+    recipe_yaml: str
+    # Recipe file name without .yaml. Derived from the recipe name if empty.
+    file_name: str = ""
+
+
+@dataclass
+class ValidatedRecipe:
+    source: str
+    file_name: str
+    recipe_yaml: str
+    data: dict
+    recipe: Recipe
+
+
+@dataclass
+class ImportResult:
+    imported: list[str] = field(default_factory=list)
+    # source -> error
+    errors: dict[str, str] = field(default_factory=dict)
+
+
+def read_source(path: Path) -> list[ImportDocument]:
+    if path.is_dir():
+        return read_directory(path)
+    if tarfile.is_tarfile(path):
+        with open(path, "rb") as file:
+            return read_tar(file)
+    return read_multi_document_yaml(path.read_text(encoding="utf8"), path.name)
+
+
+def read_directory(directory: Path) -> list[ImportDocument]:
+    return [
+        ImportDocument(str(path), path.read_text(encoding="utf8"), path.stem)
+        for path in sorted(directory.iterdir())
+        if path.is_file() and path.suffix in RECIPE_SUFFIXES
+    ]
+
+
+def read_tar(fileobj) -> list[ImportDocument]:
+    documents = []
+    unpacked_size = 0
+    try:
+        with tarfile.open(fileobj=fileobj, mode="r:*") as archive:
+            for member in archive:
+                name = Path(member.name)
+                if not member.isfile() or name.suffix not in RECIPE_SUFFIXES:
+                    continue
+
+                unpacked_size += member.size
+                if unpacked_size > MAX_UNPACKED_SIZE:
+                    raise RecipeImportError("Archive is too large")
+
+                # Only the contents are read, nothing is extracted to disk
+                content = archive.extractfile(member).read().decode("utf8")
+                documents.append(ImportDocument(member.name, content, name.stem))
+    except (tarfile.TarError, UnicodeDecodeError) as e:
+        raise RecipeImportError(f"Invalid archive: {e}") from e
+    return documents
+
+
+def read_multi_document_yaml(text: str, source="body") -> list[ImportDocument]:
+    documents = []
+    for i, document in enumerate(DOCUMENT_SEPARATOR.split(text)):
+        if document.strip():
+            documents.append(ImportDocument(f"{source}#{i}", document.lstrip("\n")))
+    return documents
+
+
+def validate_document(document: ImportDocument):
+    # Runs in worker processes, so it returns errors instead of raising them
+    try:
+        data = yaml.safe_load(document.recipe_yaml)
+        if not isinstance(data, dict):
+            raise ValueError("Not a recipe")
+        file_name = document.file_name or normalize_for_recipe_id(str(data["name"]))
+        recipe = load_recipe(data, file_name.lower())
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        return None, f"{type(e).__name__}: {e}"
+
+    return (
+        ValidatedRecipe(
+            document.source, file_name, document.recipe_yaml, data, recipe
+        ),
+        None,
+    )
+
+
+def validate_documents(documents: list[ImportDocument], workers=None):
+    if workers == 1 or len(documents) < PARALLEL_THRESHOLD:
+        results = [validate_document(d) for d in documents]
+    else:
+        # spawn: the server is multi-threaded, which doesn't mix well with fork
+        with ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            results = list(executor.map(validate_document, documents, chunksize=16))
+
+    validated = []
+    errors = {}
+    for document, (recipe, error) in zip(documents, results):
+        if error:
+            errors[document.source] = error
+        else:
+            validated.append(recipe)
+
+    seen = {}
+    for recipe in validated:
+        other = seen.setdefault(recipe.recipe.id, recipe.source)
+        if other != recipe.source:
+            errors[recipe.source] = f"Same recipe id {recipe.recipe.id} as {other}"
+
+    return validated, errors
+
+
+def import_recipes(store, documents, overwrite=False, workers=None) -> ImportResult:
+    # All or nothing: if any recipe is invalid, none are written. May raise
+    # VersionConflict if recipes exist already and overwrite is off.
+    if not documents:
+        raise RecipeImportError("No recipes found")
+
+    validated, errors = validate_documents(documents, workers)
+    if errors:
+        return ImportResult(errors=errors)
+
+    store.refresh()
+    store.save_batch(
+        [(v.file_name, v.recipe_yaml, v.data, v.recipe) for v in validated],
+        overwrite,
+    )
+    return ImportResult(imported=[v.recipe.id for v in validated])
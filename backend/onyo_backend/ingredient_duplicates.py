@@ -0,0 +1,119 @@
+from collections import defaultdict
+from dataclasses import dataclass
+
+DEFAULT_MAX_DISTANCE = 2
+
+
+@dataclass
+class DuplicateCluster:
+    # Most used name first
+    names: list[str]
+    canonical: str
+
+
+def find_duplicate_clusters(
+    usage: dict[str, int], max_distance=DEFAULT_MAX_DISTANCE
+) -> list[DuplicateCluster]:
+    # usage: ingredient name -> number of recipes using it
+    names = sorted(usage)
+    clusters = UnionFind(len(names))
+
+    for i, j in similar_pairs(names, max_distance):
+        clusters.union(i, j)
+
+    # Same words in another order, e.g. "pepper red" and "red pepper"
+    by_words = {}
+    for i, name in enumerate(names):
+        clusters.union(i, by_words.setdefault(" ".join(sorted(name.split())), i))
+
+    groups = defaultdict(list)
+    for i, name in enumerate(names):
+        groups[clusters.find(i)].append(name)
+
+    result = []
+    for group in groups.values():
+        if len(group) > 1:
+            group.sort(key=lambda n: (-usage[n], n))
+            result.append(DuplicateCluster(names=group, canonical=group[0]))
+    result.sort(key=lambda c: c.canonical)
+    return result
+
+
+def similar_pairs(names: list[str], max_distance):
+    # Names within n edits turn into the same string by deleting at most n letters
+    # from each (an insertion is a deletion on the other side, a substitution or swap
+    # of two letters one deletion on each side). So instead of comparing all pairs,
+    # each name is indexed under its deletion variants and only names sharing one get
+    # the edit distance computed. Trigram filters don't help here: with two typos a
+    # name can lose 8 trigrams, most of the trigrams of a typical ingredient name.
+    index = defaultdict(list)
+    for i, name in enumerate(names):
+        distance = allowed_distance(name, name, max_distance)
+        if not distance:
+            continue
+
+        candidates = set()
+        for variant in deletion_variants(name, distance):
+            candidates.update(index[variant])
+            index[variant].append(i)
+
+        for j in sorted(candidates):
+            pair_distance = allowed_distance(names[j], name, max_distance)
+            if edit_distance(names[j], name, pair_distance) <= pair_distance:
+                yield j, i
+
+
+def deletion_variants(name: str, max_deletions: int) -> set[str]:
+    variants = {name}
+    current = {name}
+    for _ in range(max_deletions):
+        current = {v[:k] + v[k + 1 :] for v in current for k in range(len(v))}
+        variants |= current
+    return variants
+
+
+def allowed_distance(a: str, b: str, max_distance):
+    # A typo in a short name often makes another ingredient already (rice/ice)
+    return min(max_distance, min(len(a), len(b)) // 4)
+
+
+def edit_distance(a: str, b: str, bound: int) -> int:
+    # Levenshtein distance where swapping two adjacent letters counts as one edit.
+    # Returns bound + 1 as soon as the distance is known to exceed bound.
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+
+    before_previous = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb),
+            )
+            if before_previous and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before_previous[j - 2] + 1)
+            current.append(cost)
+        # A swap can only lower the next row by one below the minimum of this one
+        if min(current) > bound and min(previous) > bound:
+            return bound + 1
+        before_previous, previous = previous, current
+    return min(previous[-1], bound + 1)
+
+
+class UnionFind:
+    def __init__(self, size):
+        self.parents = list(range(size))
+
+    def find(self, i):
+        while self.parents[i] != i:
+            self.parents[i] = self.parents[self.parents[i]]
+            i = self.parents[i]
+        return i
+
+    def union(self, i, j):
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i != root_j:
+            self.parents[max(root_i, root_j)] = min(root_i, root_j)
@@ -0,0 +1,36 @@
+import threading
+
+# dataclasses_json pulls in marshmallow, which alone costs more import time than the
+# rest of the backend. Most commands and requests never serialize with it, so these
+# helpers only import it (and rich) on first use.
+
+JSON_METHODS = ("to_json", "from_json", "to_dict", "from_dict", "schema")
+_lock = threading.Lock()
+
+
+class LazyJsonMethod:
+    def __init__(self, cls, name):
+        self.cls = cls
+        self.name = name
+
+    def __get__(self, instance, owner):
+        with _lock:
+            if isinstance(self.cls.__dict__.get(self.name), LazyJsonMethod):
+                from dataclasses_json import dataclass_json
+
+                # Replaces all the lazy methods with the real ones
+                dataclass_json(self.cls)
+        return getattr(self.cls if instance is None else instance, self.name)
+
+
+def dataclass_json(cls):
+    # Drop-in for dataclasses_json.dataclass_json without arguments
+    for name in JSON_METHODS:
+        setattr(cls, name, LazyJsonMethod(cls, name))
+    return cls
+
+
+def rich_print(*args):
+    import rich
+
+    rich.print(*args)
@@ -0,0 +1,214 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import functools
+import json
+import os
+import threading
+import time
+
+LOG_TIMINGS = os.environ.get("ONYO_LOG_TIMINGS", "") not in {"", "0", "false"}
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+@dataclass
+class Histogram:
+    buckets: tuple[float, ...]
+    bucket_counts: list[int] = field(default_factory=list)
+    count: int = 0
+    sum: float = 0
+
+    def __post_init__(self):
+        self.bucket_counts = [0] * len(self.buckets)
+
+    def observe(self, value: float):
+        i = bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            self.bucket_counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+@dataclass
+class MetricFamily:
+    name: str
+    type: str
+    help: str
+    # sorted label items -> value (counter) or Histogram
+    samples: dict = field(default_factory=dict)
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.families: dict[str, MetricFamily] = {}
+        # Added to every sample, e.g. the pid of a prefork worker
+        self.labels: tuple = ()
+
+    def counter(self, name, help_text):
+        self.families[name] = MetricFamily(name, "counter", help_text)
+
+    def histogram(self, name, help_text):
+        self.families[name] = MetricFamily(name, "histogram", help_text)
+
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            samples = self.families[name].samples
+            samples[key] = samples.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            samples = self.families[name].samples
+            if key not in samples:
+                samples[key] = Histogram(DURATION_BUCKETS)
+            samples[key].observe(value)
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self.lock:
+            for family in self.families.values():
+                lines.append(f"# HELP {family.name} {family.help}")
+                lines.append(f"# TYPE {family.name} {family.type}")
+                for key, value in family.samples.items():
+                    key = self.labels + key
+                    if family.type == "counter":
+                        lines.append(f"{family.name}{format_labels(key)} {value}")
+                    else:
+                        lines.extend(render_histogram(family.name, key, value))
+        return "\n".join(lines) + "\n"
+
+
+def render_histogram(name, key, histogram: Histogram):
+    cumulative = 0
+    for le, count in zip(histogram.buckets, histogram.bucket_counts):
+        cumulative += count
+        yield f"{name}_bucket{format_labels(key + (('le', str(le)),))} {cumulative}"
+    yield f'{name}_bucket{format_labels(key + (("le", "+Inf"),))} {histogram.count}'
+    yield f"{name}_sum{format_labels(key)} {histogram.sum}"
+    yield f"{name}_count{format_labels(key)} {histogram.count}"
+
+
+def format_labels(key):
+    if not key:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in key
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+METRICS = Metrics()
+METRICS.counter("onyo_requests_total", "Handled HTTP requests")
+METRICS.histogram("onyo_request_duration_seconds", "Total time to handle a request")
+METRICS.histogram("onyo_request_stage_duration_seconds", "Time spent per request stage")
+METRICS.counter("onyo_cache_lookups_total", "Lookups of hot-reloaded data")
+METRICS.counter("onyo_cache_misses_total", "Lookups that had to (re)load data")
+METRICS.histogram("onyo_reload_duration_seconds", "Time to (re)load data from disk")
+
+_local = threading.local()
+
+
+@dataclass
+class RequestTiming:
+    method: str
+    route: str = "unmatched"
+    status: int = 0
+    stages: dict[str, float] = field(default_factory=dict)
+
+
+@contextmanager
+def track_request(method):
+    timing = RequestTiming(method=method)
+    _local.timing = timing
+    start = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        duration = time.perf_counter() - start
+        _local.timing = None
+        record_request(timing, duration)
+
+
+def record_request(timing: RequestTiming, duration: float):
+    METRICS.inc(
+        "onyo_requests_total",
+        method=timing.method,
+        route=timing.route,
+        status=timing.status,
+    )
+    METRICS.observe(
+        "onyo_request_duration_seconds",
+        duration,
+        method=timing.method,
+        route=timing.route,
+    )
+    for stage_name, stage_duration in timing.stages.items():
+        METRICS.observe(
+            "onyo_request_stage_duration_seconds", stage_duration, stage=stage_name
+        )
+
+    if LOG_TIMINGS:
+        print(
+            json.dumps(
+                {
+                    "event": "request",
+                    "method": timing.method,
+                    "route": timing.route,
+                    "status": timing.status,
+                    "duration_ms": round(duration * 1000, 3),
+                    "stages_ms": {
+                        k: round(v * 1000, 3) for k, v in timing.stages.items()
+                    },
+                }
+            ),
+            flush=True,
+        )
+
+
+def current_request() -> RequestTiming | None:
+    return getattr(_local, "timing", None)
+
+
+@contextmanager
+def stage(name):
+    timing = current_request()
+    if timing is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.stages[name] = (
+            timing.stages.get(name, 0) + time.perf_counter() - start
+        )
+
+
+def timed_stage(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def track_reload(cache_name):
+    METRICS.inc("onyo_cache_misses_total", cache=cache_name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        METRICS.observe(
+            "onyo_reload_duration_seconds",
+            time.perf_counter() - start,
+            cache=cache_name,
+        )
@@ -1,9 +1,17 @@
-if ("serviceWorker" in navigator) {
-    navigator.serviceWorker.register("static/service_worker.js").then(registration => {
+const serviceWorkerUrl = document.currentScript.dataset.serviceWorker;
+const serviceWorkerScope = document.currentScript.dataset.scope;
+
+if (!serviceWorkerUrl) {
+    console.log("No service worker configured");
+} else if ("serviceWorker" in navigator) {
+    navigator.serviceWorker.register(serviceWorkerUrl, { scope: serviceWorkerScope }).then(registration => {
         console.log("SW Registered!");
+        if (registration.active) {
+            registration.active.postMessage("sync");
+        }
     }).catch(error => {
         console.log("SW Registration Failed", error);
     });
 } else {
     console.log("Not supported");
-}
\ No newline at end of file
+}
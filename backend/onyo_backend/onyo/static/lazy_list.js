@@ -0,0 +1,114 @@
+// A recipe list rendered in pages. Further pages are fetched as the end of the list
+// scrolls into view. As long as not all recipes are loaded, searching is done by the
+// server; once complete (e.g. in the static site), it is done in the page.
+class LazyList {
+    constructor(list) {
+        this.list = list;
+        this.fragmentsUrl = list.dataset.fragments;
+        this.nextUrl = list.dataset.next;
+        this.complete = !this.nextUrl;
+        this.term = '';
+        this.requestId = 0;
+        this.loading = false;
+
+        this.sentinel = document.createElement('div');
+        list.after(this.sentinel);
+        new IntersectionObserver(entries => {
+            if (entries.some(e => e.isIntersecting)) {
+                this.loadMore();
+            }
+        }).observe(this.sentinel);
+    }
+
+    search(term) {
+        this.term = term;
+        if (this.complete) {
+            filterItems(this.list, term);
+            return;
+        }
+
+        const url = new URL(this.fragmentsUrl, location.href);
+        if (term) {
+            url.searchParams.set('q', term);
+        }
+        this.fetchItems(url, true);
+    }
+
+    async randomItem() {
+        if (this.complete) {
+            return null;
+        }
+        const url = new URL(this.fragmentsUrl, location.href);
+        url.searchParams.set('random', '1');
+        const response = await fetch(url);
+        if (!response.ok) {
+            return null;
+        }
+        const template = document.createElement('template');
+        template.innerHTML = await response.text();
+        return template.content.firstElementChild;
+    }
+
+    loadMore() {
+        if (!this.nextUrl || this.loading || this.list.offsetParent === null) {
+            return;
+        }
+        this.fetchItems(this.nextUrl, false);
+    }
+
+    async fetchItems(url, replace) {
+        const requestId = ++this.requestId;
+        this.loading = true;
+        try {
+            const response = await fetch(url);
+            if (!response.ok || requestId !== this.requestId) {
+                return;
+            }
+            const html = await response.text();
+            if (requestId !== this.requestId) {
+                // Superseded by a newer search
+                return;
+            }
+
+            if (replace) {
+                this.list.innerHTML = html;
+            } else {
+                this.list.insertAdjacentHTML('beforeend', html);
+            }
+            this.nextUrl = response.headers.get('X-Next-Url');
+            if (!this.nextUrl && !this.term) {
+                this.complete = true;
+            }
+        } finally {
+            if (requestId === this.requestId) {
+                this.loading = false;
+            }
+        }
+
+        // The list may still be too short to fill the screen
+        if (this.sentinel.getBoundingClientRect().top < window.innerHeight) {
+            this.loadMore();
+        }
+    }
+}
+
+function filterItems(list, term) {
+    term = term.toLowerCase();
+    const searchForIngredients = term.startsWith('i:');
+    if (searchForIngredients) {
+        term = term.substring(2);
+    }
+
+    list.querySelectorAll('.recipe').forEach(e => {
+        const haystack = searchForIngredients ? e.dataset.searchingredients : e.dataset.searchname;
+        e.classList.toggle('hidden', !haystack.toLowerCase().includes(term));
+    });
+}
+
+function hide(e) {
+    e.classList.add('hidden');
+}
+
+function show(e) {
+    e.classList.remove('hidden');
+}
@@ -0,0 +1,66 @@
+// Validates the draft while typing
+const VALIDATE_DELAY_MS = 400;
+let validateTimeout = null;
+let validateController = null;
+
+function scheduleValidation() {
+    clearTimeout(validateTimeout);
+    validateTimeout = setTimeout(validateDraft, VALIDATE_DELAY_MS);
+}
+
+async function validateDraft() {
+    // Only the latest draft matters
+    if (validateController) {
+        validateController.abort();
+    }
+    validateController = new AbortController();
+
+    const textarea = document.querySelector('textarea[name="recipe_yaml"]');
+    try {
+        const response = await fetch('validate', {
+            method: 'POST',
+            body: new URLSearchParams({ recipe_yaml: textarea.value }),
+            signal: validateController.signal,
+        });
+        if (response.ok) {
+            showProblems(await response.json());
+        }
+    } catch (e) {
+        if (e.name !== 'AbortError') {
+            console.warn('Validation failed', e);
+        }
+    }
+}
+
+function showProblems(result) {
+    const list = document.getElementById('problems');
+    list.replaceChildren();
+    const problems = [
+        ...result.errors.map(p => ({ ...p, type: 'error' })),
+        ...result.warnings.map(p => ({ ...p, type: 'warning' })),
+    ];
+    for (const problem of problems) {
+        const item = document.createElement('li');
+        item.className = problem.type;
+        const where = [problem.line ? `line ${problem.line}` : '', problem.context]
+            .filter(part => part)
+            .join(', ');
+        item.textContent = where ? `${problem.message} (${where})` : problem.message;
+        if (problem.line) {
+            item.onclick = () => goToLine(problem.line);
+        }
+        list.appendChild(item);
+    }
+}
+
+function goToLine(line) {
+    const textarea = document.querySelector('textarea[name="recipe_yaml"]');
+    const lines = textarea.value.split('\n');
+    const start = lines.slice(0, line - 1).reduce((sum, l) => sum + l.length + 1, 0);
+    textarea.focus();
+    textarea.setSelectionRange(start, start + (lines[line - 1] || '').length);
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelector('textarea[name="recipe_yaml"]').addEventListener('input', scheduleValidation);
+});
@@ -0,0 +1,14 @@
+// Deleting ideas
+function deleteIdea(guid) {
+    if (!confirm('Delete?')) {
+        return;
+    }
+
+    const deleteForm = document.getElementById('delete-form');
+    deleteForm.action = `/onyo/ideas/${guid}`;
+    deleteForm.submit();
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('.delete-btn').forEach(b => b.addEventListener('click', () => deleteIdea(b.dataset.guid)));
+});
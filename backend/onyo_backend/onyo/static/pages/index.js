@@ -0,0 +1,36 @@
+// Search over all recipes and adding new ones
+function main() {
+    initSearch();
+    // Only there for recipe editors
+    document.getElementById('add-recipe-btn')?.addEventListener('click', addRecipe);
+}
+
+function initSearch() {
+    const search = document.getElementById('search');
+    const categories = document.getElementById('categories');
+    const results = document.getElementById('results');
+    const resultList = new LazyList(results);
+    search.addEventListener('input', () => {
+        if (!search.value) {
+            show(categories);
+            hide(results);
+        }
+        else {
+            show(results);
+            hide(categories);
+        }
+
+        resultList.search(search.value);
+    });
+}
+
+function addRecipe() {
+    const name = prompt("Recipe name");
+    if (!name) {
+        return;
+    }
+    document.getElementById('add-recipe-name').value = name;
+    document.getElementById('form').submit();
+}
+
+document.addEventListener('DOMContentLoaded', main);
@@ -0,0 +1,118 @@
+// Tab switching (also by swiping), task highlighting and copying the shopping list
+function main() {
+    let curTabIndex = 0;
+    let toastTimeout;
+    const tabs = document.querySelectorAll('.tab');
+    const switchers = document.querySelectorAll('.switcher');
+    const shoppingListBtn = document.getElementById('shopping-list-btn');
+    const tabCount = tabs.length;
+
+    document.querySelectorAll('.switcher').forEach(e => e.addEventListener('click', () => handleSwitcherClick(e)));
+    shoppingListBtn.addEventListener('click', copyShoppingList);
+
+    document.addEventListener('touchstart', handleTouchStart, false);
+    document.addEventListener('touchend', handleTouchStop, false);
+    document.addEventListener('touchcancel', handleTouchStop, false);
+    document.addEventListener('touchmove', handleTouchMove(left => {
+        const index = Math.min(tabCount - 1, Math.max(0, curTabIndex + (left ? -1 : 1)));
+        selectTab(index);
+    }), false);
+
+    document.querySelectorAll('.task').forEach(e => e.addEventListener('click', () => handleTaskClick(e)));
+
+    function handleSwitcherClick(switcher) {
+        selectTab(parseInt(switcher.dataset.tab));
+    }
+
+    function selectTab(indexToSelect) {
+        tabs[curTabIndex].classList.remove('visible');
+        switchers[curTabIndex].classList.remove('selected');
+        tabs[indexToSelect].classList.add('visible');
+        switchers[indexToSelect].classList.add('selected');
+        curTabIndex = indexToSelect;
+    }
+
+    function handleTouchStart(ev) {
+        const touches = ev.touches || ev.originalEvent.touches;
+        window.firstTouchX = touches[0].clientX;
+        window.firstTouchY = touches[0].clientY;
+        window.touchTriggered = false;
+    }
+
+    function handleTouchStop() {
+        window.touchTriggered = false;
+        window.firstTouchX = 0;
+        window.firstTouchY = 0;
+    }
+
+    function handleTouchMove(callback) {
+        return function handle(ev) {
+            if (window.touchTriggered) {
+                return;
+            }
+            const triggerRatio = 0.25;
+            const x = ev.touches[0].clientX;
+            const y = ev.touches[0].clientY;
+            const dx = x - window.firstTouchX;
+            const dy = y - window.firstTouchY;
+
+            // Note: comparing dy to innerWidth is on purpose
+            if (dx / window.innerWidth > triggerRatio && Math.abs(dy / window.innerWidth) < 0.1) {
+                callback(true);
+                window.touchTriggered = true;
+            }
+            else if (dx / window.innerWidth < -triggerRatio && Math.abs(dy / window.innerWidth) < 0.1) {
+                callback(false);
+                window.touchTriggered = true;
+            }
+        };
+    }
+
+    function handleTaskClick(task) {
+        const taskIngredientIndices = task.dataset.ingredientIndices.split(',');
+        if (!taskIngredientIndices) {
+            return;
+        }
+
+        const stepIngredients = document.querySelectorAll('.tab.visible .step-ingr');
+        stepIngredients.forEach((ingr, index) => {
+            const usedInTask = taskIngredientIndices.includes(index + '');
+            if (usedInTask) {
+                ingr.classList.toggle('selected');
+            }
+            else {
+                ingr.classList.remove('selected');
+            }
+        });
+
+        const allTasks = document.querySelectorAll('.tab.visible .task');
+        allTasks.forEach(t => {
+            if (t === task) {
+                task.classList.toggle('selected');
+            }
+            else {
+                t.classList.remove('selected');
+            }
+        });
+    }
+
+    function copyShoppingList() {
+        const shoppingListText = document.getElementById("shopping-list").value
+        navigator.clipboard.writeText(shoppingListText);
+        showToast('success', 'Copied');
+    }
+
+    function showToast(type, msg) {
+        const toast = document.getElementById('toast');
+
+        toast.textContent = msg;
+        toast.classList.add(`toast-${type}`);
+        toast.classList.remove('hidden');
+
+        clearTimeout(toastTimeout);
+        toastTimeout = setTimeout(() => toast.classList.add('hidden'), 1000);
+    }
+}
+
+// With generate-static --bundle, the page is rendered by recipe_bundle.js first
+document.addEventListener(document.currentScript.dataset.renderedEvent || 'DOMContentLoaded', main);
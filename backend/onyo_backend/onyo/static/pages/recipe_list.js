@@ -0,0 +1,50 @@
+// Search, sorting and random picks in a category
+function main() {
+    let lastPick = -1;
+    const randomBtn = document.getElementById('random-btn');
+    const allBtn = document.getElementById('all-btn');
+    const search = document.getElementById('search');
+    const list = document.getElementById('recipes');
+    const recipeList = new LazyList(list);
+
+    randomBtn.addEventListener('click', pickRandom);
+    allBtn.addEventListener('click', showAll);
+    search.addEventListener('input', () => recipeList.search(search.value));
+    document.getElementById('sort')?.addEventListener('change', e => {
+        location.search = new URLSearchParams({ sort: e.target.value });
+    });
+
+    async function pickRandom() {
+        const meals = list.querySelectorAll('li');
+        const remotePick = await recipeList.randomItem();
+        list.querySelectorAll('.random-pick').forEach(m => m.remove());
+        if (remotePick) {
+            // Not all recipes are loaded, so the server picked one
+            remotePick.classList.add('random-pick');
+            list.prepend(remotePick);
+            meals.forEach(hide);
+        }
+        else {
+            lastPick = randomIndex(meals.length, lastPick);
+            meals.forEach((m, i) => i === lastPick ? show(m) : hide(m));
+        }
+        show(allBtn);
+    }
+
+    function showAll() {
+        list.querySelectorAll('.random-pick').forEach(m => m.remove());
+        list.querySelectorAll('li').forEach(show);
+        hide(allBtn);
+    }
+}
+
+function randomIndex(count, last) {
+    for (; ;) {
+        const pick = Math.floor(Math.random() * count);
+        if (pick !== last || count === 1) {
+            return pick;
+        }
+    }
+}
+
+document.addEventListener('DOMContentLoaded', main);
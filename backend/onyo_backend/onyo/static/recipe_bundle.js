@@ -0,0 +1,146 @@
+// Renders a recipe of the static site's data bundle (generate-static --bundle) into
+// the shell page recipe.html#<recipe id>, with the same markup as the server rendered
+// recipe page. The format of the shards is described in onyo_backend/bundle.py.
+(function () {
+    const root = document.getElementById('recipe');
+    const shards = JSON.parse(root.dataset.shards);
+    const numColors = parseInt(root.dataset.numColors);
+
+    // Same as bundle.shard_of: 32 bit FNV-1a of the UTF-8 id
+    function shardOf(recipeId) {
+        let h = 0x811c9dc5;
+        for (const b of new TextEncoder().encode(recipeId)) {
+            h = Math.imul(h ^ b, 0x01000193) >>> 0;
+        }
+        return h % shards.length;
+    }
+
+    function el(tag, attrs, ...children) {
+        const e = document.createElement(tag);
+        for (const [name, value] of Object.entries(attrs || {})) {
+            e.setAttribute(name, value);
+        }
+        e.append(...children);
+        return e;
+    }
+
+    function renderParts(parts, recipeName) {
+        return parts.map(part => {
+            if (typeof part === 'string') {
+                return el('span', { class: '' }, part);
+            }
+            const [type, text, value] = part;
+            if (type === 'i') {
+                return el('span', { class: `ingr col${value % numColors}` }, text);
+            }
+            if (type === 's') {
+                const href = `launchtimer://?seconds=${value}&title=${encodeURIComponent(recipeName)}`;
+                return el('span', { class: 'timer' }, el('a', { href }, text));
+            }
+            return el('span', { class: value }, text);
+        });
+    }
+
+    function renderIngredients(recipe) {
+        const tab = el('div', { class: 'tab visible ingredients' });
+        let miseIndex = 0;
+        for (const [title, ingredients] of recipe.groups) {
+            const list = el('ul');
+            let container = list;
+            for (const [text, mise, link] of ingredients) {
+                if (mise === 'start') {
+                    container = el('div', { class: `mise col${miseIndex % numColors}` });
+                    list.append(container);
+                    miseIndex++;
+                }
+                container.append(el('li', {}, link ? el('a', { href: `recipe.html#${link}` }, text) : text));
+                if (mise === 'end') {
+                    container = list;
+                }
+            }
+            tab.append(el('h4', {}, title), list);
+        }
+
+        if (recipe.notes.length) {
+            tab.append(el('h4', {}, 'Notes'));
+            for (const note of recipe.notes) {
+                tab.append(el('li', {}, ...renderParts(note, recipe.name)));
+            }
+        }
+
+        const shoppingList = el('textarea', { id: 'shopping-list' });
+        shoppingList.value = recipe.shopping;
+        tab.append(shoppingList);
+        return tab;
+    }
+
+    function renderStep(recipe, [, tasks, ingredients]) {
+        const list = el('ol');
+        for (const parts of tasks) {
+            const indices = parts.filter(p => p[0] === 'i').map(p => p[2]);
+            list.append(el('li', { class: 'task', 'data-ingredient-indices': indices.join(',') }, ...renderParts(parts, recipe.name)));
+        }
+        const tab = el('div', { class: 'tab' }, el('section', {}, list));
+
+        if (ingredients.length) {
+            const stepIngredients = el('div', { class: 'step_ingredients' });
+            let container = stepIngredients;
+            ingredients.forEach(([text, mise], index) => {
+                container.append(el('br'));
+                if (mise === 'start') {
+                    container = el('div', { class: 'mise mise-in-step' });
+                    stepIngredients.append(container);
+                }
+                container.append(el('span', { class: `step-ingr col${index % numColors}` }, text));
+                if (mise === 'end') {
+                    container = stepIngredients;
+                }
+            });
+            tab.append(el('footer', {}, stepIngredients));
+        }
+        return tab;
+    }
+
+    function render(recipe) {
+        const shoppingListBtn = el('a', { id: 'shopping-list-btn', class: 'btn', href: '#' }, 'Shopping list');
+        // Keeps the recipe id in the URL
+        shoppingListBtn.addEventListener('click', e => e.preventDefault());
+        const topNav = el(
+            'nav',
+            { class: 'top-nav' },
+            el('h1', {}, el('a', { href: `cat_${recipe.category}.html` }, `〈 ${recipe.name}`)),
+            shoppingListBtn,
+            el('div', { id: 'toast', class: 'toast hidden' })
+        );
+
+        const subNav = el('nav', { class: 'sub-nav' }, el('div', { class: 'switcher selected', 'data-tab': '0' }, 'Ingr'));
+        recipe.steps.forEach(([title], index) => {
+            subNav.append(el(
+                'div',
+                { class: 'switcher', 'data-tab': `${index + 1}` },
+                el('div', {}, `${index + 1}`),
+                el('div', { class: 'switcher-subtitle' }, title)
+            ));
+        });
+
+        document.title = `${recipe.name} - Onyo`;
+        root.replaceChildren(topNav, subNav, renderIngredients(recipe), ...recipe.steps.map(s => renderStep(recipe, s)));
+        document.dispatchEvent(new Event('onyo:rendered'));
+    }
+
+    async function load() {
+        const recipeId = decodeURIComponent(location.hash.slice(1));
+        const response = await fetch(shards[shardOf(recipeId)]);
+        const recipe = response.ok ? (await response.json())[recipeId] : null;
+        if (recipe) {
+            render(recipe);
+        }
+        else {
+            root.replaceChildren(el('h1', {}, el('a', { href: 'index.html' }, '〈 Recipe not found')));
+        }
+    }
+
+    // Links to other recipes only change the hash
+    window.addEventListener('hashchange', () => location.reload());
+    load();
+})();
@@ -1,15 +1,171 @@
-self.addEventListener("install", e => {
+// Precaches all pages listed in precache.json and serves them from the cache.
+// Only pages whose hash changed since the last sync are downloaded again.
+const PAGES_CACHE = "onyo-pages";
+const SYNC_INTERVAL_MS = 60 * 1000;
+const FETCH_CONCURRENCY = 4;
+const MANIFEST_URL = new URL("precache.json", self.registration.scope.replace(/\/?$/, "/")).href;
+
+let lastSync = 0;
+let runningSync = null;
+let staleAfterWrite = false;
+
+self.addEventListener("install", () => {
+    self.skipWaiting();
+});
+
+self.addEventListener("activate", e => {
     e.waitUntil(
-        caches.open("static").then(cache => {
-            return cache.addAll(["./", './static/logo192.png']);
-        })
+        caches.keys()
+            .then(keys => Promise.all(keys.filter(k => k !== PAGES_CACHE).map(k => caches.delete(k))))
+            .then(() => self.clients.claim())
+            .then(() => sync())
     );
 });
 
+self.addEventListener("message", e => {
+    if (e.data === "sync") {
+        e.waitUntil(syncThrottled());
+    }
+});
+
 self.addEventListener("fetch", e => {
+    const request = e.request;
+    if (request.method !== "GET") {
+        // Pages may have been edited, so don't trust the cache until the next sync.
+        staleAfterWrite = true;
+        const response = fetch(request);
+        e.respondWith(response);
+        e.waitUntil(response.catch(() => null).then(() => sync()));
+        return;
+    }
+
+    if (staleAfterWrite && request.mode === "navigate") {
+        e.respondWith(networkFirst(request));
+        return;
+    }
+
     e.respondWith(
-        caches.match(e.request).then(response => {
-            return response || fetch(e.request);
+        cachedResponse(request).then(response => {
+            if (response) {
+                e.waitUntil(syncThrottled());
+                return response;
+            }
+            return fetch(request);
         })
     );
-});
\ No newline at end of file
+});
+
+async function cachedResponse(request) {
+    const response = await caches.match(request);
+    // Static files are precached under their versioned URL (?v=<hash>). Other
+    // references to them (e.g. icons in manifest.json) still work offline.
+    if (!response && new URL(request.url).pathname.includes("/static/")) {
+        return caches.match(request, { ignoreSearch: true });
+    }
+    return response;
+}
+
+async function networkFirst(request) {
+    try {
+        const response = await fetch(request);
+        if (response.ok && await isPrecached(request)) {
+            const cache = await caches.open(PAGES_CACHE);
+            await cache.put(request, response.clone());
+        }
+        return response;
+    } catch (error) {
+        const cached = await caches.match(request);
+        if (cached) {
+            return cached;
+        }
+        throw error;
+    }
+}
+
+async function isPrecached(request) {
+    const manifest = await storedManifest(await caches.open(PAGES_CACHE));
+    return manifest.pages.some(p => new URL(p.url, MANIFEST_URL).href === request.url);
+}
+
+function syncThrottled() {
+    if (Date.now() - lastSync < SYNC_INTERVAL_MS) {
+        return Promise.resolve();
+    }
+    return sync();
+}
+
+function sync() {
+    if (!runningSync) {
+        runningSync = syncPrecache()
+            .catch(error => console.log("Precache sync failed", error))
+            .finally(() => {
+                lastSync = Date.now();
+                runningSync = null;
+            });
+    }
+    return runningSync;
+}
+
+async function syncPrecache() {
+    const response = await fetch(MANIFEST_URL, { cache: "no-cache" });
+    if (!response.ok) {
+        return;
+    }
+
+    const manifest = await response.json();
+    const cache = await caches.open(PAGES_CACHE);
+    const previous = await storedManifest(cache);
+    if (previous.version === manifest.version) {
+        staleAfterWrite = false;
+        return;
+    }
+
+    const previousHashes = new Map(previous.pages.map(p => [p.url, p.hash]));
+    const changed = manifest.pages.filter(p => previousHashes.get(p.url) !== p.hash);
+    const failed = new Set();
+    await forEachConcurrently(changed, FETCH_CONCURRENCY, async page => {
+        const url = new URL(page.url, MANIFEST_URL).href;
+        try {
+            const pageResponse = await fetch(url, { cache: "no-cache" });
+            if (!pageResponse.ok) {
+                throw new Error(`${pageResponse.status} for ${url}`);
+            }
+            await cache.put(url, pageResponse);
+        } catch (error) {
+            console.log("Could not precache", url, error);
+            failed.add(page.url);
+        }
+    });
+
+    const currentUrls = new Set(manifest.pages.map(p => p.url));
+    await Promise.all(
+        previous.pages
+            .filter(p => !currentUrls.has(p.url))
+            .map(p => cache.delete(new URL(p.url, MANIFEST_URL).href))
+    );
+
+    // Failed pages keep their old hash so they are retried on the next sync.
+    const stored = {
+        version: failed.size ? previous.version : manifest.version,
+        pages: manifest.pages
+            .filter(p => !failed.has(p.url) || previousHashes.has(p.url))
+            .map(p => failed.has(p.url) ? { url: p.url, hash: previousHashes.get(p.url) } : p),
+    };
+    await cache.put(MANIFEST_URL, new Response(JSON.stringify(stored)));
+    staleAfterWrite = false;
+}
+
+async function storedManifest(cache) {
+    const response = await cache.match(MANIFEST_URL);
+    return response ? response.json() : { version: null, pages: [] };
+}
+
+async function forEachConcurrently(items, concurrency, callback) {
+    let next = 0;
+    const workers = Array.from({ length: concurrency }, async () => {
+        while (next < items.length) {
+            await callback(items[next++]);
+        }
+    });
+    await Promise.all(workers);
+}
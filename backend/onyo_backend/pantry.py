@@ -0,0 +1,171 @@
+from dataclasses import dataclass
+import threading
+
+from onyo_backend.recipes import Recipe, normalize_ingr_name_for_shopping
+from onyo_backend.shopping_list import IGNORE, ShoppingIngredient, get_shopping_ingredients
+from onyo_backend.store import current_recipes
+
+DEFAULT_LIMIT = 20
+MAX_RESULTS = 200
+
+_index = None
+_index_lock = threading.Lock()
+
+
+@dataclass
+class PantryMatch:
+    id: str
+    name: str
+    # Share of the recipe's ingredients that are available, 0-1
+    coverage: float
+    missing: list[str]
+
+
+@dataclass
+class PantryResult:
+    matches: list[PantryMatch]
+    # Available ingredients that no recipe uses
+    unknown: list[str]
+
+
+# Answers "what can I cook with these ingredients". Every shopping name (see
+# normalize_ingr_name_for_shopping) gets a bit; a recipe needs the bits of its own
+# ingredients and, recursively, those of the recipes it links to. Ingredients linked
+# to 'ignore' in shopping_links.yaml (salt, water, ...) count as always available.
+# Per ingredient, a second bitset holds the recipes using it, so a query only scores
+# the recipes that use at least one of the available ingredients.
+class PantryIndex:
+    def __init__(self):
+        self.bits: dict[str, int] = {}
+        self.names: list[str] = []
+        self.recipes: list[Recipe] = []
+        self.required: list[int] = []
+        self.required_counts: list[int] = []
+        # Ingredient bit -> bitset of positions in self.recipes
+        self.used_by: list[int] = []
+        self.staples = 0
+        # The snapshot and shopping ingredients this was built from
+        self.source: tuple = (None, None)
+        # Recipe id -> (recipe, bits of its own ingredients, linked recipe ids)
+        self._own: dict[str, tuple[Recipe, int, set[str]]] = {}
+
+    def update(self, recipes: dict[str, Recipe], shopping_ingredients: dict[str, ShoppingIngredient]):
+        # Unchanged recipes are the same objects in the next snapshot and keep their bits
+        own = {}
+        for recipe_id, recipe in recipes.items():
+            cached = self._own.get(recipe_id)
+            own[recipe_id] = cached if cached and cached[0] is recipe else self.own_bits(recipe)
+        self._own = own
+
+        staples = 0
+        for name, ingr in shopping_ingredients.items():
+            if ingr.link == IGNORE and name in self.bits:
+                staples |= 1 << self.bits[name]
+        self.staples = staples
+
+        closures = {}
+
+        def closure(recipe_id):
+            if recipe_id not in closures:
+                _, bits, links = own[recipe_id]
+                # Set first, a link cycle ends here instead of recursing forever
+                closures[recipe_id] = bits
+                for linked_id in links:
+                    if linked_id in own:
+                        bits |= closure(linked_id)
+                closures[recipe_id] = bits
+            return closures[recipe_id]
+
+        self.recipes = []
+        self.required = []
+        used_by = [[] for _ in self.names]
+        for recipe_id in sorted(own):
+            required = closure(recipe_id) & ~staples
+            # Recipes without (non-staple) ingredients would match any query
+            if not required:
+                continue
+            position = len(self.recipes)
+            self.recipes.append(own[recipe_id][0])
+            self.required.append(required)
+            for bit in iter_bits(required):
+                used_by[bit].append(position)
+
+        self.required_counts = [r.bit_count() for r in self.required]
+        self.used_by = [sum(1 << p for p in positions) for positions in used_by]
+
+    def own_bits(self, recipe: Recipe):
+        bits = 0
+        links = set()
+        for ingr in recipe.all_ingredients():
+            if ingr.name is not None:
+                bits |= 1 << self.bit(normalize_ingr_name_for_shopping(ingr.name))
+            if ingr.linked_recipe_id:
+                links.add(ingr.linked_recipe_id)
+        return recipe, bits, links
+
+    def bit(self, name: str) -> int:
+        # Bits are never reused, so the cached bits of unchanged recipes stay valid
+        if name not in self.bits:
+            self.bits[name] = len(self.names)
+            self.names.append(name)
+        return self.bits[name]
+
+    def query(self, available: list[str], limit=DEFAULT_LIMIT, max_missing=None) -> PantryResult:
+        have = 0
+        candidates = 0
+        unknown = []
+        for item in available:
+            name = normalize_ingr_name_for_shopping(item.strip())
+            bit = self.bits.get(name)
+            if bit is not None and self.staples >> bit & 1:
+                continue
+            if bit is None or not self.used_by[bit]:
+                unknown.append(item.strip())
+                continue
+            have |= 1 << bit
+            candidates |= self.used_by[bit]
+
+        scored = []
+        for position in iter_bits(candidates):
+            required = self.required[position]
+            missing = self.required_counts[position] - (required & have).bit_count()
+            if max_missing is not None and missing > max_missing:
+                continue
+            coverage = 1 - missing / self.required_counts[position]
+            scored.append((-coverage, missing, self.recipes[position].name.lower(), position))
+        scored.sort()
+
+        matches = []
+        for negative_coverage, _, _, position in scored[: max(1, min(limit, MAX_RESULTS))]:
+            recipe = self.recipes[position]
+            missing = sorted(self.names[b] for b in iter_bits(self.required[position] & ~have))
+            matches.append(PantryMatch(recipe.id, recipe.name, round(-negative_coverage, 3), missing))
+        return PantryResult(matches=matches, unknown=unknown)
+
+
+def iter_bits(bits: int):
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+
+def parse_available(values: list[str]) -> list[str]:
+    # Comma separated and/or repeated
+    return [item for value in values for item in value.split(",") if item.strip()]
+
+
+def query_pantry(available: list[str], limit=DEFAULT_LIMIT, max_missing=None) -> PantryResult:
+    global _index  # pylint: disable=global-statement
+
+    snapshot = current_recipes()
+    shopping_ingredients = get_shopping_ingredients()
+    # Queries hold the lock too, updates change the index in place
+    with _index_lock:
+        if _index is None:
+            _index = PantryIndex()
+        # Both are cached and keep their identity until something changes
+        if _index.source[0] is not snapshot or _index.source[1] is not shopping_ingredients:
+            _index.update(snapshot.recipes, shopping_ingredients)
+            _index.source = (snapshot, shopping_ingredients)
+        return _index.query(available, limit, max_missing)
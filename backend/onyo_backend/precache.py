@@ -0,0 +1,137 @@
+import hashlib
+import json
+from pathlib import Path
+import time
+from urllib.parse import quote
+
+from onyo_backend.api import serialize_recipe
+from onyo_backend.recipes import Category, Recipe, recipe_link
+from onyo_backend.shopping_list import ShoppingIngredient, assemble_shopping_list
+
+PACKAGE_DIR = Path(__file__).parent
+TEMPLATE_DIR = PACKAGE_DIR / "templates"
+STATIC_DIR = PACKAGE_DIR / "onyo" / "static"
+PRECACHE_MANIFEST_FILE = "precache.json"
+SERVICE_WORKER_FILE = "service_worker.js"
+# Seconds the asset fingerprint is reused before templates and static files are checked again
+FINGERPRINT_INTERVAL = 1.0
+
+# (recipes, shopping ingredients, asset fingerprint) the cached manifest was built
+# from, and the manifest
+_server_manifest_cache = (None, None, None, None)
+# (time of the next check, asset fingerprint)
+_asset_fingerprint_cache = (0.0, None)
+# static file name -> ((mtime, size), content hash)
+_static_hashes: dict[str, tuple[tuple[int, int], str]] = {}
+
+
+def content_hash(content: bytes | str) -> str:
+    if isinstance(content, str):
+        content = content.encode()
+    return hashlib.blake2b(content, digest_size=8).hexdigest()
+
+
+def build_precache_manifest(page_hashes: dict[str, str]) -> dict:
+    pages = [{"url": url, "hash": h} for url, h in sorted(page_hashes.items())]
+    return {
+        "version": content_hash(json.dumps(pages)),
+        "pages": pages,
+    }
+
+
+def static_file_hashes(static_dir=STATIC_DIR) -> dict[str, str]:
+    return {
+        f.relative_to(static_dir).as_posix(): content_hash(f.read_bytes())
+        for f in sorted(static_dir.rglob("*"))
+        if f.is_file() and f.name != SERVICE_WORKER_FILE
+    }
+
+
+def static_url(name: str) -> str:
+    # The version changes with the content, so browsers and the service worker can keep
+    # the file until it does instead of downloading it with every page
+    path = STATIC_DIR / name
+    stat = path.stat()
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _static_hashes.get(name)
+    if cached is None or cached[0] != signature:
+        cached = (signature, content_hash(path.read_bytes()))
+        _static_hashes[name] = cached
+    return versioned_url(f"/onyo/static/{name}", cached[1])
+
+
+def versioned_url(url: str, h: str) -> str:
+    return f"{url}?v={h}"
+
+
+def asset_fingerprint() -> str:
+    global _asset_fingerprint_cache  # pylint: disable=global-statement
+
+    next_check, fingerprint = _asset_fingerprint_cache
+    now = time.monotonic()
+    if fingerprint is None or now >= next_check:
+        fingerprint = scan_asset_fingerprint()
+        _asset_fingerprint_cache = (now + FINGERPRINT_INTERVAL, fingerprint)
+    return fingerprint
+
+
+def scan_asset_fingerprint() -> str:
+    # Cheap stat-based fingerprint so template/static changes (e.g. during development)
+    # invalidate all pages without having to hash the files.
+    stats = [
+        (f.relative_to(d).as_posix(), f.stat().st_mtime_ns, f.stat().st_size)
+        for d in (TEMPLATE_DIR, STATIC_DIR)
+        for f in sorted(d.rglob("*"))
+        if f.is_file()
+    ]
+    return content_hash(repr(stats))
+
+
+def get_server_precache_manifest(
+    categories: dict[str, Category],
+    recipes: dict[str, Recipe],
+    shopping_ingredients: dict[str, ShoppingIngredient],
+) -> dict:
+    global _server_manifest_cache  # pylint: disable=global-statement
+
+    fingerprint = asset_fingerprint()
+    cached_recipes, cached_shopping, cached_fingerprint, manifest = _server_manifest_cache
+    same_data = cached_recipes is recipes and cached_shopping is shopping_ingredients
+    if same_data and cached_fingerprint == fingerprint:
+        return manifest
+
+    manifest = build_precache_manifest(
+        server_page_hashes(categories, recipes, shopping_ingredients, fingerprint)
+    )
+    _server_manifest_cache = (recipes, shopping_ingredients, fingerprint, manifest)
+    return manifest
+
+
+def server_page_hashes(categories, recipes, shopping_ingredients, fingerprint):
+    # Hashes the inputs of each page instead of rendering it. They change whenever the
+    # rendered page would, which is all the service worker needs to know.
+    recipe_hashes = {}
+    for recipe in recipes.values():
+        shop_list = assemble_shopping_list(recipe, shopping_ingredients)
+        links = "\n".join(f"{i.link} {i.text}" for i in shop_list.items)
+        recipe_hashes[recipe.id] = content_hash(
+            fingerprint.encode() + serialize_recipe(recipe) + links.encode()
+        )
+
+    page_hashes = {
+        recipe_link(recipe_id): h for recipe_id, h in recipe_hashes.items()
+    }
+    for category in categories.values():
+        # The URL the browser requests for the link on the index page
+        page_hashes[f"/onyo/categories/{quote(category.name)}"] = content_hash(
+            fingerprint + "".join(recipe_hashes[r.id] for r in category.recipes)
+        )
+    page_hashes["/onyo"] = content_hash(
+        fingerprint + "".join(sorted(recipe_hashes.values()))
+    )
+
+    # Under the versioned URLs the pages refer to
+    for name, h in static_file_hashes().items():
+        page_hashes[versioned_url(f"/onyo/static/{name}", h)] = h
+
+    return page_hashes
@@ -0,0 +1,107 @@
+import http.server
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+from onyo_backend.metrics import METRICS
+from onyo_backend.recipes import CACHE_DIR, atomic_write_text
+from onyo_backend.store import ChangeLog, get_recipe_store
+
+CHANGE_LOG_PATH = CACHE_DIR / "changes.log"
+# The change log is started over by the next start once it is larger than this
+MAX_CHANGE_LOG_SIZE = 1024 * 1024
+# A worker dying sooner than this after its start is restarted with a delay
+MIN_WORKER_LIFETIME = 1.0
+
+
+# Serves with several processes, so rendering and YAML parsing aren't limited to the
+# one core the GIL allows. The parent loads the recipes and opens the listening
+# socket, then forks workers that inherit both: recipes parsed before the fork are
+# shared copy-on-write and the kernel spreads connections over the workers. Each
+# worker keeps its own store, so they coordinate through a ChangeLog file: recipes
+# written by one worker are reloaded by the others on their next request. Ideas and
+# shopping links are read from their files whenever they changed anyway.
+def serve_prefork(handler_class, port, workers):
+    if not hasattr(os, "fork"):
+        sys.exit("--workers needs os.fork, which isn't available on this platform")
+
+    CHANGE_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    rotate_change_log(CHANGE_LOG_PATH)
+    store = get_recipe_store()
+    store.refresh()
+    store.change_log = ChangeLog(CHANGE_LOG_PATH)
+
+    listener = socket.create_server(("", port), backlog=128)
+    # SIGTERM unwinds like Ctrl+C, so the workers are stopped as well
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    started = {}
+    try:
+        for _ in range(workers):
+            pid = start_worker(handler_class, listener)
+            started[pid] = time.monotonic()
+        print(f"Listening on port http://localhost:{port} with {workers} workers")
+
+        while True:
+            pid, status = os.wait()
+            if pid not in started:
+                continue
+            lifetime = time.monotonic() - started.pop(pid)
+            print(f"Worker {pid} exited ({os.waitstatus_to_exitcode(status)}), restarting")
+            if lifetime < MIN_WORKER_LIFETIME:
+                time.sleep(MIN_WORKER_LIFETIME)
+            pid = start_worker(handler_class, listener)
+            started[pid] = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_workers(started)
+        listener.close()
+
+
+def rotate_change_log(path):
+    # Workers of an earlier start may still be running and reading the log. Truncating
+    # it would leave them comparing a stale offset, a new file makes them start over.
+    if not path.exists() or path.stat().st_size > MAX_CHANGE_LOG_SIZE:
+        atomic_write_text(path, "")
+
+
+def start_worker(handler_class, listener) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+
+    exit_code = 0
+    try:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        # Each worker counts only its own requests
+        METRICS.labels = (("worker", str(os.getpid())),)
+        httpd = http.server.ThreadingHTTPServer(
+            listener.getsockname(), handler_class, bind_and_activate=False
+        )
+        httpd.socket.close()
+        httpd.socket = listener
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except BaseException:  # pylint: disable=broad-exception-caught
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        # Never return into the parent's code
+        os._exit(exit_code)
+
+
+def stop_workers(pids):
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in pids:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
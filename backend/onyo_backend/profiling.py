@@ -0,0 +1,104 @@
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+import cProfile
+import os
+from pathlib import Path
+import random
+import re
+import sys
+import threading
+import time
+
+# Server profiling is only active if a profile dir is configured
+PROFILE_DIR = os.environ.get("ONYO_PROFILE_DIR")
+PROFILE_SAMPLE_RATE = float(os.environ.get("ONYO_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_HEADER = "X-Onyo-Profile"
+SAMPLE_INTERVAL = 0.001
+
+# Only one profile at a time: profilers of concurrent requests would interfere
+_profile_lock = threading.Lock()
+
+
+# Periodically samples the stack of one thread, for collapsed-stack flame graphs
+class StackSampler:
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)  # pylint: disable=protected-access
+            if frame is not None:
+                self.stacks[collapse_stack(frame)] += 1
+
+    def write_collapsed(self, path):
+        with open(path, "w", encoding="utf8") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+def collapse_stack(frame) -> str:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+@contextmanager
+def profiled(output_dir: Path, name: str):
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    base_name = f"{sanitize_name(name)}-{time.strftime('%Y%m%d-%H%M%S')}-{time.perf_counter_ns() % 10**6}"
+
+    profiler = cProfile.Profile()
+    sampler = StackSampler(threading.get_ident())
+    sampler.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        sampler.stop()
+        profiler.dump_stats(output_dir / f"{base_name}.pstats")
+        sampler.write_collapsed(output_dir / f"{base_name}.collapsed")
+        print(f"Wrote profile {output_dir / base_name}.{{pstats,collapsed}}")
+
+
+@contextmanager
+def exclusive_profile(output_dir, name):
+    if not _profile_lock.acquire(blocking=False):
+        yield
+        return
+
+    try:
+        with profiled(output_dir, name):
+            yield
+    finally:
+        _profile_lock.release()
+
+
+def profile_request(method, path, headers):
+    if not PROFILE_DIR:
+        return nullcontext()
+
+    requested = headers.get(PROFILE_HEADER) is not None
+    if not requested and random.random() >= PROFILE_SAMPLE_RATE:
+        return nullcontext()
+
+    return exclusive_profile(Path(PROFILE_DIR), f"{method}-{path}")
+
+
+def sanitize_name(name):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name).strip("_")[:80] or "profile"
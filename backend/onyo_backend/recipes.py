@@ -1,17 +1,35 @@
 from dataclasses import dataclass, field
 from enum import StrEnum, auto
+import hashlib
 import math
+import os
 import re
+import stat
+import tempfile
 import traceback
 from typing import Generator
-from dataclasses_json import dataclass_json, config
 import yaml
 from functools import lru_cache, partial
 from pathlib import Path
-import rich
 
-DATA_DIR = Path(__file__).parent.parent.parent / "data"
+from onyo_backend.lazy import dataclass_json, rich_print
+
+
+def default_cache_dir(data_dir: Path) -> Path:
+    # Outside the data dir, which is usually a git repo, and separate per data dir
+    base = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    key = hashlib.blake2b(str(data_dir.resolve()).encode(), digest_size=8).hexdigest()
+    return base / "onyo" / key
+
+
+DATA_DIR = Path(
+    os.environ.get("ONYO_DATA_DIR", Path(__file__).parent.parent.parent / "data")
+)
 RECIPE_DIR = DATA_DIR / "recipes"
+# Derived state (indexes, worker coordination) that can be deleted any time
+CACHE_DIR = Path(os.environ.get("ONYO_CACHE_DIR") or default_cache_dir(DATA_DIR))
+# Additional aliases (alias: ingredient name), read once at startup
+INGREDIENT_ALIASES_PATH = DATA_DIR / "ingredient_aliases.yaml"
 NUM_COLORS = 8
 INGR_PATTERN_STRING = r"\$([^$]+)\$"
 TIMER_PATTERN_STRING = r"!(([^!]+) *(second|minute|hour)s?)!"
@@ -24,6 +42,12 @@ TASK_SPLIT_PATTERN = re.compile(
 )
 NOTE_SPLIT_PATTERN = re.compile(f"({BOLD_PATTERN_STRING})")
 INGR_LINK_PATTERN = re.compile(r"~([^~]+)~")
+INGREDIENT_ALIASES = {
+    "egg yolk": "egg",
+    "bay leave": "bay leaf",
+    "potatoe": "potato",
+    "tomatoe": "tomato",
+}
 
 
 class Mise(StrEnum):
@@ -39,10 +63,7 @@ class Ingredient:
     text: str = ""
     mise: Mise = field(
         default=Mise.NONE,
-        metadata=config(
-            encoder=str,
-            decoder=Mise,
-        ),
+        metadata={"dataclasses_json": {"encoder": str, "decoder": Mise}},
     )
     linked_recipe_id: str = ""
 
@@ -154,18 +175,6 @@ class Category:
     recipes: list[Recipe] = field(default_factory=list)
 
 
-def list_recipes():
-    lmod = get_last_mod(RECIPE_DIR)
-    return load_recipes(RECIPE_DIR, lmod)
-
-
-def get_last_mod(recipe_dir):
-    lmod = recipe_dir.lstat().st_mtime
-    for r in list_recipe_files(recipe_dir):
-        lmod = max(lmod, r.lstat().st_mtime)
-    return lmod
-
-
 def list_recipe_files(recipe_dir):
     return recipe_dir.glob("*.yaml")
 
@@ -176,29 +185,59 @@ def load_recipe_yaml(recipe_id):
         return file.read()
 
 
-def save_recipe_yaml(recipe_id, recipe_yaml):
-    path = RECIPE_DIR / f"{recipe_id}.yaml"
-    with open(path, "w", encoding="utf8") as file:
-        file.write(recipe_yaml)
+def recipe_version(recipe_yaml: str) -> str:
+    return hashlib.blake2b(recipe_yaml.encode(), digest_size=8).hexdigest()
 
 
-@lru_cache(maxsize=1)
-def load_recipes(
-    recipe_dir,
-    lmod,  # pylint: disable=unused-argument
-) -> tuple[dict[str, Category], dict[str, Recipe]]:
-    print("Reloading recipes")
-    errors = []
-    categories, recipes = load_recipes_uncached(recipe_dir, errors)
-    print_errors(errors)
-    print_warnings(recipes.values())
-    return categories, recipes
+def atomic_write_text(path: Path, text: str):
+    atomic_write_files({path: text})
+
+
+def atomic_write_files(files: dict[Path, str]):
+    # Write to temp files next to the targets and rename them over the targets, so
+    # readers see either the old or the new file but never a partially written one.
+    # All files are written before the first rename, so a failure leaves everything
+    # as it was. Temp files don't end in .yaml, so they aren't picked up as recipes.
+    staged = []
+    try:
+        for path, text in files.items():
+            mode = stat.S_IMODE(path.stat().st_mode) if path.exists() else 0o644
+            fd, tmp_path = tempfile.mkstemp(
+                dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+            )
+            staged.append((tmp_path, path))
+            with os.fdopen(fd, "w", encoding="utf8") as file:
+                file.write(text)
+                file.flush()
+                os.fsync(file.fileno())
+            os.chmod(tmp_path, mode)
+
+        for tmp_path, path in staged:
+            os.replace(tmp_path, path)
+    except BaseException:
+        for tmp_path, _ in staged:
+            Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+    for directory in {path.parent for path in files}:
+        fsync_dir(directory)
+
+
+def fsync_dir(directory: Path):
+    # Makes the rename durable. Directories can't be opened like this on Windows.
+    if os.name != "posix":
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
 
 def load_recipes_uncached(recipe_dir, errors: list[str]):
     categories = {}
     recipes = {}
-    for r in list_recipe_files(recipe_dir):
+    for r in sorted(list_recipe_files(recipe_dir)):
         try:
             recipe = load_recipe_from_file(r)
         except Exception as e:  # pylint: disable=broad-exception-caught
@@ -222,7 +261,7 @@ def load_recipes_uncached(recipe_dir, errors: list[str]):
 
 def print_errors(errors: list[str]):
     for e in errors:
-        rich.print(f"[red]ERROR[/red]: {e}")
+        rich_print(f"[red]ERROR[/red]: {e}")
 
 
 def print_warnings(recipes: list[Recipe]):
@@ -232,11 +271,11 @@ def print_warnings(recipes: list[Recipe]):
             ctx = f"[cyan]{path}[/cyan]"
             if w.extra_context:
                 ctx += f", {w.extra_context}"
-            rich.print(f"[orange3]WARNING[/orange3]: {w.msg} ({ctx})")
+            rich_print(f"[orange3]WARNING[/orange3]: {w.msg} ({ctx})")
 
 
-def resolve_links(recipes: dict[str, Recipe]):
-    for r in recipes.values():
+def resolve_links(recipes: dict[str, Recipe], targets: list[Recipe] | None = None):
+    for r in recipes.values() if targets is None else targets:
         for i in r.all_ingredients():
             if not i.linked_recipe_id:
                 continue
@@ -496,22 +535,42 @@ def index_of(lst, predicate):
 
 
 def normalize_ingr_name_for_shopping(name: str):
-    ALIASES = {
-        "egg yolk": "egg",
-        "bay leave": "bay leaf",
-        "potatoe": "potato",
-        "tomatoe": "tomato",
-    }
+    name = strip_ingr_name(name)
+    return ingredient_aliases().get(name, name)
+
+
+def strip_ingr_name(name: str):
     name = name.lower()
     # Remove numeric suffix
     name = re.sub(r":[0-9]+$", "", name)
     # Remove plural 's' (doesn't always make correct words, but good enough)
     name = re.sub(r"s$", "", name)
-    # Normalize aliases
-    name = ALIASES.get(name, name)
     return name
 
 
+def ingredient_aliases() -> dict[str, str]:
+    return load_ingredient_aliases(INGREDIENT_ALIASES_PATH)
+
+
+@lru_cache(maxsize=1)
+def load_ingredient_aliases(path: Path) -> dict[str, str]:
+    aliases = dict(INGREDIENT_ALIASES)
+    if not path.exists():
+        return aliases
+
+    with open(path, "r", encoding="utf8") as file:
+        data = yaml.safe_load(file) or {}
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} must map aliases to ingredient names")
+    for alias, name in data.items():
+        aliases[strip_ingr_name(str(alias))] = strip_ingr_name(str(name))
+    return aliases
+
+
+def recipe_link(recipe_id):
+    return f"/onyo/recipes/{recipe_id}"
+
+
 def normalize_for_recipe_id(name: str):
     normalized = name.replace("'s", "s")
     normalized = re.sub(r"([^a-zA-Z0-9])+", " ", normalized).title().replace(" ", "")
@@ -521,9 +580,9 @@ def normalize_for_recipe_id(name: str):
 def create_empty_recipe(name: str, recipe_dir=RECIPE_DIR) -> str:
     recipe_id = normalize_for_recipe_id(name)
     spaghetti_emoji = "\U0001f35d"
-    with open(recipe_dir / f"{recipe_id}.yaml", "w", encoding="utf8") as file:
-        file.write(
-            f"""\
+    atomic_write_text(
+        recipe_dir / f"{recipe_id}.yaml",
+        f"""\
 ---
 name: {name}
 icon: {spaghetti_emoji}
@@ -537,7 +596,7 @@ steps:
 
 # notes:
 #  - dummy notes
-"""
-        )
+""",
+    )
 
     return recipe_id
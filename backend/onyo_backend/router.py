@@ -0,0 +1,105 @@
+from dataclasses import dataclass, field
+import re
+from typing import Callable
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+@dataclass
+class Route:
+    pattern: str
+    handlers: dict[str, Callable] = field(default_factory=dict)
+    group_name: str = ""
+    group_count: int = 0
+    regex: re.Pattern | None = None
+
+
+@dataclass
+class RouteMatch:
+    pattern: str
+    handler: Callable | None
+    args: tuple[str, ...]
+    allowed_methods: list[str]
+
+
+class Router:
+    def __init__(self):
+        self.routes: dict[str, Route] = {}
+        self._regex = None
+
+    def get(self, pattern):
+        return self.route(pattern, "GET")
+
+    def post(self, pattern):
+        return self.route(pattern, "POST")
+
+    def route(self, pattern, method):
+        def decorator(handler):
+            route = self.routes.setdefault(pattern, Route(pattern))
+            route.handlers[method] = handler
+            self._regex = None
+            return handler
+
+        return decorator
+
+    def compile(self):
+        # All routes in one regex: (?P<r0>...)|(?P<r1>...)|..., so a path is matched in
+        # a single scan and the named group tells which route it was.
+        alternatives = []
+        for i, route in enumerate(self.routes.values()):
+            route.group_name = f"r{i}"
+            route.regex = re.compile(route.pattern)
+            route.group_count = route.regex.groups
+            alternatives.append(f"(?P<{route.group_name}>{route.pattern})")
+
+        self._regex = re.compile("|".join(alternatives))
+        self._routes_by_group = {r.group_name: r for r in self.routes.values()}
+        self._group_index = self._regex.groupindex
+
+    def match(self, method, path) -> RouteMatch | None:
+        if self._regex is None:
+            self.compile()
+
+        m = self._regex.fullmatch(path)
+        if not m:
+            return None
+
+        route = self._routes_by_group[m.lastgroup]
+        # The route's own groups directly follow its named group
+        start = self._group_index[route.group_name]
+        args = tuple(unquote(g) for g in m.groups()[start : start + route.group_count])
+        if method in route.handlers:
+            return RouteMatch(
+                pattern=route.pattern,
+                handler=route.handlers[method],
+                args=args,
+                allowed_methods=sorted(route.handlers),
+            )
+
+        # A later route may match the same path with this method, e.g. GET
+        # /onyo/recipes/import is a recipe, only POST goes to the import route
+        allowed_methods = set(route.handlers)
+        routes = list(self.routes.values())
+        for other in routes[routes.index(route) + 1 :]:
+            other_match = other.regex.fullmatch(path)
+            if not other_match:
+                continue
+            if method in other.handlers:
+                return RouteMatch(
+                    pattern=other.pattern,
+                    handler=other.handlers[method],
+                    args=tuple(unquote(g) for g in other_match.groups()),
+                    allowed_methods=sorted(other.handlers),
+                )
+            allowed_methods |= set(other.handlers)
+
+        return RouteMatch(
+            pattern=route.pattern,
+            handler=None,
+            args=args,
+            allowed_methods=sorted(allowed_methods),
+        )
+
+
+def split_target(target) -> tuple[str, dict[str, list[str]]]:
+    parts = urlsplit(target)
+    return parts.path, parse_qs(parts.query)
@@ -0,0 +1,273 @@
+from dataclasses import dataclass
+import hashlib
+import os
+from pathlib import Path
+import re
+import sqlite3
+import threading
+
+from onyo_backend.recipes import Recipe
+from onyo_backend.store import RecipeSnapshot, StoreUpdate, get_recipe_store
+
+# Path of the SQLite file. Search is off without it.
+SEARCH_INDEX_PATH = os.environ.get("ONYO_SEARCH_INDEX")
+SCHEMA_VERSION = 1
+# bm25 weights of the full text columns: id, name, ingredients, tasks, notes
+COLUMN_WEIGHTS = (0, 10.0, 4.0, 1.0, 1.0)
+QUERY_CHUNK_SIZE = 500
+# Seconds to wait for a write of another worker process to finish
+BUSY_TIMEOUT = 30
+MAX_RESULTS = 100
+TOKEN_PATTERN = re.compile(r"\w+")
+
+SCHEMA = """
+CREATE TABLE recipes (
+    key INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    icon TEXT NOT NULL,
+    doc_hash TEXT NOT NULL
+);
+CREATE TABLE recipe_categories (recipe_key INTEGER NOT NULL, category TEXT NOT NULL);
+CREATE INDEX recipe_categories_recipe ON recipe_categories (recipe_key);
+CREATE INDEX recipe_categories_category ON recipe_categories (category);
+CREATE TABLE ingredients (
+    recipe_key INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT,
+    text TEXT NOT NULL,
+    linked_recipe_id TEXT
+);
+CREATE INDEX ingredients_recipe ON ingredients (recipe_key);
+CREATE INDEX ingredients_name ON ingredients (name);
+CREATE TABLE notes (recipe_key INTEGER NOT NULL, position INTEGER NOT NULL, text TEXT NOT NULL);
+CREATE INDEX notes_recipe ON notes (recipe_key);
+CREATE VIRTUAL TABLE recipe_fts USING fts5(
+    id UNINDEXED, name, ingredients, tasks, notes,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+_index = None
+_index_lock = threading.Lock()
+
+
+@dataclass
+class SearchHit:
+    id: str
+    name: str
+    snippet: str
+    score: float
+
+
+@dataclass
+class RecipeDocument:
+    recipe: Recipe
+    ingredients: str
+    tasks: str
+    notes: str
+    doc_hash: str
+
+
+# Mirrors the loaded recipes into SQLite for ranked full text search. It is attached
+# to a RecipeStore and only writes the recipes of each store update whose content
+# actually changed, so restarts against an existing index file write nothing.
+class SearchIndex:
+    def __init__(self, path: Path | str):
+        self.path = path
+        self.store = None
+        self._lock = threading.Lock()
+        self._needs_full_sync = True
+        self._connection = self.connect()
+
+    def connect(self):
+        # Store updates are applied on the thread that refreshed the store
+        connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        # Prefork workers share the file: readers don't block the writer and vice versa
+        connection.execute("PRAGMA journal_mode = WAL")
+        (version,) = connection.execute("PRAGMA user_version").fetchone()
+        if version not in (0, SCHEMA_VERSION):
+            # Only derived data, start from scratch
+            connection.close()
+            Path(self.path).unlink()
+            return self.connect()
+
+        if version == 0:
+            with connection:
+                connection.executescript(SCHEMA)
+                connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        return connection
+
+    def attach(self, store):
+        if self.store:
+            self.store.listeners.remove(self.sync)
+        # Listen first, so no update between the refresh and the full sync is missed
+        self.store = store
+        self._needs_full_sync = True
+        store.listeners.append(self.sync)
+        snapshot = store.refresh()
+        if self._needs_full_sync:
+            self.sync_all(snapshot)
+
+    def sync(self, update: StoreUpdate):
+        if self._needs_full_sync:
+            self.sync_all(update.snapshot)
+            return
+
+        recipes = update.snapshot.recipes
+        stale = set(update.changed) | set(update.removed) | {r.id for r in update.rebuilt}
+        self.write(
+            [r for r in update.rebuilt if r.id in recipes],
+            stale - recipes.keys(),
+        )
+
+    def sync_all(self, snapshot: RecipeSnapshot):
+        with self._lock:
+            indexed = {row[0] for row in self._connection.execute("SELECT id FROM recipes")}
+        self.write(list(snapshot.recipes.values()), indexed - snapshot.recipes.keys())
+        self._needs_full_sync = False
+
+    def write(self, recipes: list[Recipe], removed_ids):
+        documents = {r.id: recipe_document(r) for r in recipes}
+        try:
+            with self._lock, self._connection:
+                # Takes the write lock before reading the keys, another worker may write too
+                self._connection.execute("BEGIN IMMEDIATE")
+                existing = self.lookup_keys(list(documents) + list(removed_ids))
+                for recipe_id in removed_ids:
+                    if recipe_id in existing:
+                        self.delete_rows(existing[recipe_id][0], delete_recipe=True)
+
+                for recipe_id, document in documents.items():
+                    key, doc_hash = existing.get(recipe_id, (None, None))
+                    if doc_hash != document.doc_hash:
+                        self.write_rows(key, document)
+        except sqlite3.Error as e:
+            # The store is up to date regardless, catch up on the next update
+            print(f"Updating search index {self.path} failed: {e}")
+            self._needs_full_sync = True
+
+    def lookup_keys(self, recipe_ids) -> dict[str, tuple[int, str]]:
+        keys = {}
+        for start in range(0, len(recipe_ids), QUERY_CHUNK_SIZE):
+            chunk = recipe_ids[start : start + QUERY_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            for recipe_id, key, doc_hash in self._connection.execute(
+                f"SELECT id, key, doc_hash FROM recipes WHERE id IN ({placeholders})",
+                chunk,
+            ):
+                keys[recipe_id] = (key, doc_hash)
+        return keys
+
+    def delete_rows(self, key, delete_recipe=False):
+        for table in ("recipe_categories", "ingredients", "notes"):
+            self._connection.execute(f"DELETE FROM {table} WHERE recipe_key = ?", (key,))
+        self._connection.execute("DELETE FROM recipe_fts WHERE rowid = ?", (key,))
+        if delete_recipe:
+            self._connection.execute("DELETE FROM recipes WHERE key = ?", (key,))
+
+    def write_rows(self, key, document: RecipeDocument):
+        recipe = document.recipe
+        if key is None:
+            key = self._connection.execute(
+                "INSERT INTO recipes (id, name, icon, doc_hash) VALUES (?, ?, ?, ?)",
+                (recipe.id, recipe.name, recipe.icon, document.doc_hash),
+            ).lastrowid
+        else:
+            self.delete_rows(key)
+            self._connection.execute(
+                "UPDATE recipes SET name = ?, icon = ?, doc_hash = ? WHERE key = ?",
+                (recipe.name, recipe.icon, document.doc_hash, key),
+            )
+
+        self._connection.executemany(
+            "INSERT INTO recipe_categories VALUES (?, ?)",
+            [(key, cat) for cat in sorted(recipe.categories)],
+        )
+        self._connection.executemany(
+            "INSERT INTO ingredients VALUES (?, ?, ?, ?, ?)",
+            [
+                (key, i, ingr.name, ingr.text, ingr.linked_recipe_id or None)
+                for i, ingr in enumerate(recipe.all_ingredients())
+            ],
+        )
+        self._connection.executemany(
+            "INSERT INTO notes VALUES (?, ?, ?)",
+            [(key, i, parts_text(note.parts)) for i, note in enumerate(recipe.notes)],
+        )
+        self._connection.execute(
+            "INSERT INTO recipe_fts (rowid, id, name, ingredients, tasks, notes) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, recipe.id, recipe.name, document.ingredients, document.tasks, document.notes),
+        )
+
+    def search(self, query: str, limit=20) -> list[SearchHit]:
+        match = fts_query(query)
+        if not match:
+            return []
+
+        weights = ", ".join(str(w) for w in COLUMN_WEIGHTS)
+        with self._lock:
+            rows = self._connection.execute(
+                f"""
+                SELECT id, name, snippet(recipe_fts, -1, '', '', '…', 10),
+                    bm25(recipe_fts, {weights}) AS score
+                FROM recipe_fts WHERE recipe_fts MATCH ?
+                ORDER BY score LIMIT ?
+                """,
+                (match, max(1, min(limit, MAX_RESULTS))),
+            ).fetchall()
+        # bm25 is lower for better matches
+        return [SearchHit(i, name, snippet, -score) for i, name, snippet, score in rows]
+
+    def close(self):
+        if self.store:
+            self.store.listeners.remove(self.sync)
+        self._connection.close()
+
+
+def fts_query(query: str) -> str:
+    # Every word has to match, as a prefix. Quoting keeps FTS5 syntax out of user input.
+    return " ".join(f'"{token}"*' for token in TOKEN_PATTERN.findall(query.lower()))
+
+
+def recipe_document(recipe: Recipe) -> RecipeDocument:
+    ingredients = "\n".join(i.text for i in recipe.all_ingredients())
+    tasks = "\n".join(
+        parts_text(task.parts) for step in recipe.steps for task in step.tasks
+    )
+    notes = "\n".join(parts_text(note.parts) for note in recipe.notes)
+    ingredient_names = [i.name or "" for i in recipe.all_ingredients()]
+    content = "\0".join(
+        [recipe.name, recipe.icon, *sorted(recipe.categories), ingredients, tasks, notes, *ingredient_names]
+    )
+    doc_hash = hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+    return RecipeDocument(recipe, ingredients, tasks, notes, doc_hash)
+
+
+def parts_text(parts) -> str:
+    return "".join(part.text for part in parts)
+
+
+def get_search_index() -> SearchIndex | None:
+    global _index  # pylint: disable=global-statement
+
+    if not SEARCH_INDEX_PATH:
+        return None
+    with _index_lock:
+        store = get_recipe_store()
+        if _index is None:
+            Path(SEARCH_INDEX_PATH).parent.mkdir(parents=True, exist_ok=True)
+            _index = SearchIndex(SEARCH_INDEX_PATH)
+        if _index.store is not store:
+            _index.attach(store)
+        return _index
+
+
+def close_search_index():
+    # SQLite connections must not be used across fork, workers open their own
+    global _index  # pylint: disable=global-statement
+
+    with _index_lock:
+        if _index is not None:
+            _index.close()
+            _index = None
@@ -1,19 +1,29 @@
-from collections import defaultdict
 from dataclasses import dataclass, field
-from dataclasses_json import dataclass_json
 from functools import lru_cache
+import hashlib
+import json
 
+from onyo_backend.lazy import dataclass_json
+from onyo_backend.metrics import METRICS, track_reload
 from onyo_backend.recipes import (
+    CACHE_DIR,
     DATA_DIR,
+    RECIPE_DIR,
     Ingredient,
     Recipe,
-    list_recipes,
+    atomic_write_text,
+    ingredient_aliases,
+    list_recipe_files,
+    load_recipe_from_file,
     normalize_ingr_name_for_shopping,
 )
 
 UNKNOWN = "unknown"
 IGNORE = "ignore"
 SHOPPING_LINKS_PATH = DATA_DIR / "shopping_links.yaml"
+# Normalized ingredient names per recipe file, to only parse changed recipes
+SHOPPING_INDEX_PATH = CACHE_DIR / "shopping_index.json"
+INDEX_VERSION = 1
 
 
 @dataclass
@@ -23,6 +33,18 @@ class ShoppingIngredient:
     used_in_recipes: list[str] = field(default_factory=list)
 
 
+@dataclass
+class ShoppingLinksDiff:
+    new: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    unknown: list[str] = field(default_factory=list)
+    special_counts: dict[str, int] = field(default_factory=dict)
+    ingredient_count: int = 0
+    changed_recipes: list[str] = field(default_factory=list)
+    errors: list[str] = field(default_factory=list)
+    written: bool = False
+
+
 @dataclass_json
 @dataclass
 class ShoppingListItem:
@@ -37,6 +59,7 @@ class ShoppingList:
 
 
 def get_shopping_ingredients():
+    METRICS.inc("onyo_cache_lookups_total", cache="shopping_links")
     lmod = SHOPPING_LINKS_PATH.lstat().st_mtime
     return load_shopping_ingredients_if_changed(SHOPPING_LINKS_PATH, lmod)
 
@@ -46,7 +69,8 @@ def load_shopping_ingredients_if_changed(
     shopping_links_file,
     lmod,
 ):
-    return load_shopping_ingredients(shopping_links_file)
+    with track_reload("shopping_links"):
+        return load_shopping_ingredients(shopping_links_file)
 
 
 def load_shopping_ingredients(path) -> dict[str, ShoppingIngredient]:
@@ -61,47 +85,136 @@ def load_shopping_ingredients(path) -> dict[str, ShoppingIngredient]:
     return ingredients
 
 
-def save_shopping_ingredients(
-    ingredients: dict[str, ShoppingIngredient], path, origins
-):
-    with open(path, "w", encoding="utf8") as file:
-        for ingr in sorted(ingredients.values(), key=lambda i: i.name):
-            file.write(f"{ingr.name}: {ingr.link}\n")
-            if origins:
-                for r in sorted(ingr.used_in_recipes):
-                    file.write(f"  # file://./recipes/{r}.yaml\n")
-
-
-def update_shopping_links(origins: bool):
-    _, recipes = list_recipes()
-    shopping_ingredients_in_file = load_shopping_ingredients(SHOPPING_LINKS_PATH)
-    shopping_ingredients_in_recipes = collect_ingredients_from_recipes(recipes)
-    shopping_ingredients_merged = merge_shopping_links(
+def format_shopping_ingredients(
+    ingredients: dict[str, ShoppingIngredient], origins
+) -> str:
+    lines = []
+    for ingr in sorted(ingredients.values(), key=lambda i: i.name):
+        lines.append(f"{ingr.name}: {ingr.link}\n")
+        if origins:
+            for r in sorted(ingr.used_in_recipes):
+                lines.append(f"  # file://./recipes/{r}.yaml\n")
+    return "".join(lines)
+
+
+def update_shopping_links(origins: bool) -> ShoppingLinksDiff:
+    index = load_ingredient_index(SHOPPING_INDEX_PATH)
+    new_index, changed_recipes, errors = refresh_ingredient_index(RECIPE_DIR, index)
+    if new_index != index:
+        SHOPPING_INDEX_PATH.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(SHOPPING_INDEX_PATH, json.dumps(new_index))
+
+    shopping_ingredients_in_file = (
+        load_shopping_ingredients(SHOPPING_LINKS_PATH)
+        if SHOPPING_LINKS_PATH.exists()
+        else {}
+    )
+    shopping_ingredients_merged, diff = merge_shopping_links(
         shopping_ingredients_in_file,
-        shopping_ingredients_in_recipes,
+        ingredients_from_index(new_index),
     )
+    diff.changed_recipes = changed_recipes
+    diff.errors = errors
+
+    content = format_shopping_ingredients(shopping_ingredients_merged, origins)
+    current = (
+        SHOPPING_LINKS_PATH.read_text(encoding="utf8")
+        if SHOPPING_LINKS_PATH.exists()
+        else None
+    )
+    if content != current:
+        atomic_write_text(SHOPPING_LINKS_PATH, content)
+        diff.written = True
+
+    return diff
 
-    special_counts = defaultdict(int)
-    for ingr in shopping_ingredients_merged.values():
-        if ingr.link in {IGNORE, UNKNOWN}:
-            special_counts[ingr.link] += 1
 
-    print(f"{len(shopping_ingredients_merged)} ingredients")
-    for lnk, cnt in special_counts.items():
+def print_shopping_links_diff(diff: ShoppingLinksDiff):
+    for e in diff.errors:
+        print(f"ERROR: {e}")
+    for name in diff.removed:
+        print(f"WARN: {name} is no longer used in any recipe")
+    for name in diff.new:
+        print(f"NEW INGREDIENT: {name}")
+
+    print(f"{diff.ingredient_count} ingredients ({len(diff.changed_recipes)} changed recipes)")
+    for lnk, cnt in diff.special_counts.items():
         print(f"{cnt} ingredients using '{lnk}'")
 
-    if special_counts[UNKNOWN] > 0:
+    if diff.unknown:
         print(
-            f"WARN: There are {special_counts[UNKNOWN]} ingredients with unknown shopping link. Hint: use '{IGNORE}' if link doesn't make sense."
+            f"WARN: There are {len(diff.unknown)} ingredients with unknown shopping link. Hint: use '{IGNORE}' if link doesn't make sense."
         )
 
-    save_shopping_ingredients(
-        shopping_ingredients_merged,
-        SHOPPING_LINKS_PATH,
-        origins,
+    if diff.written:
+        print(f"Updated {SHOPPING_LINKS_PATH}")
+    else:
+        print(f"{SHOPPING_LINKS_PATH} is up to date")
+
+
+def load_ingredient_index(path) -> dict:
+    try:
+        with open(path, "r", encoding="utf8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def refresh_ingredient_index(recipe_dir, index: dict):
+    # Only recipe files whose size or mtime changed since the last run are parsed
+    fingerprint = normalizer_fingerprint()
+    valid = index.get("version") == INDEX_VERSION and index.get("normalizer") == fingerprint
+    old_entries = index.get("recipes", {}) if valid else {}
+
+    entries = {}
+    changed = []
+    errors = []
+    for path in sorted(list_recipe_files(recipe_dir)):
+        stat = path.stat()
+        signature = [stat.st_mtime_ns, stat.st_size]
+        recipe_id = path.stem.lower()
+        entry = old_entries.get(recipe_id)
+        if entry is None or entry["signature"] != signature:
+            try:
+                recipe = load_recipe_from_file(path)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                errors.append(f"Error loading {path}: {e}")
+                continue
+            entry = {"signature": signature, "ingredients": shopping_names(recipe)}
+            changed.append(recipe_id)
+        entries[recipe_id] = entry
+
+    changed.extend(old_entries.keys() - entries.keys())
+    new_index = {"version": INDEX_VERSION, "normalizer": fingerprint, "recipes": entries}
+    return new_index, sorted(changed), errors
+
+
+def normalizer_fingerprint():
+    aliases = json.dumps(ingredient_aliases(), sort_keys=True)
+    return hashlib.blake2b(aliases.encode(), digest_size=8).hexdigest()
+
+
+def shopping_names(recipe: Recipe) -> list[str]:
+    return sorted(
+        {
+            normalize_ingr_name_for_shopping(i.name)
+            for i in recipe.all_ingredients()
+            if i.name is not None
+        }
     )
 
-    print(f"Updated {SHOPPING_LINKS_PATH}")
+
+def ingredients_from_index(index: dict) -> dict[str, ShoppingIngredient]:
+    shopping_ingredients = {}
+    for recipe_id, entry in index["recipes"].items():
+        for name in entry["ingredients"]:
+            shopping_ingr = shopping_ingredients.get(name)
+            if not shopping_ingr:
+                shopping_ingr = ShoppingIngredient(name=name, link=UNKNOWN)
+                shopping_ingredients[name] = shopping_ingr
+            shopping_ingr.used_in_recipes.append(recipe_id)
+
+    return shopping_ingredients
 
 
 def collect_ingredients_from_recipes(recipes: dict[str, Recipe]):
@@ -125,19 +238,30 @@ def collect_ingredients_from_recipes(recipes: dict[str, Recipe]):
 
 def merge_shopping_links(shopping_ingredients_in_file, shopping_ingredients_in_recipes):
     merged = {}
+    diff = ShoppingLinksDiff()
     for name, ingr in shopping_ingredients_in_file.items():
         if name in shopping_ingredients_in_recipes:
             ingr.used_in_recipes = shopping_ingredients_in_recipes[name].used_in_recipes
         else:
-            print(f"WARN: {name} is no longer used in any recipe")
+            diff.removed.append(name)
         merged[name] = ingr
 
     for name, ingr in shopping_ingredients_in_recipes.items():
         if name not in merged:
-            print(f"NEW INGREDIENT: {name}")
+            diff.new.append(name)
             merged[name] = ingr
 
-    return merged
+    diff.ingredient_count = len(merged)
+    for ingr in merged.values():
+        if ingr.link in {IGNORE, UNKNOWN}:
+            diff.special_counts[ingr.link] = diff.special_counts.get(ingr.link, 0) + 1
+        if ingr.link == UNKNOWN:
+            diff.unknown.append(ingr.name)
+
+    diff.new.sort()
+    diff.removed.sort()
+    diff.unknown.sort()
+    return merged, diff
 
 
 def assemble_shopping_list(
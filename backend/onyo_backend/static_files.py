@@ -0,0 +1,145 @@
+from dataclasses import dataclass, field
+from email.utils import formatdate
+import hashlib
+import mimetypes
+import os
+from pathlib import Path
+import re
+import threading
+
+from onyo_backend.api import compute_etag
+from onyo_backend.precache import content_hash
+
+# Files up to this size are kept in memory, larger ones are sent with sendfile
+SMALL_FILE_LIMIT = 32 * 1024
+# For URLs with the current version (precache.static_url), which never change
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+CONTENT_TYPES = {
+    ".js": "text/javascript",
+    ".css": "text/css",
+    ".json": "application/json",
+    ".png": "image/png",
+}
+
+
+@dataclass
+class StaticFile:
+    path: Path
+    signature: tuple[int, int]
+    size: int
+    etag: str
+    # Content-Type, ETag, Last-Modified etc., the same for every response
+    headers: dict[str, str] = field(default_factory=dict)
+    # Only for small files
+    body: bytes | None = None
+    # Content hash for versioned URLs (precache.content_hash)
+    version: str | None = None
+
+
+class StaticFiles:
+    def __init__(self, root: Path, small_file_limit=SMALL_FILE_LIMIT):
+        self.root = root.resolve()
+        self.small_file_limit = small_file_limit
+        self._files: dict[str, StaticFile] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, relative_path: str) -> StaticFile | None:
+        path = (self.root / relative_path).resolve()
+        if not path.is_relative_to(self.root):
+            return None
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        if not path.is_file():
+            return None
+
+        # A stat per request keeps edited assets fresh without a restart
+        signature = (stat.st_mtime_ns, stat.st_size)
+        static_file = self._files.get(relative_path)
+        if static_file is None or static_file.signature != signature:
+            static_file = self.load(path, signature)
+            with self._lock:
+                self._files[relative_path] = static_file
+        return static_file
+
+    def load(self, path: Path, signature) -> StaticFile:
+        mtime_ns, size = signature
+        body = None
+        if size <= self.small_file_limit:
+            body = path.read_bytes()
+            etag = compute_etag(body)
+            version = content_hash(body)
+        else:
+            etag = f'"{mtime_ns:x}-{size:x}"'
+            # Hashed once per change of the file, without keeping it in memory
+            version = file_hash(path)
+
+        content_type = CONTENT_TYPES.get(path.suffix) or (
+            mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        )
+        headers = {
+            "Content-Type": content_type,
+            "ETag": etag,
+            "Last-Modified": formatdate(mtime_ns / 1e9, usegmt=True),
+            "Cache-Control": "no-cache",
+            "Accept-Ranges": "bytes",
+        }
+        return StaticFile(path, signature, len(body) if body else size, etag, headers, body, version)
+
+
+def file_hash(path: Path) -> str:
+    # The same as content_hash of the whole file
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as file:
+        while chunk := file.read(64 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_range(header: str | None, size: int):
+    # Returns (start, end) inclusive, None to send the whole file or "invalid" if the
+    # range can't be satisfied. Multiple ranges are answered with the whole file.
+    if not header:
+        return None
+    match = RANGE_PATTERN.fullmatch(header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last n bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            return "invalid"
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    if last and int(last) < start:
+        # Not a valid range at all, which is ignored (RFC 9110)
+        return None
+    if start >= size:
+        return "invalid"
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def send_file_range(connection, wfile, path: Path, start: int, count: int):
+    with open(path, "rb") as file:
+        if connection is not None and hasattr(os, "sendfile"):
+            # Zero copy: the kernel sends the file to the socket directly
+            wfile.flush()
+            connection.sendfile(file, start, count)
+            return
+
+        file.seek(start)
+        remaining = count
+        while remaining:
+            chunk = file.read(min(64 * 1024, remaining))
+            if not chunk:
+                break
+            wfile.write(chunk)
+            remaining -= len(chunk)
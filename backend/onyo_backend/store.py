@@ -0,0 +1,426 @@
+from dataclasses import dataclass, field
+import os
+from pathlib import Path
+import threading
+import time
+import traceback
+from typing import Callable
+
+import yaml
+
+from onyo_backend import recipes as recipe_files
+from onyo_backend.metrics import METRICS, timed_stage, track_reload
+from onyo_backend.recipes import (
+    Category,
+    Recipe,
+    atomic_write_files,
+    load_recipe,
+    print_errors,
+    print_warnings,
+    recipe_version,
+    resolve_links,
+)
+from onyo_backend.views import ALL_RECIPES, SORT_ORDERS, SortedView
+
+# Seconds between directory scans of the server's store. Changes made through the
+# store (and logged by other workers) are visible right away regardless.
+SCAN_INTERVAL = float(os.environ.get("ONYO_SCAN_INTERVAL", 1.0))
+
+_store = None
+_store_lock = threading.Lock()
+
+
+@dataclass
+class RecipeFile:
+    path: Path
+    # Changes whenever the content may have changed, e.g. (mtime, size). None forces
+    # a reload.
+    signature: tuple | None
+    # Parsed YAML, kept to rebuild recipes whose links changed. None if invalid.
+    data: dict | None
+    modified_ns: int = 0
+
+
+class VersionConflict(Exception):
+    pass
+
+
+# Shared by the processes serving the same recipes (see prefork.py). Each write
+# appends the ids of the written recipes, so the file size works as a generation
+# counter: one stat per refresh tells a process whether others wrote something.
+# Their recipes are then loaded again even if the file signature looks unchanged
+# (e.g. coarse mtimes and the same size).
+class ChangeLog:
+    # The file is replaced, never truncated, when it is rotated. Its inode tells a
+    # reader that kept an offset into the previous file to start over.
+    def __init__(self, path: Path):
+        self.path = path
+        try:
+            stat = path.stat()
+            self.inode, self.offset = stat.st_ino, stat.st_size
+        except FileNotFoundError:
+            self.inode, self.offset = None, 0
+
+    def append(self, recipe_ids):
+        with open(self.path, "a", encoding="utf8") as file:
+            start = file.tell()
+            file.write("".join(f"{recipe_id}\n" for recipe_id in recipe_ids))
+            # Skip our own entries, unless others are still unread
+            if start == self.offset and os.fstat(file.fileno()).st_ino == self.inode:
+                self.offset = file.tell()
+
+    def has_new(self) -> bool:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return False
+        return stat.st_ino != self.inode or stat.st_size != self.offset
+
+    def read_new(self) -> list[str]:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return []
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            # Rotated since the last read
+            self.inode, self.offset = stat.st_ino, 0
+        size = stat.st_size
+        if size == self.offset:
+            return []
+
+        with open(self.path, "rb") as file:
+            file.seek(self.offset)
+            data = file.read(size - self.offset)
+        # A concurrent append may be incomplete, leave it for the next time
+        complete = data.rfind(b"\n") + 1
+        self.offset += complete
+        return data[:complete].decode("utf8").split()
+
+
+@dataclass
+class RecipeSnapshot:
+    generation: int = 0
+    categories: dict[str, Category] = field(default_factory=dict)
+    recipes: dict[str, Recipe] = field(default_factory=dict)
+    # (category id or ALL_RECIPES, sort order) -> view
+    views: dict[tuple[str, str], SortedView] = field(default_factory=dict)
+    modified_ns: dict[str, int] = field(default_factory=dict)
+
+    def view(self, view_key, order):
+        return self.views.get((view_key, order))
+
+
+@dataclass
+class StoreUpdate:
+    snapshot: RecipeSnapshot
+    changed: list[str]
+    removed: list[str]
+    # Changed recipes plus the ones linking to them
+    rebuilt: list[Recipe]
+    # recipe id -> error, for the files that were loaded again
+    errors: dict[str, str]
+
+
+# Keeps the recipes of a directory loaded. On refresh, only files whose size or
+# modification time changed are parsed again, plus the recipes linking to them.
+# Every change publishes a new snapshot; unchanged recipes, categories and views are
+# shared with the previous one.
+class RecipeStore:
+    def __init__(self, recipe_dir: Path):
+        self.recipe_dir = recipe_dir
+        self.snapshot = RecipeSnapshot()
+        self._files: dict[str, RecipeFile] = {}
+        # recipe id -> ids of recipes with ingredients linking to it
+        self._linked_by: dict[str, set[str]] = {}
+        # recipe id -> error of the files that currently fail to load
+        self.errors: dict[str, str] = {}
+        # Called with every StoreUpdate, while the store is locked
+        self.listeners: list[Callable[[StoreUpdate], None]] = []
+        self.change_log: ChangeLog | None = None
+        # refresh() only scans the directory again after this many seconds
+        self.scan_interval = 0.0
+        self._next_scan = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, errors: list[str] | None = None) -> RecipeSnapshot:
+        if not self.scan_due():
+            return self.snapshot
+        update = self.update()
+        if update:
+            print("Reloading recipes")
+            if errors is not None:
+                errors.extend(update.errors.values())
+            print_errors(update.errors.values())
+            print_warnings(update.rebuilt)
+        return self.snapshot
+
+    def scan_due(self) -> bool:
+        if time.monotonic() >= self._next_scan:
+            return True
+        return bool(self.change_log and self.change_log.has_new())
+
+    def update(self) -> StoreUpdate | None:
+        # Like refresh, but returns what changed instead of printing it. None if
+        # nothing changed.
+        with self._lock:
+            self._next_scan = time.monotonic() + self.scan_interval
+            if self.change_log:
+                for recipe_id in self.change_log.read_new():
+                    recipe_file = self._files.get(recipe_id)
+                    if recipe_file:
+                        recipe_file.signature = None
+            scanned = self.scan()
+            known = {k: f.signature for k, f in self._files.items()}
+            changed = {k for k, (_, sig) in scanned.items() if known.get(k) != sig}
+            removed = self._files.keys() - scanned.keys()
+            if not changed and not removed and self.snapshot.generation:
+                return None
+
+            with track_reload("recipes"):
+                for recipe_id in removed:
+                    del self._files[recipe_id]
+                    self.errors.pop(recipe_id, None)
+                loaded = self.load_files({k: scanned[k] for k in changed})
+                for recipe_id in changed:
+                    path, signature = scanned[recipe_id]
+                    self._files[recipe_id] = RecipeFile(
+                        path,
+                        signature,
+                        loaded[recipe_id],
+                        self.modified_time(signature),
+                    )
+                return self.apply(changed, removed)
+
+    def save(self, recipe_id, recipe_yaml, data, recipe: Recipe, expected_version=None):
+        # Writes an already validated recipe and puts it into the store as is, so the
+        # file doesn't need to be parsed again on the next refresh.
+        with self._lock:
+            if expected_version is not None:
+                path = self.recipe_path(recipe_id)
+                current = path.read_text(encoding="utf8") if path.exists() else ""
+                if recipe_version(current) != expected_version:
+                    raise VersionConflict(f"Recipe {recipe_id} was changed in the meantime")
+
+            return self.write([(recipe_id, recipe_yaml, data, recipe)])
+
+    def save_batch(self, entries, overwrite=False) -> RecipeSnapshot:
+        # entries: (file name without .yaml, recipe yaml, parsed yaml, recipe)
+        with self._lock:
+            existing = sorted(
+                recipe_id for recipe_id, *_ in entries if recipe_id.lower() in self._files
+            )
+            if existing and not overwrite:
+                raise VersionConflict(f"Recipes already exist: {', '.join(existing)}")
+
+            return self.write(entries)
+
+    def write(self, entries) -> RecipeSnapshot:
+        paths = {recipe_id: self.recipe_path(recipe_id) for recipe_id, *_ in entries}
+        atomic_write_files(
+            {paths[recipe_id]: recipe_yaml for recipe_id, recipe_yaml, *_ in entries}
+        )
+
+        prebuilt = {}
+        for recipe_id, _, data, recipe in entries:
+            stat = paths[recipe_id].stat()
+            self._files[recipe.id] = RecipeFile(
+                paths[recipe_id],
+                (stat.st_mtime_ns, stat.st_size),
+                data,
+                stat.st_mtime_ns,
+            )
+            self.errors.pop(recipe.id, None)
+            prebuilt[recipe.id] = recipe
+
+        update = self.apply(set(prebuilt), set(), prebuilt)
+        if self.change_log:
+            self.change_log.append(sorted(prebuilt))
+        print_errors(update.errors.values())
+        print_warnings(update.rebuilt)
+        return self.snapshot
+
+    def reload(self, recipe_ids) -> StoreUpdate | None:
+        # For recipe files written without the store: loads them right away and lets
+        # the other workers know
+        update = self.update()
+        if self.change_log:
+            self.change_log.append(sorted(recipe_ids))
+        return update
+
+    def recipe_path(self, recipe_id) -> Path:
+        recipe_file = self._files.get(recipe_id.lower())
+        return recipe_file.path if recipe_file else self.recipe_dir / f"{recipe_id}.yaml"
+
+    def scan(self) -> dict[str, tuple[Path, tuple]]:
+        scanned = {}
+        with os.scandir(self.recipe_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".yaml"):
+                    stat = entry.stat()
+                    recipe_id = entry.name[: -len(".yaml")].lower()
+                    scanned[recipe_id] = (
+                        Path(entry.path),
+                        (stat.st_mtime_ns, stat.st_size),
+                    )
+        return scanned
+
+    def apply(self, changed, removed, prebuilt=None) -> StoreUpdate:
+        old = self.snapshot
+        prebuilt = prebuilt or {}
+
+        # Link targets that changed or disappeared, or appeared for dangling links
+        stale = set(changed) | set(removed)
+        for recipe_id in list(stale):
+            stale |= self._linked_by.get(recipe_id, set())
+
+        recipes = {k: v for k, v in old.recipes.items() if k not in stale}
+        rebuilt = []
+        for recipe_id in stale:
+            recipe = prebuilt.get(recipe_id) or self.build_recipe(recipe_id)
+            if recipe:
+                recipes[recipe.id] = recipe
+                rebuilt.append(recipe)
+        resolve_links(recipes, rebuilt)
+        self.update_links(old.recipes, stale, rebuilt)
+
+        modified_ns = {
+            recipe_id: self._files[recipe_id].modified_ns for recipe_id in recipes
+        }
+        views = self.update_views(old, stale, rebuilt, modified_ns)
+        self.snapshot = RecipeSnapshot(
+            generation=old.generation + 1,
+            categories=self.update_categories(old, views, rebuilt),
+            recipes={r.id: r for r in views[(ALL_RECIPES, "name")].recipes},
+            views=views,
+            modified_ns=modified_ns,
+        )
+        update = StoreUpdate(
+            snapshot=self.snapshot,
+            changed=sorted(changed),
+            removed=sorted(removed),
+            rebuilt=rebuilt,
+            errors={k: self.errors[k] for k in sorted(stale) if k in self.errors},
+        )
+        for listener in self.listeners:
+            listener(update)
+        return update
+
+    def modified_time(self, signature) -> int:
+        return signature[0]
+
+    def load_files(self, scanned) -> dict[str, dict | None]:
+        return {
+            recipe_id: self.parse_file(recipe_id, path)
+            for recipe_id, (path, _) in scanned.items()
+        }
+
+    def parse_file(self, recipe_id, path):
+        self.errors.pop(recipe_id, None)
+        try:
+            with open(path, "r", encoding="utf8") as file:
+                return yaml.safe_load(file)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.add_error(recipe_id, path, e)
+            return None
+
+    def add_error(self, recipe_id, path, e):
+        self.errors[recipe_id] = (
+            f"Error loading {path}: {e}" + "\n" + traceback.format_exc()
+        )
+
+    def build_recipe(self, recipe_id) -> Recipe | None:
+        recipe_file = self._files.get(recipe_id)
+        if not recipe_file or recipe_file.data is None:
+            return None
+
+        try:
+            recipe = load_recipe(recipe_file.data, recipe_id)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.add_error(recipe_id, recipe_file.path, e)
+            return None
+        self.errors.pop(recipe_id, None)
+        return recipe
+
+    def update_links(self, old_recipes, stale, rebuilt):
+        for recipe_id in stale:
+            old_recipe = old_recipes.get(recipe_id)
+            for target in linked_recipe_ids(old_recipe) if old_recipe else ():
+                self._linked_by.get(target, set()).discard(recipe_id)
+        for recipe in rebuilt:
+            for target in linked_recipe_ids(recipe):
+                self._linked_by.setdefault(target, set()).add(recipe.id)
+
+    def update_views(self, old, stale, rebuilt, modified_ns):
+        touched_keys = {ALL_RECIPES}
+        for recipe_id in stale:
+            if recipe_id in old.recipes:
+                touched_keys |= category_ids(old.recipes[recipe_id])
+        for recipe in rebuilt:
+            touched_keys |= category_ids(recipe)
+
+        views = dict(old.views)
+        for view_key in touched_keys:
+            members = [
+                r for r in rebuilt if view_key == ALL_RECIPES or view_key in category_ids(r)
+            ]
+            for order, sort_key in SORT_ORDERS.items():
+                added = [(sort_key(r, modified_ns[r.id]), r) for r in members]
+                view = views.get((view_key, order))
+                if view is None:
+                    view = SortedView.build(added)
+                else:
+                    view = view.updated(stale, added)
+
+                if view or view_key == ALL_RECIPES:
+                    views[(view_key, order)] = view
+                else:
+                    views.pop((view_key, order), None)
+        return views
+
+    def update_categories(self, old, views, rebuilt):
+        names = {}
+        for recipe in rebuilt:
+            for cat in recipe.categories:
+                names.setdefault(cat.lower(), cat)
+
+        categories = []
+        for (view_key, order), view in views.items():
+            if view_key == ALL_RECIPES or order != "name":
+                continue
+
+            category = old.categories.get(view_key)
+            if category is None or category.recipes is not view.recipes:
+                name = category.name if category else names[view_key]
+                category = Category(name=name, recipes=view.recipes)
+            categories.append((view_key, category))
+
+        return dict(sorted(categories, key=lambda c: (c[1].name.lower(), c[0])))
+
+
+def linked_recipe_ids(recipe: Recipe):
+    return {i.linked_recipe_id for i in recipe.all_ingredients() if i.linked_recipe_id}
+
+
+def category_ids(recipe: Recipe):
+    return {cat.lower() for cat in recipe.categories}
+
+
+def get_recipe_store() -> RecipeStore:
+    global _store  # pylint: disable=global-statement
+
+    with _store_lock:
+        if _store is None or _store.recipe_dir != recipe_files.RECIPE_DIR:
+            _store = RecipeStore(recipe_files.RECIPE_DIR)
+            _store.scan_interval = SCAN_INTERVAL
+        return _store
+
+
+@timed_stage("list_recipes")
+def current_recipes() -> RecipeSnapshot:
+    METRICS.inc("onyo_cache_lookups_total", cache="recipes")
+    return get_recipe_store().refresh()
+
+
+def list_recipes():
+    snapshot = current_recipes()
+    return snapshot.categories, snapshot.recipes
@@ -0,0 +1,138 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from bisect import bisect_right, insort
+from dataclasses import dataclass, field
+import json
+import random
+from urllib.parse import urlencode
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+ALL_RECIPES = ""
+DEFAULT_ORDER = "name"
+
+
+def name_sort_key(recipe, modified_ns):  # pylint: disable=unused-argument
+    return (recipe.name.lower(), recipe.id)
+
+
+def modified_sort_key(recipe, modified_ns):
+    return (-modified_ns, recipe.id)
+
+
+def ingredient_count_sort_key(recipe, modified_ns):  # pylint: disable=unused-argument
+    return (sum(1 for _ in recipe.all_ingredients()), recipe.name.lower(), recipe.id)
+
+
+SORT_ORDERS = {
+    "name": name_sort_key,
+    "modified": modified_sort_key,
+    "ingredients": ingredient_count_sort_key,
+}
+SORT_LABELS = {
+    "name": "Name",
+    "modified": "Recently modified",
+    "ingredients": "Fewest ingredients",
+}
+
+
+@dataclass
+class Page:
+    recipes: list = field(default_factory=list)
+    next_cursor: str | None = None
+
+
+# Recipes in a fixed order, with the sort key of each so pages can be found by cursor.
+# Views are never modified; updated() returns a new view, so readers can keep using
+# the one they have.
+class SortedView:
+    def __init__(self, entries=()):
+        entries = list(entries)
+        self.keys = [k for k, _ in entries]
+        self.recipes = [r for _, r in entries]
+        self._ingredient_texts = None
+
+    @classmethod
+    def build(cls, entries):
+        return cls(sorted(entries, key=lambda e: e[0]))
+
+    def __len__(self):
+        return len(self.recipes)
+
+    def updated(self, removed_ids, added_entries):
+        entries = [
+            (k, r)
+            for k, r in zip(self.keys, self.recipes)
+            if r.id not in removed_ids
+        ]
+        if len(added_entries) > len(entries) // 8:
+            return SortedView.build([*entries, *added_entries])
+
+        for entry in added_entries:
+            insort(entries, entry, key=lambda e: e[0])
+        return SortedView(entries)
+
+    def page(self, cursor=None, limit=PAGE_SIZE, query="") -> Page:
+        start = self.cursor_position(cursor) if cursor else 0
+        matches = self.matcher(query)
+
+        found = []
+        i = start
+        while i < len(self.recipes) and (limit is None or len(found) < limit):
+            if matches(i):
+                found.append(self.recipes[i])
+            i += 1
+
+        has_more = any(matches(j) for j in range(i, len(self.recipes)))
+        next_cursor = encode_cursor(self.keys[i - 1]) if has_more else None
+        return Page(recipes=found, next_cursor=next_cursor)
+
+    def cursor_position(self, cursor):
+        try:
+            return bisect_right(self.keys, decode_cursor(cursor))
+        except TypeError as e:
+            # A cursor of another sort order
+            raise ValueError(f"Invalid cursor {cursor}") from e
+
+    def matcher(self, query: str):
+        term = query.lower()
+        if not term:
+            return lambda i: True
+
+        if term.startswith("i:"):
+            term = term[2:]
+            texts = self.ingredient_texts()
+            return lambda i: term in texts[i]
+
+        return lambda i: term in self.recipes[i].name.lower()
+
+    def ingredient_texts(self):
+        if self._ingredient_texts is None:
+            self._ingredient_texts = [
+                "|".join(r.searchable_ingredients()) for r in self.recipes
+            ]
+        return self._ingredient_texts
+
+    def random_recipe(self):
+        return random.choice(self.recipes) if self.recipes else None
+
+
+def encode_cursor(key) -> str:
+    return urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        return tuple(json.loads(urlsafe_b64decode(cursor.encode())))
+    except ValueError as e:
+        raise ValueError(f"Invalid cursor {cursor}") from e
+
+
+def fragment_url(view_key, cursor=None, query="", limit=PAGE_SIZE, order=DEFAULT_ORDER):
+    params = {"category": view_key, "cursor": cursor, "q": query}
+    if order != DEFAULT_ORDER:
+        params["sort"] = order
+    if limit != PAGE_SIZE:
+        params["limit"] = limit
+    return "/onyo/fragments/recipes?" + urlencode(
+        {k: v for k, v in params.items() if v}
+    )
@@ -0,0 +1,149 @@
+import asyncio
+import socket
+import time
+
+from benchmarks.corpus import generate_corpus
+from onyo_backend import __main__ as server_main, aio_server, recipes
+from onyo_backend.__main__ import SimpleRequestHandler
+from onyo_backend.aio_server import AsyncioServer
+from onyo_backend.precache import STATIC_DIR
+from onyo_backend.static_files import StaticFiles
+
+
+async def request(port, raw_request: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(raw_request)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+async def start_server(max_workers):
+    server = AsyncioServer(SimpleRequestHandler, max_workers=max_workers)
+    started = asyncio.get_running_loop().create_future()
+    serving = asyncio.create_task(server.serve("127.0.0.1", 0, started=started.set_result))
+    port = (await started).sockets[0].getsockname()[1]
+    return server, serving, port
+
+
+def test_asyncio_server_uses_regular_routes():
+    async def run():
+        server, serving, port = await start_server(max_workers=2)
+        try:
+            metrics = await request(port, b"GET /onyo/metrics HTTP/1.1\r\n\r\n")
+            not_found = await request(
+                port,
+                b"POST /onyo/nothing HTTP/1.1\r\nContent-Length: 5\r\n\r\nabcde",
+            )
+            # Too large for the memory cache, so sent from the file without sendfile
+            logo = await request(
+                port, b"GET /onyo/static/logo512.png HTTP/1.1\r\nRange: bytes=-10\r\n\r\n"
+            )
+        finally:
+            serving.cancel()
+            server.executor.shutdown()
+        return metrics, not_found, logo
+
+    metrics, not_found, logo = asyncio.run(run())
+
+    assert metrics.startswith(b"HTTP/1.0 200")
+    assert b"# TYPE onyo_requests_total counter" in metrics
+    assert not_found.startswith(b"HTTP/1.0 404")
+    assert logo.startswith(b"HTTP/1.0 206")
+    assert logo.endswith((STATIC_DIR / "logo512.png").read_bytes()[-10:])
+
+
+def test_oversized_form_is_rejected_without_waiting_for_the_body():
+    async def run():
+        server, serving, port = await start_server(max_workers=1)
+        try:
+            # Only the import route accepts bodies up to MAX_UPLOAD_SIZE
+            return await asyncio.wait_for(
+                request(
+                    port,
+                    b"POST /onyo/ideas HTTP/1.1\r\nX-User: admin\r\n"
+                    b"Content-Type: application/x-www-form-urlencoded\r\nContent-Length: 5000000\r\n\r\n",
+                ),
+                5,
+            )
+        finally:
+            serving.cancel()
+            server.executor.shutdown()
+
+    assert asyncio.run(run()).startswith(b"HTTP/1.0 413")
+
+
+def test_oversized_headers_are_answered():
+    async def run():
+        server, serving, port = await start_server(max_workers=1)
+        try:
+            return await asyncio.wait_for(
+                request(port, b"GET /onyo HTTP/1.1\r\nX-Padding: " + b"x" * 70_000 + b"\r\n\r\n"), 5
+            )
+        finally:
+            serving.cancel()
+            server.executor.shutdown()
+
+    assert asyncio.run(run()).startswith(b"HTTP/1.0 431")
+
+
+def test_slow_readers_dont_block_executor_threads(tmp_path, monkeypatch):
+    generate_corpus(tmp_path, 1500)
+    monkeypatch.setattr(recipes, "RECIPE_DIR", tmp_path / "recipes")
+
+    async def run():
+        server, serving, port = await start_server(max_workers=1)
+        slow_reader = socket.socket()
+        slow_reader.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        try:
+            # Megabytes of JSON, never read
+            slow_reader.connect(("127.0.0.1", port))
+            slow_reader.sendall(b"GET /onyo/api/recipes HTTP/1.1\r\n\r\n")
+            await asyncio.sleep(0.5)
+            return await asyncio.wait_for(request(port, b"GET /onyo/metrics HTTP/1.1\r\n\r\n"), 10)
+        finally:
+            slow_reader.close()
+            serving.cancel()
+            server.executor.shutdown(wait=False)
+
+    assert asyncio.run(run()).startswith(b"HTTP/1.0 200")
+
+
+def test_large_static_files_are_streamed(tmp_path, monkeypatch):
+    content = bytes(range(256)) * 65536
+    (tmp_path / "large.bin").write_bytes(content)
+    monkeypatch.setattr(server_main, "static_files", StaticFiles(tmp_path))
+    monkeypatch.setattr(aio_server, "STREAM_BUFFER_SIZE", 64 * 1024)
+    # Only the server uses StreamWriter here, the client is a plain socket
+    buffered = []
+    drain = asyncio.StreamWriter.drain
+
+    async def record_drain(writer):
+        buffered.append(writer.transport.get_write_buffer_size())
+        await drain(writer)
+
+    monkeypatch.setattr(asyncio.StreamWriter, "drain", record_drain)
+
+    def slow_request(port):
+        with socket.socket() as s:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            s.connect(("127.0.0.1", port))
+            s.sendall(b"GET /onyo/static/large.bin HTTP/1.1\r\n\r\n")
+            time.sleep(0.5)
+            return s.makefile("rb").read()
+
+    async def run():
+        server, serving, port = await start_server(max_workers=1)
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(slow_request, port), 10)
+        finally:
+            serving.cancel()
+            server.executor.shutdown()
+
+    response = asyncio.run(run())
+
+    assert response.startswith(b"HTTP/1.0 200")
+    assert response.endswith(content)
+    # Waited for the client while sending instead of buffering the whole file
+    assert max(buffered) < len(content) / 4
@@ -0,0 +1,63 @@
+import json
+import pytest
+
+from onyo_backend.api import (
+    RECIPE_FIELDS,
+    compute_etag,
+    etag_matches,
+    parse_fields,
+    recipe_fragments,
+    serialize_recipe,
+    serialize_recipes,
+)
+from onyo_backend.recipes import load_recipe
+
+
+@pytest.mark.golden_test("test_data/test_recipe.valid.*.golden.yaml")
+def test_serialize_recipe_matches_to_dict(golden):
+    recipe = load_recipe(golden["input"], "testrecipe")
+
+    serialized = json.loads(serialize_recipe(recipe))
+
+    expected = recipe.to_dict()
+    del expected["ingredient_map"]
+    expected["categories"] = sorted(expected["categories"])
+    assert serialized == expected
+
+
+@pytest.mark.golden_test("test_data/test_recipe.valid.sauce.golden.yaml")
+def test_serialize_recipes_with_fields(golden):
+    recipe = load_recipe(golden["input"], "testrecipe")
+
+    serialized = json.loads(serialize_recipes([recipe], parse_fields("id, name")))
+
+    assert serialized == [{"id": "testrecipe", "name": "Enchilada Sauce"}]
+
+
+@pytest.mark.golden_test("test_data/test_recipe.valid.sauce.golden.yaml")
+def test_recipe_fragments_cached_per_recipe_object(golden):
+    recipe = load_recipe(golden["input"], "testrecipe")
+    reloaded_recipe = load_recipe(golden["input"], "testrecipe")
+
+    assert recipe_fragments(recipe) is recipe_fragments(recipe)
+    assert recipe_fragments(reloaded_recipe) is not recipe_fragments(recipe)
+
+
+def test_parse_fields():
+    assert parse_fields(None) == RECIPE_FIELDS
+    assert parse_fields("name,icon") == ("name", "icon")
+    with pytest.raises(ValueError):
+        parse_fields("name,ingredient_map")
+    for raw_fields in (",", " ", " , "):
+        with pytest.raises(ValueError, match="No fields given"):
+            parse_fields(raw_fields)
+
+
+def test_etag_matches():
+    etag = compute_etag(b"[]")
+
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches(compute_etag(b"{}"), etag)
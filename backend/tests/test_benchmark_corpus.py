@@ -0,0 +1,15 @@
+from benchmarks.corpus import generate_corpus
+from onyo_backend.recipes import load_recipes_uncached
+
+
+def test_generate_corpus(tmp_path):
+    recipe_ids = generate_corpus(tmp_path, 30)
+
+    errors = []
+    categories, recipes = load_recipes_uncached(tmp_path / "recipes", errors)
+
+    assert not errors
+    assert set(recipes) == set(recipe_ids)
+    assert categories
+    assert not [r.warnings for r in recipes.values() if r.warnings]
+    assert (tmp_path / "shopping_links.yaml").exists()
@@ -0,0 +1,73 @@
+import json
+
+import yaml
+
+from benchmarks.corpus import generate_corpus
+from cli.__main__ import generate_static
+from onyo_backend import shopping_list
+from onyo_backend.bundle import compact_recipe, shard_of
+from onyo_backend.recipes import load_recipe
+
+
+def test_shard_of_matches_client():
+    # Values computed by shardOf in recipe_bundle.js
+    assert shard_of("enchiladas", 2**32) == 131956985
+    assert shard_of("älplermagronen", 2**32) == 3017515048
+    assert 0 <= shard_of("recipe3", 7) < 7
+
+
+def test_compact_recipe():
+    data = yaml.safe_load(
+        """
+name: Pasta
+category: [Meal, Quick]
+ingredients:
+- (
+- 200g $pasta$
+- 1 $salt$
+- )
+- ~sauce~
+steps:
+- tasks:
+  - Boil $pasta$ with $salt$ for !10 minutes!
+notes:
+- Use **fresh** pasta
+"""
+    )
+    recipe = load_recipe(data, "pasta")
+
+    compact = compact_recipe(recipe, {})
+
+    assert compact["name"] == "Pasta"
+    assert compact["category"] == "Meal"
+    assert compact["groups"] == [["", [["200g pasta", "start"], ["1 salt", "end"], ["sauce", "", "sauce"]]]]
+    _, tasks, ingredients = compact["steps"][0]
+    assert tasks == [["Boil ", ["i", "pasta", 0], " with ", ["i", "salt", 1], " for ", ["s", "10 minutes", 600]]]
+    assert ingredients == [["200g pasta", "start"], ["1 salt", "end"]]
+    assert compact["notes"] == [["Use ", ["t", "fresh", "bold"], " pasta"]]
+    assert compact["shopping"] == "200g pasta\n1 salt\nsauce"
+
+
+def test_generate_static_bundle(tmp_path, monkeypatch):
+    generate_corpus(tmp_path / "data", 120)
+    monkeypatch.setattr(
+        shopping_list, "SHOPPING_LINKS_PATH", tmp_path / "data" / "shopping_links.yaml"
+    )
+    recipe_ids = sorted(p.stem for p in (tmp_path / "data" / "recipes").glob("*.yaml"))
+    output_dir = tmp_path / "site"
+
+    generate_static(output_dir, tmp_path / "data" / "recipes", rev=None, bundle=True, shard_size=50)
+
+    assert not list(output_dir.glob("rec_*.html"))
+    shard_urls = json.loads(
+        (output_dir / "recipe.html").read_text(encoding="utf8").split("data-shards='")[1].split("'")[0]
+    )
+    assert len(shard_urls) == 3
+    shards = [json.loads((output_dir / url).read_text(encoding="utf8")) for url in shard_urls]
+    assert sorted(recipe_id for shard in shards for recipe_id in shard) == recipe_ids
+    for recipe_id in recipe_ids:
+        assert recipe_id in shards[shard_of(recipe_id, 3)]
+
+    assert f'href="recipe.html#{recipe_ids[0]}"' in (output_dir / "index.html").read_text(encoding="utf8")
+    manifest = json.loads((output_dir / "precache.json").read_text(encoding="utf8"))
+    assert {"recipe.html", *shard_urls} <= {p["url"] for p in manifest["pages"]}
@@ -0,0 +1,47 @@
+from onyo_backend.drafts import DraftProblem, check_draft, validate_draft
+from onyo_backend.recipes import load_recipe
+from onyo_backend.store import RecipeSnapshot
+
+DRAFT = """name: Stew
+category: Meal
+ingredients:
+- 1 $onion$
+- ~broth~
+- ~bread~
+steps:
+- tasks:
+  - Chop $onion$
+- tasks:
+  - Add $carrots$
+"""
+
+
+def test_check_draft_reports_warnings_with_lines():
+    bread = load_recipe({"name": "Bread", "category": "Bakery", "ingredients": []}, "bread")
+
+    result = check_draft("stew", DRAFT, {"bread": bread})
+
+    assert result.valid and not result.errors
+    assert result.warnings == [
+        DraftProblem(
+            "Task ingredient 'carrots' is not part of recipe",
+            line=11,
+            context="step 2, task 1",
+        ),
+        DraftProblem("Ingredient link broth is not valid", line=5),
+    ]
+
+
+def test_check_draft_reports_errors():
+    result = check_draft("stew", "name: Stew\ningredients: [\n", {})
+    assert not result.valid
+    assert result.errors[0].line == 3
+
+    result = check_draft("stew", "name: Stew\ningredients: []\n", {})
+    assert result.errors == [DraftProblem("Missing field 'category'")]
+
+
+def test_validate_draft_is_memoized_per_generation():
+    first = validate_draft("stew", DRAFT, RecipeSnapshot(generation=1))
+    assert validate_draft("stew", DRAFT, RecipeSnapshot(generation=1)) is first
+    assert validate_draft("stew", DRAFT, RecipeSnapshot(generation=2)) is not first
@@ -0,0 +1,64 @@
+import io
+import json
+from urllib.parse import urlencode
+
+import pytest
+
+from onyo_backend.forms import BodyError, FormParser, read_body_fields
+
+
+def read(body: bytes, content_type):
+    headers = {"Content-Length": str(len(body)), "Content-Type": content_type}
+    return read_body_fields(io.BytesIO(body), headers, 1024)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1000])
+def test_form_parser_handles_any_chunking(chunk_size):
+    body = urlencode(
+        {"recipe_yaml": "name: Crème brûlée\r\n& more = 100%", "version": "ab12"}
+    ).encode()
+
+    parser = FormParser()
+    for i in range(0, len(body), chunk_size):
+        parser.feed(body[i : i + chunk_size])
+
+    assert parser.close() == {
+        "recipe_yaml": "name: Crème brûlée\r\n& more = 100%",
+        "version": "ab12",
+    }
+
+
+def test_read_json_body():
+    body = json.dumps({"name": "Soup"}).encode()
+
+    assert read(body, "application/json; charset=utf-8") == {"name": "Soup"}
+
+
+@pytest.mark.parametrize(
+    "body,content_type,headers,status",
+    [
+        (b"x" * 2000, None, {}, 413),
+        (b"name=x", None, {"Content-Length": None}, 411),
+        (b"name=x", None, {"Transfer-Encoding": "chunked"}, 411),
+        (b"[1]", "application/json", {}, 400),
+        (b"name=%FF", None, {}, 400),
+        (b"<name/>", "text/xml", {}, 415),
+    ],
+)
+def test_invalid_bodies(body, content_type, headers, status):
+    all_headers = {"Content-Length": str(len(body)), **headers}
+    if content_type:
+        all_headers["Content-Type"] = content_type
+    all_headers = {k: v for k, v in all_headers.items() if v is not None}
+
+    with pytest.raises(BodyError) as e:
+        read_body_fields(io.BytesIO(body), all_headers, 1024)
+
+    assert e.value.status == status
+
+
+def test_truncated_body():
+    with pytest.raises(BodyError) as e:
+        read_body_fields(io.BytesIO(b"name=x"), {"Content-Length": "100"}, 1024)
+
+    assert e.value.status == 400
@@ -0,0 +1,53 @@
+import subprocess
+
+import pytest
+
+from onyo_backend.git_store import GitError, GitRecipeStore
+
+RECIPE = "name: {name}\ncategory: Meal\ningredients:\n- ~{link}~\n"
+
+
+def git(repo, *args):
+    subprocess.run(["git", "-C", str(repo), *args], check=True, capture_output=True)
+
+
+def commit(repo, message):
+    git(repo, "add", "-A")
+    git(repo, "-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-m", message)
+
+
+@pytest.fixture(name="recipe_dir")
+def fixture_recipe_dir(tmp_path):
+    recipe_dir = tmp_path / "recipes"
+    recipe_dir.mkdir()
+    git(tmp_path, "init", "-q")
+    (recipe_dir / "soup.yaml").write_text(RECIPE.format(name="Soup", link="bread"))
+    (recipe_dir / "bread.yaml").write_text(RECIPE.format(name="Bread", link="soup"))
+    (recipe_dir / "stew.yaml").write_text(RECIPE.format(name="Stew", link="stew"))
+    commit(tmp_path, "Add recipes")
+    return recipe_dir
+
+
+def test_reads_recipes_of_revision(recipe_dir):
+    store = GitRecipeStore(recipe_dir)
+    assert sorted(store.update().changed) == ["bread", "soup", "stew"]
+
+    # The working tree doesn't matter
+    (recipe_dir / "soup.yaml").write_text(RECIPE.format(name="Hot soup", link="bread"))
+    (recipe_dir / "stew.yaml").unlink()
+    assert store.update() is None
+
+    commit(recipe_dir.parent, "Change soup")
+    update = store.update()
+
+    assert (update.changed, update.removed) == (["soup"], ["stew"])
+    assert sorted(r.id for r in update.rebuilt) == ["bread", "soup"]
+    assert update.snapshot.recipes["bread"].ingredient_groups[0].ingredients[0].text == "Hot soup"
+
+    old = GitRecipeStore(recipe_dir, "HEAD~1").refresh()
+    assert old.recipes["soup"].name == "Soup"
+
+
+def test_unknown_revision(recipe_dir):
+    with pytest.raises(GitError):
+        GitRecipeStore(recipe_dir, "nope").refresh()
@@ -0,0 +1,49 @@
+from pathlib import Path
+import re
+import subprocess
+import sys
+
+import pytest
+
+BACKEND_DIR = Path(__file__).parent.parent
+# Cumulative import time in ms, generous enough for slow CI machines. Before the
+# heavy dependencies were made lazy the CLI took about 650ms and the server 370ms,
+# now about 200ms and 260ms. The lazy module check below catches regressions earlier.
+IMPORT_BUDGETS_MS = {"cli.__main__": 350, "onyo_backend.__main__": 400}
+# Only imported by the commands and requests that need them
+LAZY_MODULES = {
+    "cli.__main__": ["onyo_backend.__main__", "jinja2", "rich", "dataclasses_json", "tarfile"],
+    "onyo_backend.__main__": ["rich", "dataclasses_json", "tarfile", "asyncio"],
+}
+
+
+def import_time_ms(module: str) -> float:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    match = re.search(rf"\|\s*(\d+) \| {re.escape(module)}$", result.stderr, re.MULTILINE)
+    return int(match.group(1)) / 1000
+
+
+@pytest.mark.parametrize("module", IMPORT_BUDGETS_MS)
+def test_import_time_budget(module):
+    # Best of three against noise from other processes
+    elapsed_ms = min(import_time_ms(module) for _ in range(3))
+    assert elapsed_ms <= IMPORT_BUDGETS_MS[module], f"import {module} took {elapsed_ms:.0f}ms"
+
+
+@pytest.mark.parametrize("module", LAZY_MODULES)
+def test_heavy_modules_are_imported_lazily(module):
+    lazy = LAZY_MODULES[module]
+    result = subprocess.run(
+        [sys.executable, "-c", f"import sys, {module}; print(*[m for m in {lazy!r} if m in sys.modules])"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.split() == []
@@ -0,0 +1,74 @@
+import io
+import tarfile
+
+import pytest
+
+from onyo_backend import importer
+from onyo_backend.importer import (
+    ImportDocument,
+    import_recipes,
+    read_multi_document_yaml,
+    read_tar,
+)
+from onyo_backend.store import RecipeStore, VersionConflict
+
+SOUP = "name: Tomato soup\ncategory: Meal\ningredients:\n- 1 $tomato$\n"
+BREAD = "name: Bread\ncategory: Bakery\ningredients:\n- ~tomatoSoup~\n"
+
+
+def test_read_multi_document_yaml():
+    documents = read_multi_document_yaml(f"---\n{SOUP}---\n{BREAD}\n---\n")
+
+    assert [d.recipe_yaml for d in documents] == [SOUP, BREAD + "\n"]
+
+
+def test_read_tar():
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, text in [("recipes/soup.yaml", SOUP), ("README.md", "hi")]:
+            info = tarfile.TarInfo(name)
+            info.size = len(text.encode())
+            archive.addfile(info, io.BytesIO(text.encode()))
+    buffer.seek(0)
+
+    documents = read_tar(buffer)
+
+    assert documents == [ImportDocument("recipes/soup.yaml", SOUP, "soup")]
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_import_recipes_in_one_store_update(tmp_path, monkeypatch, parallel):
+    if parallel:
+        monkeypatch.setattr(importer, "PARALLEL_THRESHOLD", 0)
+    store = RecipeStore(tmp_path)
+    generation = store.refresh().generation
+
+    result = import_recipes(
+        store, read_multi_document_yaml(f"{SOUP}---\n{BREAD}"), workers=2
+    )
+
+    snapshot = store.refresh()
+    assert result.imported == ["tomatosoup", "bread"]
+    assert snapshot.generation == generation + 1
+    assert (tmp_path / "tomatoSoup.yaml").read_text(encoding="utf8") == SOUP
+    assert snapshot.recipes["bread"].ingredient_groups[0].ingredients[0].text == "Tomato soup"
+
+
+def test_import_is_all_or_nothing(tmp_path):
+    store = RecipeStore(tmp_path)
+    documents = read_multi_document_yaml(f"{SOUP}---\nname: Broken\n---\n{SOUP}")
+
+    result = import_recipes(store, documents)
+
+    assert result.imported == []
+    assert set(result.errors) == {"body#1", "body#2"}
+    assert not list(tmp_path.iterdir())
+
+
+def test_import_refuses_to_overwrite(tmp_path):
+    store = RecipeStore(tmp_path)
+    import_recipes(store, read_multi_document_yaml(SOUP))
+
+    with pytest.raises(VersionConflict):
+        import_recipes(store, read_multi_document_yaml(SOUP))
+    assert import_recipes(store, read_multi_document_yaml(SOUP), overwrite=True).imported
@@ -0,0 +1,96 @@
+import itertools
+import random
+
+import pytest
+
+from onyo_backend import ingredient_duplicates
+from onyo_backend.ingredient_duplicates import (
+    allowed_distance,
+    edit_distance,
+    find_duplicate_clusters,
+    similar_pairs,
+)
+
+
+@pytest.mark.parametrize(
+    "a, b, bound, expected",
+    [
+        ("onion", "onion", 2, 0),
+        ("onion", "onoin", 2, 1),
+        ("mozarella", "mozzarella", 2, 1),
+        ("parmesan", "parmigiano", 2, 3),
+        ("parmesan", "parmesan cheese", 2, 3),
+    ],
+)
+def test_edit_distance(a, b, bound, expected):
+    assert edit_distance(a, b, bound) == expected
+
+
+def test_find_duplicate_clusters():
+    usage = {
+        "tomato": 5,
+        "tomatto": 1,
+        "tomatoe sauce": 1,
+        "rice": 3,
+        "ice": 1,
+        "red pepper": 2,
+        "pepper red": 1,
+        "bell pepper": 2,
+        "mozarella": 1,
+        "mozzarella": 3,
+        "mozzarela": 1,
+    }
+
+    clusters = find_duplicate_clusters(usage)
+
+    assert [c.names for c in clusters] == [
+        ["mozzarella", "mozarella", "mozzarela"],
+        ["red pepper", "pepper red"],
+        ["tomato", "tomatto"],
+    ]
+    assert clusters[0].canonical == "mozzarella"
+
+
+def random_names(count, seed=1):
+    rnd = random.Random(seed)
+    letters = "abcdefghiklmnoprstuz"
+    names = set()
+    while len(names) < count:
+        name = "".join(rnd.choice(letters) for _ in range(rnd.randint(4, 14)))
+        names.add(name)
+        # Some typos
+        if rnd.random() < 0.2:
+            i = rnd.randrange(len(name))
+            names.add(name[:i] + rnd.choice(letters) + name[i + 1 :])
+    return sorted(names)[:count]
+
+
+def test_similar_pairs_finds_all_pairs():
+    names = random_names(800)
+
+    expected = {
+        (i, j)
+        for i, j in itertools.combinations(range(len(names)), 2)
+        if (d := allowed_distance(names[i], names[j], 2)) and edit_distance(names[i], names[j], d) <= d
+    }
+
+    assert expected
+    assert set(similar_pairs(names, 2)) == expected
+
+
+def test_similar_pairs_compares_subquadratic_pairs(monkeypatch):
+    comparisons = []
+
+    def counting_edit_distance(a, b, bound):
+        comparisons.append((a, b))
+        return edit_distance(a, b, bound)
+
+    monkeypatch.setattr(ingredient_duplicates, "edit_distance", counting_edit_distance)
+    counts = []
+    for count in (1000, 4000):
+        comparisons.clear()
+        list(similar_pairs(random_names(count), 2))
+        counts.append(len(comparisons))
+
+    # All pairs would be 16 times as many
+    assert counts[1] < 6 * counts[0]
@@ -0,0 +1,43 @@
+from onyo_backend.metrics import Metrics, current_request, stage, track_request
+
+
+def test_render_prometheus():
+    metrics = Metrics()
+    metrics.counter("requests_total", "Requests")
+    metrics.histogram("duration_seconds", "Duration")
+
+    metrics.inc("requests_total", route="/onyo", status=200)
+    metrics.inc("requests_total", route="/onyo", status=200)
+    metrics.observe("duration_seconds", 0.002)
+    metrics.observe("duration_seconds", 100)
+
+    text = metrics.render_prometheus()
+
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{route="/onyo",status="200"} 2' in text
+    assert 'duration_seconds_bucket{le="0.001"} 0' in text
+    assert 'duration_seconds_bucket{le="0.0025"} 1' in text
+    assert 'duration_seconds_bucket{le="5"} 1' in text
+    assert 'duration_seconds_bucket{le="+Inf"} 2' in text
+    assert "duration_seconds_count 2" in text
+
+    metrics.labels = (("worker", "12"),)
+    text = metrics.render_prometheus()
+    assert 'requests_total{worker="12",route="/onyo",status="200"} 2' in text
+    assert 'duration_seconds_bucket{worker="12",le="+Inf"} 2' in text
+
+
+def test_stages_are_accumulated_per_request():
+    with stage("ignored outside of requests"):
+        pass
+
+    with track_request("GET") as request:
+        with stage("render"):
+            pass
+        with stage("render"):
+            pass
+        with stage("write"):
+            pass
+
+    assert set(request.stages) == {"render", "write"}
+    assert current_request() is None
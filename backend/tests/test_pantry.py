@@ -0,0 +1,77 @@
+import yaml
+
+from onyo_backend.pantry import PantryIndex, parse_available
+from onyo_backend.recipes import load_recipe
+from onyo_backend.shopping_list import IGNORE, ShoppingIngredient
+
+
+def recipe(recipe_id, *ingredients):
+    data = yaml.safe_load(f"name: {recipe_id.title()}\ncategory: Meal\ningredients:\n")
+    data["ingredients"] = list(ingredients)
+    return load_recipe(data, recipe_id)
+
+
+def build_index(*recipes):
+    index = PantryIndex()
+    index.update({r.id: r for r in recipes}, {"salt": ShoppingIngredient("salt", IGNORE)})
+    return index
+
+
+def matches(result):
+    return [(m.id, m.coverage, m.missing) for m in result.matches]
+
+
+def test_ranks_by_coverage():
+    index = build_index(
+        recipe("omelette", "3 $eggs$", "1 $salt$", "10g $butter$"),
+        recipe("pancakes", "2 $egg$", "200g $flour$", "3dl $milk$"),
+        recipe("toast", "1 $bread$"),
+        recipe("water", "1l $salt$"),
+    )
+
+    result = index.query(["Eggs", " butter", "tofu", "salt"])
+
+    assert matches(result) == [
+        ("omelette", 1.0, []),
+        ("pancakes", 0.333, ["flour", "milk"]),
+    ]
+    # Salt is a staple and always available
+    assert result.unknown == ["tofu"]
+    assert matches(index.query(["eggs"], max_missing=1)) == [("omelette", 0.5, ["butter"])]
+    assert matches(index.query(["eggs"], limit=1)) == [("omelette", 0.5, ["butter"])]
+    # Not sliced from the end
+    assert matches(index.query(["eggs"], limit=-1)) == [("omelette", 0.5, ["butter"])]
+
+
+def test_includes_linked_recipes():
+    dough = recipe("dough", "200g $flour$", "1 $egg$")
+    sauce = recipe("sauce", "2 $tomatoes$", "~dough~")
+    pizza = recipe("pizza", "~sauce~", "1 $mozzarella$")
+    index = build_index(dough, sauce, pizza)
+
+    assert matches(index.query(["tomato", "mozzarella", "flour"])) == [
+        ("pizza", 0.75, ["egg"]),
+        ("sauce", 0.667, ["egg"]),
+        ("dough", 0.5, ["egg"]),
+    ]
+
+    # Only the changed recipe is read again, the linking ones see the change too
+    index.update(
+        {r.id: r for r in (recipe("dough", "200g $flour$"), sauce, pizza)},
+        {},
+    )
+    assert [m.id for m in index.query(["tomato", "mozzarella", "flour"], max_missing=0).matches] == [
+        "dough",
+        "pizza",
+        "sauce",
+    ]
+
+
+def test_link_cycles_terminate():
+    index = build_index(recipe("a", "1 $egg$", "~b~"), recipe("b", "1 $milk$", "~a~"))
+
+    assert {m.id for m in index.query(["egg", "milk"], max_missing=0).matches} == {"a", "b"}
+
+
+def test_parse_available():
+    assert parse_available(["eggs,flour", " milk ", ","]) == ["eggs", "flour", " milk "]
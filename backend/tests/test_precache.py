@@ -0,0 +1,49 @@
+import pytest
+
+from onyo_backend import precache
+from onyo_backend.precache import build_precache_manifest, get_server_precache_manifest, server_page_hashes
+from onyo_backend.recipes import Category, load_recipe
+
+
+def test_build_precache_manifest():
+    manifest = build_precache_manifest({"b.html": "2", "a.html": "1"})
+
+    assert manifest["pages"] == [
+        {"url": "a.html", "hash": "1"},
+        {"url": "b.html", "hash": "2"},
+    ]
+    assert manifest == build_precache_manifest({"a.html": "1", "b.html": "2"})
+    changed_manifest = build_precache_manifest({"a.html": "1", "b.html": "3"})
+    assert manifest["version"] != changed_manifest["version"]
+
+
+@pytest.mark.golden_test("test_data/test_recipe.valid.sauce.golden.yaml")
+def test_server_page_hashes_only_change_for_affected_pages(golden):
+    def page_hashes(recipe_name):
+        recipe = load_recipe({**golden["input"], "name": recipe_name}, "testrecipe")
+        other = load_recipe({**golden["input"], "category": "Other"}, "other")
+        categories = {
+            "sauces": Category(name="Sauces", recipes=[recipe]),
+            "other": Category(name="Other", recipes=[other]),
+        }
+        recipes = {recipe.id: recipe, other.id: other}
+        return server_page_hashes(categories, recipes, {}, "fingerprint")
+
+    before = page_hashes("Enchilada Sauce")
+    after = page_hashes("Green Enchilada Sauce")
+
+    changed = {url for url in before if before[url] != after[url]}
+    assert changed == {"/onyo", "/onyo/categories/Sauces", "/onyo/recipes/testrecipe"}
+
+
+def test_asset_fingerprint_is_reused_between_checks(monkeypatch):
+    scans = []
+    monkeypatch.setattr(precache, "scan_asset_fingerprint", lambda: scans.append(1) or "fingerprint")
+    monkeypatch.setattr(precache, "_asset_fingerprint_cache", (0.0, None))
+    monkeypatch.setattr(precache, "FINGERPRINT_INTERVAL", 3600)
+
+    first = get_server_precache_manifest({}, {}, {})
+    second = get_server_precache_manifest({}, {}, {})
+
+    assert len(scans) == 1
+    assert second == first
@@ -0,0 +1,103 @@
+import http.client
+import json
+import os
+from pathlib import Path
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode
+
+import pytest
+
+from benchmarks.corpus import generate_corpus
+from onyo_backend.prefork import MAX_CHANGE_LOG_SIZE, rotate_change_log
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get(port, path):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    conn.request("GET", path)
+    response = conn.getresponse()
+    body = response.read()
+    conn.close()
+    return response.status, body
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_workers_see_edits_of_other_workers(tmp_path):
+    generate_corpus(tmp_path, 20)
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "onyo_backend", "--workers", "3"],
+        cwd=BACKEND_DIR,
+        env={
+            **os.environ,
+            "ONYO_DATA_DIR": str(tmp_path),
+            "ONYO_CACHE_DIR": str(tmp_path.parent / f"{tmp_path.name}_cache"),
+            "ONYO_PORT": str(port),
+        },
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 20
+        while True:
+            try:
+                get(port, "/onyo/metrics")
+                break
+            except OSError:
+                assert time.monotonic() < deadline, "server didn't start"
+                time.sleep(0.1)
+
+        _, metrics = get(port, "/onyo/metrics")
+        assert re.search(rb'_count\{worker="\d+",', metrics)
+
+        _, page = get(port, "/onyo/recipes/recipe3/edit")
+        version = re.search(r'name="version" value="([^"]+)"', page.decode()).group(1)
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.request(
+            "POST",
+            "/onyo/recipes/recipe3/edit",
+            urlencode({"recipe_yaml": "name: Edited\ncategory: Meal\ningredients:\n- 1 $salt$\n", "version": version}),
+            {"X-User": "admin", "Content-Type": "application/x-www-form-urlencoded"},
+        )
+        assert conn.getresponse().status == 302
+        conn.close()
+
+        # New connections are spread over the workers
+        for _ in range(10):
+            status, body = get(port, "/onyo/api/recipes/recipe3?fields=name")
+            assert (status, json.loads(body)) == (200, {"name": "Edited"})
+    finally:
+        server.send_signal(signal.SIGTERM)
+        assert server.wait(timeout=10) == 0
+
+    # Coordination happens outside the data repo
+    assert (tmp_path.parent / f"{tmp_path.name}_cache" / "changes.log").exists()
+    assert not (tmp_path / ".cache").exists()
+
+
+def test_change_log_is_only_replaced_when_large(tmp_path):
+    path = tmp_path / "changes.log"
+    rotate_change_log(path)
+    assert path.read_bytes() == b""
+
+    # Workers of an earlier start may still read it
+    path.write_bytes(b"soup\n")
+    rotate_change_log(path)
+    assert path.read_bytes() == b"soup\n"
+
+    path.write_bytes(b"x\n" * MAX_CHANGE_LOG_SIZE)
+    inode = path.stat().st_ino
+    rotate_change_log(path)
+    assert path.read_bytes() == b""
+    assert path.stat().st_ino != inode
@@ -0,0 +1,29 @@
+from contextlib import nullcontext
+import pstats
+
+from onyo_backend.profiling import profile_request, profiled
+
+
+def busy_work():
+    return sum(i * i for i in range(200_000))
+
+
+def test_profiled_writes_pstats_and_collapsed_stacks(tmp_path):
+    with profiled(tmp_path, "GET /onyo"):
+        busy_work()
+
+    pstats_file = next(tmp_path.glob("GET_onyo-*.pstats"))
+    collapsed_file = next(tmp_path.glob("GET_onyo-*.collapsed"))
+
+    stats = pstats.Stats(str(pstats_file))
+    assert any(func[2] == "busy_work" for func in stats.stats)
+    for line in collapsed_file.read_text(encoding="utf8").splitlines():
+        stack, count = line.rsplit(" ", maxsplit=1)
+        assert int(count) > 0
+        assert "test_profiled_writes_pstats_and_collapsed_stacks" in stack
+
+
+def test_profile_request_disabled_without_profile_dir():
+    assert isinstance(
+        profile_request("GET", "/onyo", {"X-Onyo-Profile": "1"}), nullcontext
+    )
@@ -1,11 +1,14 @@
 from pathlib import Path
 import pytest
 
+from onyo_backend import recipes
 from onyo_backend.recipes import (
     create_empty_recipe,
+    default_cache_dir,
     load_recipe,
     load_recipe_from_file,
     normalize_for_recipe_id,
+    normalize_ingr_name_for_shopping,
     resolve_links,
 )
 
@@ -47,3 +50,23 @@ def test_create_empty_recipe(tmp_path):
     assert recipe.id == "dummyrecipe"
     assert recipe.name == "Dummy Recipe"
     assert recipe.categories == {"Meal"}
+
+
+def test_normalize_ingr_name_for_shopping_with_alias_file(tmp_path, monkeypatch):
+    aliases_path = tmp_path / "ingredient_aliases.yaml"
+    aliases_path.write_text("Spring Onions: scallions\nonoin: onion\n", encoding="utf8")
+    monkeypatch.setattr(recipes, "INGREDIENT_ALIASES_PATH", aliases_path)
+
+    assert normalize_ingr_name_for_shopping("spring onions:2") == "scallion"
+    assert normalize_ingr_name_for_shopping("Onoins") == "onion"
+    assert normalize_ingr_name_for_shopping("tomatoes") == "tomato"
+    assert normalize_ingr_name_for_shopping("carrots") == "carrot"
+
+
+def test_default_cache_dir_is_outside_the_data_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+    cache_dir = default_cache_dir(tmp_path / "data")
+
+    assert cache_dir.parent == tmp_path / "cache" / "onyo"
+    assert cache_dir != default_cache_dir(tmp_path / "other_data")
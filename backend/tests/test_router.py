@@ -0,0 +1,59 @@
+from onyo_backend.router import Router, split_target
+
+
+def make_router():
+    router = Router()
+    router.get(r"/onyo")("index")
+    router.post(r"/onyo/recipes/import")("import")
+    router.get(r"/onyo/recipes/([^/]+)/?")("recipe")
+    router.get(r"/onyo/recipes/([^/]+)/edit")("edit_page")
+    router.post(r"/onyo/recipes/([^/]+)/edit")("edit")
+    router.get(r"/onyo/a/([^/]+)/b/([^/]+)")("two_args")
+    router.compile()
+    return router
+
+
+def test_match():
+    router = make_router()
+
+    assert router.match("GET", "/onyo").handler == "index"
+    assert router.match("GET", "/onyo").args == ()
+    assert router.match("GET", "/onyo/recipes/pasta/").args == ("pasta",)
+    assert router.match("GET", "/onyo/recipes/pasta/edit").handler == "edit_page"
+    assert router.match("POST", "/onyo/recipes/pasta/edit").handler == "edit"
+    assert router.match("GET", "/onyo/a/1/b/2").args == ("1", "2")
+    assert router.match("GET", "/onyo/recipes/main%20dish").args == ("main dish",)
+    assert router.match("POST", "/onyo/recipes/import").handler == "import"
+
+
+def test_match_falls_through_by_method():
+    router = make_router()
+
+    match = router.match("GET", "/onyo/recipes/import")
+    assert (match.handler, match.args) == ("recipe", ("import",))
+    match = router.match("PUT", "/onyo/recipes/import")
+    assert match.handler is None
+    assert match.allowed_methods == ["GET", "POST"]
+
+
+def test_no_match():
+    router = make_router()
+
+    assert router.match("GET", "/onyo/") is None
+    assert router.match("GET", "/onyox") is None
+    assert router.match("GET", "/onyo/recipes/a/b/c") is None
+
+
+def test_method_not_allowed():
+    match = make_router().match("POST", "/onyo/recipes/pasta")
+
+    assert match.handler is None
+    assert match.allowed_methods == ["GET"]
+
+
+def test_split_target():
+    assert split_target("/onyo/api/recipes?fields=id,name&x=1") == (
+        "/onyo/api/recipes",
+        {"fields": ["id,name"], "x": ["1"]},
+    )
+    assert split_target("/onyo") == ("/onyo", {})
@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+import yaml
+
+from onyo_backend.recipes import load_recipe
+from onyo_backend.search_index import SearchIndex, fts_query
+from onyo_backend.store import RecipeStore
+
+RECIPE = """name: {name}
+category: Meal
+ingredients:
+- 2 $carrots$
+- 1 $onion$
+steps:
+- tasks:
+  - {task}
+notes:
+- {note}
+"""
+
+
+def write_recipe(recipe_dir, recipe_id, name, task="Chop $onion$", note="Serve hot"):
+    (recipe_dir / f"{recipe_id}.yaml").write_text(
+        RECIPE.format(name=name, task=task, note=note), encoding="utf8"
+    )
+
+
+@pytest.fixture(name="store")
+def fixture_store(tmp_path):
+    recipe_dir = tmp_path / "recipes"
+    recipe_dir.mkdir()
+    write_recipe(recipe_dir, "soup", "Carrot soup", "Simmer for an hour")
+    write_recipe(recipe_dir, "stew", "Stew", note="Better with carrots the next day")
+    write_recipe(recipe_dir, "salad", "Crème salad", "Toss with dressing")
+    return RecipeStore(recipe_dir)
+
+
+def search_ids(index, query):
+    return [hit.id for hit in index.search(query)]
+
+
+def test_search_ranks_names_first(store, tmp_path):
+    index = SearchIndex(tmp_path / "search.sqlite")
+    index.attach(store)
+
+    assert search_ids(index, "carrot") == ["soup", "stew", "salad"]
+    assert search_ids(index, "simmer") == ["soup"]
+    assert search_ids(index, "creme") == ["salad"]
+    assert search_ids(index, 'next" day') == ["stew"]
+    assert not search_ids(index, "  ")
+    # SQLite takes a negative LIMIT as no limit
+    assert [hit.id for hit in index.search("carrot", -1)] == ["soup"]
+
+
+def test_index_follows_store_updates(store, tmp_path):
+    index = SearchIndex(tmp_path / "search.sqlite")
+    index.attach(store)
+
+    write_recipe(store.recipe_dir, "soup", "Pumpkin soup", "Roast the pumpkin")
+    (store.recipe_dir / "stew.yaml").unlink()
+    store.refresh()
+
+    assert search_ids(index, "pumpkin") == ["soup"]
+    assert search_ids(index, "simmer") == []
+    assert search_ids(index, "next day") == []
+
+    recipe_yaml = RECIPE.format(name="Green salad", task="Wash", note="Crunchy")
+    data = yaml.safe_load(recipe_yaml)
+    store.save("salad", recipe_yaml, data, load_recipe(data, "salad"))
+    assert search_ids(index, "green") == ["salad"]
+
+
+def test_reopened_index_only_writes_changes(store, tmp_path):
+    path = tmp_path / "search.sqlite"
+    index = SearchIndex(path)
+    index.attach(store)
+    # pylint: disable=protected-access
+    full_write_changes = index._connection.total_changes
+    index.close()
+
+    reopened = SearchIndex(path)
+    reopened.attach(RecipeStore(store.recipe_dir))
+    assert reopened._connection.total_changes == 0
+    reopened.close()
+
+    write_recipe(store.recipe_dir, "stew", "Bean stew")
+    reopened = SearchIndex(path)
+    reopened.attach(RecipeStore(store.recipe_dir))
+    assert search_ids(reopened, "bean") == ["stew"]
+    assert 0 < reopened._connection.total_changes < full_write_changes
+
+
+def test_processes_can_write_the_same_index(store, tmp_path, capsys):
+    path = tmp_path / "search.sqlite"
+    first, second = SearchIndex(path), SearchIndex(path)
+    first.attach(store)
+    second.attach(RecipeStore(store.recipe_dir))
+
+    # pylint: disable=protected-access
+    first._connection.execute("BEGIN IMMEDIATE")
+    timer = threading.Timer(0.3, first._connection.commit)
+    timer.start()
+    write_recipe(store.recipe_dir, "stew", "Bean stew")
+    second.store.refresh()
+    timer.join()
+
+    assert "failed" not in capsys.readouterr().out
+    assert search_ids(first, "bean") == ["stew"]
+    assert first._connection.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+
+
+def test_fts_query_quotes_words():
+    assert fts_query('Soup OR "x') == '"soup"* "or"* "x"*'
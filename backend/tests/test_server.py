@@ -0,0 +1,357 @@
+import http.client
+import http.server
+import json
+import re
+import socket
+import threading
+from urllib.parse import urlencode
+
+import pytest
+
+from benchmarks.corpus import generate_corpus
+from onyo_backend import recipes, search_index, shopping_list, store
+from onyo_backend.__main__ import SimpleRequestHandler, buffered_chunks
+from onyo_backend.precache import STATIC_DIR, static_url
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    generate_corpus(tmp_path, 50)
+    monkeypatch.setattr(recipes, "RECIPE_DIR", tmp_path / "recipes")
+    monkeypatch.setattr(
+        shopping_list, "SHOPPING_LINKS_PATH", tmp_path / "shopping_links.yaml"
+    )
+    # Tests change recipe files and expect to see that right away
+    monkeypatch.setattr(store, "SCAN_INTERVAL", 0)
+
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SimpleRequestHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_buffered_chunks():
+    chunks = list(buffered_chunks(["ab", "cd", "e", "ä"], 3))
+    assert chunks == [b"abcd", "eä".encode()]
+    assert not list(buffered_chunks([], 3))
+
+
+def test_large_pages_are_streamed_chunked(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server)
+
+    conn.request("GET", "/onyo")
+    response = conn.getresponse()
+    body = response.read()
+
+    assert response.status == 200
+    assert response.getheader("Transfer-Encoding") == "chunked"
+    assert body.rstrip().endswith(b"</html>")
+
+    # Keep-alive: the same connection can be reused
+    conn.request("GET", "/onyo/api/categories")
+    response = conn.getresponse()
+    assert response.status == 200
+    assert response.getheader("Content-Length") == str(len(response.read()))
+    conn.close()
+
+
+def test_api_rejects_empty_fields(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server)
+    for path in ("/onyo/api/recipes?fields=,", "/onyo/api/recipes/recipe3?fields=%20"):
+        conn.request("GET", path)
+        response = conn.getresponse()
+        assert (response.status, response.read()) == (400, b"No fields given")
+    conn.close()
+
+
+def test_head_is_only_answered_for_static_files(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server)
+    conn.request("HEAD", "/onyo/static/style.css")
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 200
+    assert response.getheader("Content-Length") == str((STATIC_DIR / "style.css").stat().st_size)
+
+    for path, allowed in (("/onyo", "GET"), ("/onyo/recipes", "POST")):
+        conn.request("HEAD", path)
+        response = conn.getresponse()
+        response.read()
+        assert (response.status, response.getheader("Allow")) == (405, allowed)
+
+    conn.request("HEAD", "/onyo/nothing")
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 404
+
+    # Nothing was sent after the headers, the connection is still usable
+    conn.request("GET", "/onyo/api/categories")
+    assert conn.getresponse().status == 200
+    conn.close()
+
+
+def test_recipe_fragments_are_paged(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server)
+
+    url = "/onyo/fragments/recipes?limit=20"
+    items = 0
+    pages = 0
+    while url:
+        conn.request("GET", url)
+        response = conn.getresponse()
+        body = response.read()
+        assert response.status == 200
+        items += body.count(b"<li>")
+        pages += 1
+        url = response.getheader("X-Next-Url")
+
+    assert (items, pages) == (50, 3)
+
+    conn.request("GET", "/onyo/fragments/recipes?cursor=bogus")
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 400
+    conn.close()
+
+
+def test_edit_recipe_checks_version(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server)
+    recipe_yaml = "name: Edited\ncategory: Meal\ningredients:\n- 1 $salt$\n"
+
+    def post_edit(version):
+        body = urlencode({"recipe_yaml": recipe_yaml, "version": version})
+        conn.request(
+            "POST",
+            "/onyo/recipes/recipe3/edit",
+            body,
+            {"X-User": "admin", "Content-Type": "application/x-www-form-urlencoded"},
+        )
+        response = conn.getresponse()
+        response.read()
+        return response.status
+
+    conn.request("GET", "/onyo/recipes/recipe3/edit")
+    page = conn.getresponse().read().decode()
+    version = re.search(r'name="version" value="([^"]+)"', page).group(1)
+
+    assert post_edit(version) == 302
+    assert post_edit(version) == 409
+    conn.request("GET", "/onyo/api/recipes/recipe3?fields=name")
+    assert json.loads(conn.getresponse().read()) == {"name": "Edited"}
+    conn.close()
+
+
+def test_oversized_body_is_rejected_unread(server):
+    with socket.create_connection(("127.0.0.1", server)) as s:
+        s.sendall(
+            b"POST /onyo/recipes HTTP/1.1\r\nHost: localhost\r\nX-User: admin\r\n"
+            b"Content-Type: application/x-www-form-urlencoded\r\n"
+            b"Content-Length: 100000000\r\n\r\nname="
+        )
+        response = s.makefile("rb").read()
+
+    assert response.startswith(b"HTTP/1.1 413")
+    assert b"Connection: close" in response
+
+
+def test_rejected_post_keeps_connection_usable(server):
+    body = b"text=hello"
+    with socket.create_connection(("127.0.0.1", server)) as s:
+        # Not authenticated, rejected before the body is read
+        s.sendall(
+            b"POST /onyo/ideas HTTP/1.1\r\nHost: localhost\r\n"
+            b"Content-Type: application/x-www-form-urlencoded\r\n"
+            b"Content-Length: %d\r\n\r\n%s"
+            b"GET /onyo/api/categories HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+            % (len(body), body)
+        )
+        response = s.makefile("rb").read()
+
+    first, _, second = response.partition(b"Not authenticated")
+    assert first.startswith(b"HTTP/1.1 401")
+    assert second.startswith(b"HTTP/1.1 200")
+    assert b'"recipes"' in second
+
+
+def test_import_recipes(server, tmp_path):
+    conn = http.client.HTTPConnection("127.0.0.1", server)
+    body = "name: Imported soup\ncategory: Meal\ningredients:\n- 1 $salt$\n"
+
+    conn.request(
+        "POST",
+        "/onyo/recipes/import",
+        body.encode(),
+        {"X-User": "admin", "Content-Type": "application/yaml"},
+    )
+    response = conn.getresponse()
+
+    assert response.status == 200
+    assert json.loads(response.read()) == {"imported": ["importedsoup"], "errors": {}}
+    conn.request("GET", "/onyo/recipes/importedsoup")
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 200
+
+    # Only POST goes to the import route
+    (tmp_path / "recipes" / "import.yaml").write_text(
+        "name: Imported\ncategory: Meal\ningredients:\n- 1 $salt$\n", encoding="utf8"
+    )
+    conn.request("GET", "/onyo/recipes/import")
+    response = conn.getresponse()
+    assert response.status == 200
+    assert b"Imported" in response.read()
+    conn.close()
+
+
+def test_validate_recipe_draft(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server)
+    body = urlencode({"recipe_yaml": "name: Soup\ncategory: Meal\ningredients:\n- ~nope~\n"})
+
+    conn.request(
+        "POST",
+        "/onyo/recipes/recipe3/validate",
+        body,
+        {"X-User": "admin", "Content-Type": "application/x-www-form-urlencoded"},
+    )
+    response = conn.getresponse()
+
+    assert response.status == 200
+    result = json.loads(response.read())
+    assert result["valid"]
+    assert [(w["message"], w["line"]) for w in result["warnings"]] == [
+        ("Ingredient link nope is not valid", 4)
+    ]
+    conn.close()
+
+
+def test_search(server, tmp_path, monkeypatch):
+    conn = http.client.HTTPConnection("127.0.0.1", server)
+    conn.request("GET", "/onyo/api/search?q=recipe")
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 404
+
+    monkeypatch.setattr(search_index, "SEARCH_INDEX_PATH", str(tmp_path / "search.sqlite"))
+    monkeypatch.setattr(search_index, "_index", None)
+    conn.request("GET", "/onyo/api/recipes/recipe7?fields=name")
+    name = json.loads(conn.getresponse().read())["name"]
+
+    conn.request("GET", f"/onyo/api/search?q={name.split()[0]}&limit=3")
+    response = conn.getresponse()
+
+    assert response.status == 200
+    hits = json.loads(response.read())
+    assert 0 < len(hits) <= 3
+    assert all(name.split()[0].lower() in hit["name"].lower() for hit in hits[:1])
+
+    for limit in ("-1", "0", "x"):
+        conn.request("GET", f"/onyo/api/search?q=recipe&limit={limit}")
+        response = conn.getresponse()
+        assert (response.status, response.read()) == (400, b"Invalid limit")
+    conn.close()
+
+
+def test_static_files(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server)
+
+    conn.request("GET", "/onyo/static/style.css?v=1")
+    response = conn.getresponse()
+    style = response.read()
+    etag = response.getheader("ETag")
+    assert response.status == 200
+    assert response.getheader("Content-Type") == "text/css"
+    assert style == (STATIC_DIR / "style.css").read_bytes()
+
+    conn.request("GET", "/onyo/static/style.css", headers={"If-None-Match": etag})
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 304
+
+    logo = (STATIC_DIR / "logo512.png").read_bytes()
+    conn.request("GET", "/onyo/static/logo512.png", headers={"Range": "bytes=100-199"})
+    response = conn.getresponse()
+    assert response.status == 206
+    assert response.getheader("Content-Range") == f"bytes 100-199/{len(logo)}"
+    assert response.read() == logo[100:200]
+
+    conn.request("GET", "/onyo/static/logo512.png")
+    response = conn.getresponse()
+    assert response.read() == logo
+
+    conn.request("GET", "/onyo/static/logo512.png", headers={"Range": f"bytes={len(logo)}-"})
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 416
+
+    conn.request("GET", "/onyo/static/../__main__.py")
+    response = conn.getresponse()
+    response.read()
+    assert response.status == 404
+    conn.close()
+
+
+def test_pages_load_versioned_scripts(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server)
+    conn.request("GET", "/onyo/recipes/recipe3")
+    page = conn.getresponse().read().decode()
+    assert "<script type" not in page
+    script_url = re.search(r'<script src="(/onyo/static/pages/recipe\.js\?v=\w+)"', page).group(1)
+
+    conn.request("GET", script_url)
+    response = conn.getresponse()
+    assert response.read() == (STATIC_DIR / "pages" / "recipe.js").read_bytes()
+    assert "immutable" in response.getheader("Cache-Control")
+
+    conn.request("GET", static_url("logo512.png"))
+    response = conn.getresponse()
+    response.read()
+    assert "immutable" in response.getheader("Cache-Control")
+
+    conn.request("GET", "/onyo/static/pages/recipe.js?v=outdated")
+    response = conn.getresponse()
+    response.read()
+    assert response.getheader("Cache-Control") == "no-cache"
+    conn.close()
+
+
+def test_precache_manifest_quotes_category_urls(server, tmp_path):
+    (tmp_path / "recipes" / "gumbo.yaml").write_text(
+        "name: Gumbo\ncategory: 'Soups #1?'\ningredients:\n- 1 $okra$\n", encoding="utf8"
+    )
+    conn = http.client.HTTPConnection("127.0.0.1", server)
+    conn.request("GET", "/onyo")
+    index_page = conn.getresponse().read().decode()
+    conn.request("GET", "/onyo/precache.json")
+    urls = [page["url"] for page in json.loads(conn.getresponse().read())["pages"]]
+
+    url = "/onyo/categories/Soups%20%231%3F"
+    assert url in urls
+    assert f'href="{url}"' in index_page
+    conn.request("GET", url)
+    response = conn.getresponse()
+    assert response.status == 200
+    assert b"Gumbo" in response.read()
+    conn.close()
+
+
+def test_pantry(server, tmp_path):
+    (tmp_path / "recipes" / "omelette.yaml").write_text(
+        "name: Omelette\ncategory: Meal\ningredients:\n- 3 $eggs$\n- 10g $butter$\n", encoding="utf8"
+    )
+    conn = http.client.HTTPConnection("127.0.0.1", server)
+
+    conn.request("GET", "/onyo/api/pantry?have=eggs,butter&have=unobtainium&max_missing=0")
+    response = conn.getresponse()
+    result = json.loads(response.read())
+    assert response.status == 200
+    assert {"id": "omelette", "name": "Omelette", "coverage": 1.0, "missing": []} in result["matches"]
+    assert all(m["missing"] == [] for m in result["matches"])
+    assert result["unknown"] == ["unobtainium"]
+
+    for query in ("limit=x", "limit=0", "limit=-1", "max_missing=-1"):
+        conn.request("GET", f"/onyo/api/pantry?have=eggs&{query}")
+        response = conn.getresponse()
+        response.read()
+        assert response.status == 400
+    conn.close()
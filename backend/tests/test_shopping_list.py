@@ -1,6 +1,11 @@
 import pytest
 
-from onyo_backend.shopping_list import assemble_shopping_list, load_shopping_ingredients
+from onyo_backend import shopping_list
+from onyo_backend.shopping_list import (
+    assemble_shopping_list,
+    load_shopping_ingredients,
+    update_shopping_links,
+)
 from onyo_backend.recipes import load_recipe
 
 
@@ -21,3 +26,48 @@ def test_assemble_shopping_list(golden, tmp_path):
 
     # Then
     assert shopping_list.to_dict() == golden.out["output"]
+
+
+def write_recipe(recipe_dir, recipe_id, *ingredients):
+    lines = "".join(f"- 1 ${i}$\n" for i in ingredients)
+    (recipe_dir / f"{recipe_id}.yaml").write_text(
+        f"name: {recipe_id}\ncategory: Meal\ningredients:\n{lines}", encoding="utf8"
+    )
+
+
+@pytest.fixture(name="data_dir")
+def fixture_data_dir(tmp_path, monkeypatch):
+    (tmp_path / "recipes").mkdir()
+    (tmp_path / "shopping_links.yaml").write_text("carrot: veg\nsalt: ignore\n", encoding="utf8")
+    monkeypatch.setattr(shopping_list, "RECIPE_DIR", tmp_path / "recipes")
+    monkeypatch.setattr(shopping_list, "SHOPPING_LINKS_PATH", tmp_path / "shopping_links.yaml")
+    monkeypatch.setattr(
+        shopping_list, "SHOPPING_INDEX_PATH", tmp_path / "cache" / "shopping_index.json"
+    )
+    return tmp_path
+
+
+def test_update_shopping_links_incrementally(data_dir):
+    write_recipe(data_dir / "recipes", "soup", "carrots", "leeks")
+    write_recipe(data_dir / "recipes", "stew", "carrot:1", "carrot:2")
+
+    diff = update_shopping_links(origins=False)
+
+    assert (diff.new, diff.removed, diff.unknown) == (["leek"], ["salt"], ["leek"])
+    assert diff.changed_recipes == ["soup", "stew"]
+    assert diff.written
+    assert (data_dir / "shopping_links.yaml").read_text(encoding="utf8") == (
+        "carrot: veg\nleek: unknown\nsalt: ignore\n"
+    )
+
+    diff = update_shopping_links(origins=False)
+    assert (diff.new, diff.changed_recipes, diff.written) == ([], [], False)
+
+    write_recipe(data_dir / "recipes", "soup", "carrots", "salt", "extra")
+    (data_dir / "recipes" / "stew.yaml").unlink()
+    diff = update_shopping_links(origins=True)
+    assert (diff.new, diff.removed) == (["extra"], ["leek"])
+    assert diff.changed_recipes == ["soup", "stew"]
+    assert "salt: ignore\n  # file://./recipes/soup.yaml\n" in (
+        data_dir / "shopping_links.yaml"
+    ).read_text(encoding="utf8")
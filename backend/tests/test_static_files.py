@@ -0,0 +1,50 @@
+import pytest
+
+from onyo_backend.precache import content_hash
+from onyo_backend.static_files import StaticFiles, parse_range
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, None),
+        ("bytes=0-9", (0, 9)),
+        ("bytes=90-", (90, 99)),
+        ("bytes=90-200", (90, 99)),
+        ("bytes=-10", (90, 99)),
+        ("bytes=-200", (0, 99)),
+        ("bytes=100-", "invalid"),
+        ("bytes=5-2", None),
+        ("bytes=150-200", "invalid"),
+        ("bytes=-0", "invalid"),
+        ("bytes=0-1,5-6", None),
+        ("items=0-1", None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+def test_static_files_cache_small_files(tmp_path):
+    (tmp_path / "style.css").write_text("body {}", encoding="utf8")
+    (tmp_path / "big.png").write_bytes(b"x" * 100)
+    (tmp_path.parent / "secret.txt").write_text("secret", encoding="utf8")
+    static_files = StaticFiles(tmp_path, small_file_limit=50)
+
+    style = static_files.lookup("style.css")
+    assert style.body == b"body {}"
+    assert style.headers["Content-Type"] == "text/css"
+    assert static_files.lookup("style.css") is style
+
+    (tmp_path / "style.css").write_text("body { margin: 0 }", encoding="utf8")
+    changed = static_files.lookup("style.css")
+    assert changed.body == b"body { margin: 0 }"
+    assert changed.etag != style.etag
+
+    big = static_files.lookup("big.png")
+    assert (big.body, big.size) == (None, 100)
+    # Large files are versioned too, with the hash static_url uses
+    assert big.version == content_hash(b"x" * 100)
+    assert style.version == content_hash(b"body {}")
+    assert static_files.lookup("../secret.txt") is None
+    assert static_files.lookup("missing.js") is None
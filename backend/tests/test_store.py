@@ -0,0 +1,210 @@
+import os
+import stat
+
+import pytest
+import yaml
+
+from onyo_backend.recipes import (
+    atomic_write_text,
+    load_recipe,
+    load_recipes_uncached,
+    recipe_version,
+)
+from onyo_backend.store import ChangeLog, RecipeStore, VersionConflict
+from onyo_backend.views import ALL_RECIPES, SORT_ORDERS
+
+RECIPE = """name: {name}
+category: {category}
+ingredients:
+- 2 $carrots$
+{extra}
+"""
+
+
+def write_recipe(recipe_dir, recipe_id, name, category="Meal", extra="", mtime=None):
+    path = recipe_dir / f"{recipe_id}.yaml"
+    path.write_text(
+        RECIPE.format(name=name, category=category, extra=extra), encoding="utf8"
+    )
+    if mtime:
+        os.utime(path, ns=(mtime, mtime))
+
+
+@pytest.fixture(name="recipe_dir")
+def fixture_recipe_dir(tmp_path):
+    write_recipe(tmp_path, "soup", "Soup", mtime=3_000_000_000)
+    write_recipe(tmp_path, "bread", "Bread", "Bakery", "- ~soup~\n- 1 $flour$", 2_000_000_000)
+    write_recipe(tmp_path, "apple_pie", "Apple pie", "Bakery", mtime=1_000_000_000)
+    return tmp_path
+
+
+def view_ids(snapshot, view_key, order):
+    return [r.id for r in snapshot.view(view_key, order).recipes]
+
+
+def test_views_are_sorted(recipe_dir):
+    snapshot = RecipeStore(recipe_dir).refresh()
+
+    assert list(snapshot.categories) == ["bakery", "meal"]
+    assert [r.id for r in snapshot.categories["bakery"].recipes] == ["apple_pie", "bread"]
+    assert view_ids(snapshot, ALL_RECIPES, "name") == ["apple_pie", "bread", "soup"]
+    assert view_ids(snapshot, ALL_RECIPES, "modified") == ["soup", "bread", "apple_pie"]
+    assert view_ids(snapshot, "bakery", "ingredients") == ["apple_pie", "bread"]
+    assert snapshot.recipes["bread"].ingredient_groups[0].ingredients[1].text == "Soup"
+
+
+def test_refresh_only_rebuilds_changed_and_linking_recipes(recipe_dir):
+    write_recipe(recipe_dir, "jam", "Jam", "Pantry")
+    store = RecipeStore(recipe_dir)
+    first = store.refresh()
+    assert store.refresh() is first
+
+    write_recipe(recipe_dir, "soup", "Winter soup", "Meal")
+    second = store.refresh()
+
+    assert second.generation == first.generation + 1
+    assert second.recipes["jam"] is first.recipes["jam"]
+    assert second.recipes["bread"] is not first.recipes["bread"]
+    assert second.recipes["bread"].ingredient_groups[0].ingredients[1].text == "Winter soup"
+    assert second.categories["pantry"] is first.categories["pantry"]
+    assert view_ids(second, ALL_RECIPES, "modified")[0] == "soup"
+
+
+def test_removed_recipes_and_empty_categories_disappear(recipe_dir):
+    store = RecipeStore(recipe_dir)
+    store.refresh()
+
+    (recipe_dir / "soup.yaml").unlink()
+    snapshot = store.refresh()
+
+    assert "soup" not in snapshot.recipes
+    assert "meal" not in snapshot.categories
+    assert snapshot.view("meal", "name") is None
+    assert [w.msg for w in snapshot.recipes["bread"].warnings] == [
+        "Ingredient link soup is not valid"
+    ]
+
+
+def test_incremental_views_match_full_load(recipe_dir):
+    store = RecipeStore(recipe_dir)
+    store.refresh()
+    write_recipe(recipe_dir, "stew", "Stew", "Meal", "- 1 $beans$\n- 1 $onion$")
+    write_recipe(recipe_dir, "apple_pie", "Apple pie", "Meal")
+    (recipe_dir / "broken.yaml").write_text("name: [", encoding="utf8")
+
+    errors = []
+    snapshot = store.refresh(errors)
+    fresh = RecipeStore(recipe_dir).refresh()
+
+    assert len(errors) == 1
+    assert list(snapshot.categories) == list(fresh.categories)
+    for view_key, order in fresh.views:
+        assert view_ids(snapshot, view_key, order) == view_ids(fresh, view_key, order)
+    assert set(SORT_ORDERS) == {order for _, order in snapshot.views}
+    _, recipes = load_recipes_uncached(recipe_dir, [])
+    assert set(snapshot.recipes) == set(recipes)
+
+
+def test_save_puts_validated_recipe_into_store(recipe_dir):
+    store = RecipeStore(recipe_dir)
+    store.refresh()
+    recipe_yaml = RECIPE.format(name="Tomato soup", category="Meal", extra="")
+    data = yaml.safe_load(recipe_yaml)
+    recipe = load_recipe(data, "soup")
+    version = recipe_version((recipe_dir / "soup.yaml").read_text(encoding="utf8"))
+
+    saved = store.save("soup", recipe_yaml, data, recipe, version)
+
+    assert saved.recipes["soup"] is recipe
+    assert saved.recipes["bread"].ingredient_groups[0].ingredients[1].text == "Tomato soup"
+    assert store.refresh() is saved
+    assert (recipe_dir / "soup.yaml").read_text(encoding="utf8") == recipe_yaml
+    with pytest.raises(VersionConflict):
+        store.save("soup", recipe_yaml, data, recipe, version)
+
+
+def test_change_log_reloads_recipes_written_by_other_stores(recipe_dir, tmp_path_factory):
+    log_path = tmp_path_factory.mktemp("cache") / "changes.log"
+    log_path.write_bytes(b"")
+    writer, reader = RecipeStore(recipe_dir), RecipeStore(recipe_dir)
+    writer.change_log, reader.change_log = ChangeLog(log_path), ChangeLog(log_path)
+    writer.refresh()
+    reader.refresh()
+
+    # Same size and mtime as before, so only the change log reveals the change
+    recipe_yaml = RECIPE.format(name="Leek", category="Meal", extra="")
+    data = yaml.safe_load(recipe_yaml)
+    writer.save("soup", recipe_yaml, data, load_recipe(data, "soup"))
+    os.utime(recipe_dir / "soup.yaml", ns=(3_000_000_000, 3_000_000_000))
+
+    update = reader.update()
+    assert update.changed == ["soup"]
+    assert reader.snapshot.recipes["soup"].name == "Leek"
+    assert reader.update() is None
+
+
+def test_change_log_follows_rotation(tmp_path):
+    log_path = tmp_path / "changes.log"
+    log_path.write_text("soup\n", encoding="utf8")
+    reader = ChangeLog(log_path)
+
+    # A new file that grows past the old offset before the reader looks again
+    atomic_write_text(log_path, "")
+    ChangeLog(log_path).append(["bread", "apple_pie"])
+
+    assert reader.has_new()
+    assert reader.read_new() == ["bread", "apple_pie"]
+    assert not reader.has_new()
+
+
+def test_refresh_scans_at_most_once_per_interval(recipe_dir, tmp_path_factory):
+    log_path = tmp_path_factory.mktemp("cache") / "changes.log"
+    log_path.write_bytes(b"")
+    writer, reader = RecipeStore(recipe_dir), RecipeStore(recipe_dir)
+    writer.change_log, reader.change_log = ChangeLog(log_path), ChangeLog(log_path)
+    reader.scan_interval = 3600
+    writer.refresh()
+    snapshot = reader.refresh()
+
+    write_recipe(recipe_dir, "stew", "Stew")
+    assert reader.refresh() is snapshot
+
+    # Writes of other workers are seen right away, together with the rest
+    recipe_yaml = RECIPE.format(name="Leek", category="Meal", extra="")
+    data = yaml.safe_load(recipe_yaml)
+    writer.save("soup", recipe_yaml, data, load_recipe(data, "soup"))
+    refreshed = reader.refresh()
+    assert refreshed.recipes["soup"].name == "Leek"
+    assert "stew" in refreshed.recipes
+    assert reader.refresh() is refreshed
+
+
+def test_atomic_write_text_keeps_mode(tmp_path):
+    path = tmp_path / "recipe.yaml"
+    path.write_text("old", encoding="utf8")
+    path.chmod(0o640)
+
+    atomic_write_text(path, "new")
+
+    assert path.read_text(encoding="utf8") == "new"
+    assert stat.S_IMODE(path.stat().st_mode) == 0o640
+    assert [p.name for p in tmp_path.iterdir()] == ["recipe.yaml"]
+
+
+def test_update_reports_changed_files_and_linked_recipes(recipe_dir):
+    store = RecipeStore(recipe_dir)
+    assert store.update().changed == ["apple_pie", "bread", "soup"]
+    assert store.update() is None
+
+    (recipe_dir / "soup.yaml").write_text("name: [", encoding="utf8")
+    update = store.update()
+
+    assert (update.changed, update.removed) == (["soup"], [])
+    assert list(update.errors) == ["soup"]
+    assert [r.id for r in update.rebuilt] == ["bread"]
+    assert [w.msg for w in update.rebuilt[0].warnings] == ["Ingredient link soup is not valid"]
+
+    write_recipe(recipe_dir, "soup", "Soup")
+    update = store.update()
+    assert not update.errors and not store.errors
+    assert sorted(r.id for r in update.rebuilt) == ["bread", "soup"]
@@ -0,0 +1,69 @@
+import pytest
+
+from benchmarks.corpus import generate_corpus
+from onyo_backend.recipes import load_recipes_uncached
+from onyo_backend.views import SortedView, decode_cursor, encode_cursor, name_sort_key
+
+
+@pytest.fixture(name="corpus")
+def fixture_corpus(tmp_path):
+    generate_corpus(tmp_path, 120)
+    return load_recipes_uncached(tmp_path / "recipes", [])
+
+
+def name_view(recipes):
+    return SortedView.build([(name_sort_key(r, 0), r) for r in recipes])
+
+
+def test_pages_cover_sorted_view_once(corpus):
+    _, recipes = corpus
+    view = name_view(recipes.values())
+
+    seen = []
+    cursor = None
+    while True:
+        page = view.page(cursor, limit=25)
+        seen.extend(page.recipes)
+        cursor = page.next_cursor
+        if not cursor:
+            break
+
+    assert seen == sorted(recipes.values(), key=lambda r: name_sort_key(r, 0))
+
+
+def test_page_with_query(corpus):
+    _, recipes = corpus
+    view = name_view(recipes.values())
+    recipe = next(iter(recipes.values()))
+    ingredient = sorted(recipe.searchable_ingredients())[0]
+
+    by_name = view.page(query=recipe.name.upper(), limit=None)
+    by_ingredient = view.page(query=f"i:{ingredient}", limit=None)
+
+    assert recipe in by_name.recipes
+    assert all(recipe.name.lower() in r.name.lower() for r in by_name.recipes)
+    assert recipe in by_ingredient.recipes
+    assert by_ingredient.next_cursor is None
+
+
+def test_updated_view_matches_rebuilt_view(corpus):
+    _, recipes = corpus
+    all_recipes = list(recipes.values())
+    view = name_view(all_recipes[:100])
+
+    removed = {r.id for r in all_recipes[:10]}
+    added = [(name_sort_key(r, 0), r) for r in all_recipes[100:105]]
+    updated = view.updated(removed, added)
+
+    assert updated.recipes == name_view(all_recipes[10:105]).recipes
+    assert len(view) == 100
+
+
+def test_invalid_cursor(corpus):
+    _, recipes = corpus
+    view = name_view(recipes.values())
+
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+    with pytest.raises(ValueError):
+        view.page(encode_cursor([1, 2]))